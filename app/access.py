@@ -0,0 +1,57 @@
+import os
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+import models
+import invalidation
+from cache import TTLCache
+
+ACCESS_CACHE_TTL_SECONDS = float(os.getenv("ACCESS_CACHE_TTL_SECONDS", "60"))
+
+access_cache = TTLCache(10000, ACCESS_CACHE_TTL_SECONDS)
+
+
+def is_admin(principal) -> bool:
+    return principal.role == models.UserRole.admin
+
+
+def member_projects(user_id: int):
+    return select(models.ProjectMember.project_id).where(models.ProjectMember.user_id == user_id)
+
+
+def task_scope(model, principal):
+    """SQL criterion selecting the rows of ``model`` that ``principal`` may see.
+
+    Users see tasks assigned to them and every task of projects they are a
+    member of. The membership test is an ``IN (subquery)``, which the
+    database runs as a semi-join on ``ix_project_members_user_project``.
+    Returns None for admins, who see everything.
+    """
+    if is_admin(principal):
+        return None
+    return or_(model.assignee_id == principal.id, model.project_id.in_(member_projects(principal.id)))
+
+
+def accessible_projects(db: Session, user_id: int) -> frozenset:
+    projects = access_cache.get(user_id)
+    if projects is None:
+        projects = frozenset(db.execute(member_projects(user_id)).scalars())
+        access_cache.set(user_id, projects)
+    return projects
+
+
+def can_see_task(db: Session, principal, assignee_id: int, project_id: int) -> bool:
+    return (
+        is_admin(principal)
+        or assignee_id == principal.id
+        or project_id in accessible_projects(db, principal.id)
+    )
+
+
+def invalidate_access(*user_ids):
+    access_cache.invalidate(*user_ids)
+    invalidation.broadcast("access", user_ids)
+
+
+@invalidation.handler("access")
+def _invalidated_elsewhere(session_factory, user_ids):
+    access_cache.invalidate(*user_ids)
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event, insert, inspect, select
+from sqlalchemy.orm import Session
+import models
+
+ACTIVITY_BUFFER_SIZE = int(os.getenv("ACTIVITY_BUFFER_SIZE", "100000"))
+ACTIVITY_BATCH_SIZE = int(os.getenv("ACTIVITY_BATCH_SIZE", "1000"))
+# Set to 0 to disable the background flusher.
+ACTIVITY_FLUSH_SECONDS = float(os.getenv("ACTIVITY_FLUSH_SECONDS", "1"))
+
+logger = logging.getLogger(__name__)
+
+Activity = models.ActivityLog
+
+# Entities whose ORM writes are logged by the after_flush hook below.
+TRACKED = {models.Task: "task", models.Project: "project", models.Comment: "comment"}
+UNTRACKED_FIELDS = {"version", "updated_at"}
+
+
+class ActivityBuffer:
+    """Committed activity waiting to be written, oldest first.
+
+    A ring buffer: once ``maxsize`` entries are waiting, new ones push the
+    oldest out and ``dropped`` counts the loss, so a stalled database can
+    never grow the process without bound.
+    """
+
+    def __init__(self, maxsize: int = ACTIVITY_BUFFER_SIZE):
+        self._entries = deque(maxlen=maxsize)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def extend(self, entries):
+        with self._lock:
+            overflow = len(self._entries) + len(entries) - self._entries.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+                logger.warning("Activity buffer full, dropped %d oldest entries", overflow)
+            self._entries.extend(entries)
+
+    def take(self, limit: int):
+        with self._lock:
+            return [self._entries.popleft() for _ in range(min(limit, len(self._entries)))]
+
+    def put_back(self, entries):
+        with self._lock:
+            room = self._entries.maxlen - len(self._entries)
+            self._entries.extendleft(reversed(entries[:room]))
+            self.dropped += max(0, len(entries) - room)
+
+
+buffer = ActivityBuffer()
+
+
+def record(
+    db: Session, entity: str, entity_id: int, action: str,
+    changes: Optional[dict] = None, org_id: Optional[int] = None,
+):
+    """Note a change made in ``db``'s transaction; it is logged if that commits.
+
+    Costs no statement on the request path: entries move to ``buffer`` from
+    the session's after_commit event and are written later in batches.
+    Changes the session flushes are noted by ``_note_flushed``; statements
+    that bypass the unit of work (bulk UPDATE/DELETE ... RETURNING, COPY)
+    call this themselves.
+    """
+    db.info.setdefault("activity", []).append({
+        "org_id": org_id or db.info.get("org_id") or models.DEFAULT_ORG_ID,
+        "actor_id": db.info.get("actor_id"),
+        "entity": entity,
+        "entity_id": entity_id,
+        "action": action,
+        "changes": json.dumps(jsonable_encoder(changes)) if changes else None,
+        "created_at": datetime.now(timezone.utc),
+    })
+
+
+def diff(changes: dict, previous=None) -> dict:
+    """``{field: {"to": new}}``, with ``"from"`` for fields ``previous`` has."""
+    result = {}
+    for field, value in changes.items():
+        entry = {"to": value}
+        if previous is not None and hasattr(previous, field):
+            entry["from"] = getattr(previous, field)
+        result[field] = entry
+    return result
+
+
+def _flushed_changes(instance) -> dict:
+    changes = {}
+    for attr in inspect(instance).mapper.column_attrs:
+        if attr.key in UNTRACKED_FIELDS:
+            continue
+        history = inspect(instance).attrs[attr.key].history
+        if history.added or history.deleted:
+            entry = {"to": history.added[0] if history.added else None}
+            if history.deleted:
+                entry["from"] = history.deleted[0]
+            changes[attr.key] = entry
+    return changes
+
+
+@event.listens_for(Session, "after_flush")
+def _note_flushed(session, flush_context):
+    """Log tracked rows the unit of work inserted, changed or deleted.
+
+    Runs while ``new``, ``dirty`` and ``deleted`` still describe the flush
+    and attribute history is intact; primary keys are assigned by then.
+    """
+    for action, instances in (("created", session.new), ("updated", session.dirty), ("deleted", session.deleted)):
+        for instance in instances:
+            entity = TRACKED.get(type(instance))
+            if entity is None:
+                continue
+            changes = _flushed_changes(instance) if action == "updated" else None
+            if action == "updated" and not changes:
+                continue
+            record(session, entity, instance.id, action, changes, org_id=instance.org_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _buffer_committed(session):
+    entries = session.info.pop("activity", None)
+    if entries:
+        buffer.extend(entries)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop("activity", None)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _append_only(orm_execute_state):
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and any(
+        mapper.class_ is Activity for mapper in orm_execute_state.all_mappers
+    ):
+        raise PermissionError("activity_log is append-only")
+
+
+def flush(session_factory, batch_size: int = ACTIVITY_BATCH_SIZE) -> int:
+    """Write everything buffered so far as multi-row INSERTs."""
+    written = 0
+    while True:
+        entries = buffer.take(batch_size)
+        if not entries:
+            return written
+        db = session_factory()
+        try:
+            db.execute(insert(Activity), entries)
+            db.commit()
+        except Exception:
+            buffer.put_back(entries)
+            raise
+        finally:
+            db.close()
+        written += len(entries)
+
+
+async def run_flusher(session_factory, interval: float = ACTIVITY_FLUSH_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        if not len(buffer):
+            continue
+        try:
+            await asyncio.to_thread(flush, session_factory)
+        except Exception:
+            logger.exception("Writing activity log failed")
+
+
+def read_page(db: Session, criteria, cursor: Optional[int], limit: int, newest_first: bool = True):
+    query = select(Activity).where(*criteria)
+    if cursor is not None:
+        query = query.where(Activity.id < cursor if newest_first else Activity.id > cursor)
+    order = Activity.id.desc() if newest_first else Activity.id
+    rows = db.execute(query.order_by(order).limit(limit + 1)).scalars().all()
+    if newest_first:
+        next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    else:
+        # A feed read oldest first can always be resumed from its last entry.
+        next_cursor = rows[:limit][-1].id if rows else cursor
+    return {
+        "items": [
+            {**{c: getattr(row, c) for c in ("id", "entity", "entity_id", "action", "actor_id", "created_at")},
+             "changes": json.loads(row.changes) if row.changes else None}
+            for row in rows[:limit]
+        ],
+        "next_cursor": next_cursor,
+    }
@@ -0,0 +1,178 @@
+import json
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+from fastapi import Query
+from auth import token_subject
+
+# Sustained requests per second and burst size per JWT subject / client IP.
+RATE_LIMIT_USER_PER_SECOND = float(os.getenv("RATE_LIMIT_USER_PER_SECOND", "20"))
+RATE_LIMIT_USER_BURST = float(os.getenv("RATE_LIMIT_USER_BURST", "40"))
+RATE_LIMIT_IP_PER_SECOND = float(os.getenv("RATE_LIMIT_IP_PER_SECOND", "50"))
+RATE_LIMIT_IP_BURST = float(os.getenv("RATE_LIMIT_IP_BURST", "100"))
+# Requests allowed in flight at once per route class; 0 disables a limit.
+CONCURRENCY_LIMITS = {
+    "auth": int(os.getenv("CONCURRENCY_LIMIT_AUTH", "8")),
+    "reads": int(os.getenv("CONCURRENCY_LIMIT_READS", "64")),
+    "writes": int(os.getenv("CONCURRENCY_LIMIT_WRITES", "32")),
+    "exports": int(os.getenv("CONCURRENCY_LIMIT_EXPORTS", "4")),
+    "imports": int(os.getenv("CONCURRENCY_LIMIT_IMPORTS", "2")),
+}
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+EXPORT_PREFIXES = ("/reports",)
+IMPORT_PREFIXES = ("/import",)
+EXEMPT_PATHS = {"/docs", "/redoc", "/openapi.json", "/health"}
+
+
+class CounterStore(ABC):
+    """Where admission counters live.
+
+    ``InMemoryCounterStore`` keeps them per process. A shared implementation
+    (e.g. Redis with a Lua token bucket and INCR/DECR slots) only has to
+    provide these three methods to make limits cluster-wide.
+    """
+
+    @abstractmethod
+    def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        """Take one token from ``key``'s bucket; return (allowed, retry_after)."""
+
+    @abstractmethod
+    def acquire(self, key: str, limit: int) -> bool:
+        """Take one of ``limit`` slots for ``key``; False when all are in use."""
+
+    @abstractmethod
+    def release(self, key: str):
+        """Give back a slot taken by ``acquire``."""
+
+
+class InMemoryCounterStore(CounterStore):
+    def __init__(self, max_buckets: int = 100000):
+        self.max_buckets = max_buckets
+        self._buckets = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, _, _ = self._buckets.get(key, (burst, now, rate, burst))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now, rate, burst)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now, rate, burst)
+                allowed, retry_after = False, (1 - tokens) / rate
+            if len(self._buckets) > self.max_buckets:
+                self._evict_full(now)
+        return allowed, retry_after
+
+    def _evict_full(self, now):
+        # A bucket that has refilled completely carries no state worth keeping.
+        for key, (tokens, updated, rate, burst) in list(self._buckets.items()):
+            if tokens + (now - updated) * rate >= burst:
+                del self._buckets[key]
+
+    def acquire(self, key, limit):
+        with self._lock:
+            in_flight = self._slots.get(key, 0)
+            if in_flight >= limit:
+                return False
+            self._slots[key] = in_flight + 1
+            return True
+
+    def release(self, key):
+        with self._lock:
+            self._slots[key] -= 1
+
+
+def page_size(default: int):
+    """A ``limit`` query parameter; larger values are clamped to ``MAX_PAGE_SIZE``."""
+    def limit(limit: int = Query(default, ge=1)) -> int:
+        return min(limit, MAX_PAGE_SIZE)
+    return limit
+
+
+def route_class(method: str, path: str) -> str:
+    if path.startswith("/auth"):
+        return "auth"
+    if path.startswith(EXPORT_PREFIXES):
+        return "exports"
+    if method == "POST" and path.startswith(IMPORT_PREFIXES):
+        return "imports"
+    if method in ("GET", "HEAD", "OPTIONS"):
+        return "reads"
+    return "writes"
+
+
+def bearer_token(headers) -> Optional[str]:
+    for name, value in headers:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                return token
+    return None
+
+
+class AdmissionControlMiddleware:
+    """Reject work the API cannot take before it reaches the database.
+
+    Each request spends a token from its user's bucket (the JWT subject) and
+    from its client IP's bucket; an empty bucket gives 429. It then needs a
+    free slot in its route class; a full class gives 503. Both responses
+    carry ``Retry-After``.
+    """
+
+    def __init__(self, app, store: Optional[CounterStore] = None):
+        self.app = app
+        self.store = store or InMemoryCounterStore()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        client_ip = scope["client"][0] if scope.get("client") else "unknown"
+        buckets = [(f"ip:{client_ip}", RATE_LIMIT_IP_PER_SECOND, RATE_LIMIT_IP_BURST)]
+        token = bearer_token(scope["headers"])
+        subject = token_subject(token) if token else None
+        if subject is not None:
+            buckets.append((f"user:{subject}", RATE_LIMIT_USER_PER_SECOND, RATE_LIMIT_USER_BURST))
+        for key, rate, burst in buckets:
+            if rate <= 0:
+                continue
+            allowed, retry_after = self.store.take(key, rate, burst)
+            if not allowed:
+                await reject(send, 429, "Rate limit exceeded", retry_after)
+                return
+
+        slot = route_class(scope["method"], scope["path"])
+        limit = CONCURRENCY_LIMITS[slot]
+        if limit <= 0:
+            await self.app(scope, receive, send)
+            return
+        if not self.store.acquire(f"slots:{slot}", limit):
+            await reject(send, 503, "Server is busy, please retry", 1)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.store.release(f"slots:{slot}")
+
+
+async def reject(send, status_code: int, detail: str, retry_after: float):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
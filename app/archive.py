@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+import models
+import dependencies
+import similarity
+from dashboard import invalidate_dashboards
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+# Set to 0 to disable the background archiver.
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+logger = logging.getLogger(__name__)
+
+TASK_COLUMNS = [
+    "id", "title", "description", "deadline", "priority", "status",
+    "project_id", "assignee_id", "created_at", "updated_at", "version", "org_id",
+]
+COMMENT_COLUMNS = ["id", "content", "task_id", "author_id", "created_at", "org_id"]
+
+
+def archive_completed_tasks(
+    db: Session,
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+) -> int:
+    """Move completed tasks untouched for ``older_than_days`` into the archive.
+
+    Each batch copies tasks and their comments and deletes the originals in
+    one transaction, so a crash never leaves a task in both places.
+    Organizations are processed one at a time to follow the tenant-leading
+    ``(org_id, status, updated_at)`` index.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    last_changed = func.coalesce(models.Task.updated_at, models.Task.created_at)
+    archived = 0
+    for org_id in db.scalars(select(models.Organization.id)).all():
+        archived += _archive_organization(db, org_id, cutoff, last_changed, batch_size)
+    return archived
+
+
+def _archive_organization(db: Session, org_id: int, cutoff, last_changed, batch_size: int) -> int:
+    archived = 0
+    while True:
+        batch = (
+            db.query(models.Task.id, models.Task.assignee_id)
+            .filter(
+                models.Task.org_id == org_id,
+                models.Task.status == models.TaskStatus.completed,
+                last_changed < cutoff,
+            )
+            .order_by(models.Task.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            return archived
+        task_ids = [task_id for task_id, _ in batch]
+
+        db.execute(insert(models.ArchivedTask).from_select(
+            TASK_COLUMNS,
+            select(*[getattr(models.Task, c) for c in TASK_COLUMNS]).where(models.Task.id.in_(task_ids)),
+        ))
+        db.execute(insert(models.ArchivedComment).from_select(
+            COMMENT_COLUMNS,
+            select(*[getattr(models.Comment, c) for c in COMMENT_COLUMNS])
+            .where(models.Comment.task_id.in_(task_ids)),
+        ))
+        db.execute(delete(models.Comment).where(models.Comment.task_id.in_(task_ids)))
+        dependencies.detach_tasks(db, task_ids)
+        db.execute(delete(models.Task).where(models.Task.id.in_(task_ids)))
+        similarity.note_deleted(db, task_ids)
+        db.commit()
+
+        invalidate_dashboards(*{assignee_id for _, assignee_id in batch})
+        archived += len(task_ids)
+        logger.info("Archived %d completed tasks of organization %d", archived, org_id)
+
+
+async def run_archiver(session_factory, interval: float = ARCHIVE_INTERVAL_SECONDS):
+    def run_once():
+        db = session_factory()
+        try:
+            return archive_completed_tasks(db)
+        finally:
+            db.close()
+
+    while True:
+        try:
+            await asyncio.to_thread(run_once)
+        except Exception:
+            logger.exception("Task archival failed")
+        await asyncio.sleep(interval)
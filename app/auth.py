@@ -1,30 +1,52 @@
+import os
+import uuid
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import delete, func, insert, update
 from sqlalchemy.orm import Session
 import models
-import schemas
-from database import get_db
-import os
-from dotenv import load_dotenv
+from config import settings
+from database import engine, get_db
+from revocation import revocation_index, revoke_tokens
 
-load_dotenv()
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+REFRESH_TOKEN_EXPIRE_DAYS = settings.refresh_token_expire_days
 
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Cost of new password hashes; existing hashes keep the cost they were made with.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+# python-jose (with its cryptography backend) and passlib are imported on
+# first use rather than with the app, which keeps worker start-up short.
+
+@lru_cache(maxsize=None)
+def password_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+def encode_token(claims: dict) -> str:
+    from jose import jwt
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+def decode_token(token: str) -> Optional[dict]:
+    """The token's claims, or None if it is malformed, forged or expired."""
+    from jose import JWTError, jwt
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -33,8 +55,89 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    return encode_token(to_encode)
+
+class Principal:
+    """The caller, as vouched for by the signed claims of their access token."""
+
+    __slots__ = ("id", "username", "role", "token_version", "org_id")
+
+    def __init__(self, id: int, username: str, role: models.UserRole, token_version: int, org_id: int):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.token_version = token_version
+        self.org_id = org_id
+
+def user_claims(user) -> dict:
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "role": user.role.value,
+        "token_version": user.token_version,
+        "org": user.org_id,
+    }
+
+def create_token_pair(db: Session, user) -> dict:
+    """Issue an access token and a single-use refresh token for ``user``."""
+    claims = user_claims(user)
+    access_token = create_access_token(
+        {**claims, "type": "access"}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    jti = uuid.uuid4().hex
+    expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    refresh_token = encode_token({**claims, "type": "refresh", "jti": jti, "exp": expires_at})
+    db.execute(delete(models.RefreshToken).where(
+        models.RefreshToken.user_id == user.id, models.RefreshToken.expires_at < datetime.utcnow()
+    ))
+    db.execute(insert(models.RefreshToken).values(jti=jti, user_id=user.id, expires_at=expires_at))
+    db.commit()
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+def rotate_refresh_token(db: Session, refresh_token: str) -> dict:
+    """Exchange a refresh token for a new pair, consuming it.
+
+    Presenting an already used refresh token means it leaked, so every
+    token of that user is revoked.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    payload = decode_token(refresh_token)
+    if payload is None:
+        raise credentials_exception
+    if payload.get("type") != "refresh" or "jti" not in payload or "uid" not in payload:
+        raise credentials_exception
+
+    consumed = db.execute(
+        update(models.RefreshToken)
+        .where(models.RefreshToken.jti == payload["jti"], models.RefreshToken.used_at.is_(None))
+        .values(used_at=func.now())
+        .returning(models.RefreshToken.user_id)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+    if consumed is None:
+        db.rollback()
+        if db.get(models.RefreshToken, payload["jti"]) is not None:
+            revoke_tokens(db, payload["uid"])
+        raise credentials_exception
+
+    user = db.get(models.User, consumed)
+    if user is None or user.is_active is False or user.token_version != payload.get("token_version"):
+        db.rollback()
+        raise credentials_exception
+    return create_token_pair(db, user)
+
+def token_subject(token: str) -> Optional[str]:
+    payload = decode_token(token)
+    return payload.get("sub") if payload is not None else None
 
 def authenticate_user(db: Session, username: str, password: str):
     user = db.query(models.User).filter(models.User.username == username).first()
@@ -44,27 +147,38 @@ def authenticate_user(db: Session, username: str, password: str):
         return False
     return user
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db),
+) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    payload = decode_token(credentials.credentials)
+    if payload is None:
+        raise credentials_exception
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(username=username)
-    except JWTError:
+        principal = Principal(
+            id=int(payload["uid"]),
+            username=payload["sub"],
+            role=models.UserRole(payload["role"]),
+            token_version=int(payload["token_version"]),
+            org_id=int(payload["org"]),
+        )
+    except (KeyError, TypeError, ValueError):
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
-    if user is None:
+    if payload.get("type") != "access":
         raise credentials_exception
-    return user
+    if not revocation_index.is_current(principal.id, principal.token_version, engine):
+        raise credentials_exception
+    # Scope every ORM query of this request's session to the caller's organization.
+    db.info["org_id"] = principal.org_id
+    db.info["actor_id"] = principal.id
+    return principal
 
-async def get_current_admin_user(current_user: models.User = Depends(get_current_user)):
+async def get_current_admin_user(current_user: Principal = Depends(get_current_user)):
     if current_user.role != models.UserRole.admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,116 @@
+import enum
+import io
+from datetime import date, datetime, timezone
+from itertools import islice
+from sqlalchemy import text
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_field(value) -> str:
+    if value is None:
+        return "\\N"
+    return str(value).translate(_COPY_ESCAPES)
+
+
+class BulkLoader:
+    """Loads rows straight through the DBAPI connection.
+
+    PostgreSQL gets ``COPY ... FROM STDIN``, everything else ``executemany``.
+    Each chunk is committed on its own so memory stays flat and a failed
+    load can be resumed from the last committed chunk.
+    """
+
+    def __init__(self, engine, chunk_size: int = 50000):
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.is_postgres = engine.dialect.name == "postgresql"
+        self.connection = None
+
+    @classmethod
+    def in_session(cls, db):
+        """A loader writing through ``db``'s connection, so loaded rows
+        commit or roll back with the session's transaction."""
+        loader = cls(db.get_bind())
+        loader.connection = db.connection().connection
+        return loader
+
+    def __enter__(self):
+        self.connection = self.engine.raw_connection()
+        if not self.is_postgres:
+            cursor = self.connection.cursor()
+            cursor.execute("PRAGMA synchronous=OFF")
+            cursor.close()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.connection.rollback()
+        self.connection.close()
+        self.connection = None
+
+    def format_datetime(self, value: datetime) -> str:
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        if self.is_postgres:
+            return value.isoformat(sep=" ") + "+00"
+        return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+    def convert(self, value):
+        if isinstance(value, enum.Enum):
+            return value.name
+        if isinstance(value, datetime):
+            return self.format_datetime(value)
+        if isinstance(value, date):
+            return value.isoformat()
+        return value
+
+    def convert_rows(self, rows):
+        for row in rows:
+            yield tuple(self.convert(value) for value in row)
+
+    def next_id(self, table: str) -> int:
+        with self.engine.connect() as conn:
+            return (conn.execute(text(f"SELECT MAX(id) FROM {table}")).scalar() or 0) + 1
+
+    def load(self, table: str, columns, rows) -> int:
+        """Load ``rows`` (tuples of DB-ready values) and return the row count."""
+        rows = iter(rows)
+        total = 0
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                return total
+            self.load_chunk(table, columns, chunk)
+            self.connection.commit()
+            total += len(chunk)
+
+    def load_chunk(self, table: str, columns, chunk):
+        cursor = self.connection.cursor()
+        try:
+            if self.is_postgres:
+                buffer = io.StringIO()
+                for row in chunk:
+                    buffer.write("\t".join(_copy_field(value) for value in row))
+                    buffer.write("\n")
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+            else:
+                placeholders = ", ".join("?" for _ in columns)
+                cursor.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", chunk
+                )
+        finally:
+            cursor.close()
+
+    def reset_sequences(self, *tables):
+        if not self.is_postgres:
+            return
+        cursor = self.connection.cursor()
+        for table in tables:
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"
+            )
+        cursor.close()
+        self.connection.commit()
@@ -0,0 +1,140 @@
+import os
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+import models
+import invalidation
+from cache import TTLCache
+
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "30"))
+DASHBOARD_OPEN_TASK_LIMIT = 200
+DASHBOARD_RECENT_COMMENTS = 10
+
+dashboard_cache = TTLCache(maxsize=4096, ttl=DASHBOARD_CACHE_TTL_SECONDS)
+
+
+def invalidate_dashboards(*user_ids):
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    dashboard_cache.invalidate(*user_ids)
+    invalidation.broadcast("dashboards", user_ids)
+
+
+@invalidation.handler("dashboards")
+def _invalidated_elsewhere(session_factory, user_ids):
+    dashboard_cache.invalidate(*user_ids)
+
+
+def get_user_dashboard(db: Session, user_id: int):
+    snapshot = dashboard_cache.get(user_id)
+    if snapshot is None:
+        snapshot = build_user_dashboard(db, user_id)
+        dashboard_cache.set(user_id, snapshot)
+    return snapshot
+
+
+def build_user_dashboard(db: Session, user_id: int):
+    now = datetime.now(timezone.utc)
+    today_start = datetime(now.year, now.month, now.day, tzinfo=timezone.utc)
+    tomorrow_start = today_start + timedelta(days=1)
+    is_open = models.Task.status != models.TaskStatus.completed
+
+    # 1. Status x priority matrix with overdue / due-today counts folded in.
+    aggregates = (
+        db.query(
+            models.Task.status,
+            models.Task.priority,
+            func.count(models.Task.id),
+            func.sum(case((is_open & (models.Task.deadline < today_start), 1), else_=0)),
+            func.sum(case((
+                is_open
+                & (models.Task.deadline >= today_start)
+                & (models.Task.deadline < tomorrow_start), 1), else_=0)),
+        )
+        .filter(models.Task.assignee_id == user_id)
+        .group_by(models.Task.status, models.Task.priority)
+        .all()
+    )
+
+    # 2. Open tasks, soonest deadline first.
+    open_tasks = (
+        db.query(models.Task)
+        .filter(models.Task.assignee_id == user_id, is_open)
+        .order_by(models.Task.deadline.is_(None), models.Task.deadline, models.Task.id)
+        .limit(DASHBOARD_OPEN_TASK_LIMIT)
+        .all()
+    )
+
+    # 3. Most recent comments on any of the user's tasks.
+    recent_comments = (
+        db.query(models.Comment, models.Task.title)
+        .join(models.Task, models.Comment.task_id == models.Task.id)
+        .filter(models.Task.assignee_id == user_id)
+        .order_by(models.Comment.created_at.desc(), models.Comment.id.desc())
+        .limit(DASHBOARD_RECENT_COMMENTS)
+        .all()
+    )
+
+    # 4. Tasks created per day and status for the timeline chart.
+    created_date = func.date(models.Task.created_at)
+    created_by_day = (
+        db.query(created_date, models.Task.status, func.count(models.Task.id))
+        .filter(models.Task.assignee_id == user_id)
+        .group_by(created_date, models.Task.status)
+        .order_by(created_date)
+        .all()
+    )
+
+    status_counts = {s.value: 0 for s in models.TaskStatus}
+    priority_counts = {p.value: 0 for p in models.TaskPriority}
+    status_by_priority = []
+    overdue = due_today = 0
+    for task_status, priority, count, overdue_count, due_today_count in aggregates:
+        status_counts[task_status.value] += count
+        priority_counts[priority.value] += count
+        status_by_priority.append({"priority": priority.value, "status": task_status.value, "count": count})
+        overdue += overdue_count or 0
+        due_today += due_today_count or 0
+
+    total = sum(status_counts.values())
+    completed = status_counts[models.TaskStatus.completed.value]
+
+    grouped_open_tasks = {
+        s.value: [] for s in models.TaskStatus if s != models.TaskStatus.completed
+    }
+    for task in open_tasks:
+        grouped_open_tasks[task.status.value].append(task)
+
+    return {
+        "user_id": user_id,
+        "generated_at": now,
+        "open_tasks": grouped_open_tasks,
+        "counts": {
+            "total": total,
+            "pending": status_counts[models.TaskStatus.pending.value],
+            "in_progress": status_counts[models.TaskStatus.in_progress.value],
+            "completed": completed,
+            "overdue": overdue,
+            "due_today": due_today,
+        },
+        "completion_rate": (completed / total) * 100 if total > 0 else 0.0,
+        "recent_comments": [
+            {
+                "id": comment.id,
+                "content": comment.content,
+                "task_id": comment.task_id,
+                "task_title": task_title,
+                "author_id": comment.author_id,
+                "created_at": comment.created_at,
+            }
+            for comment, task_title in recent_comments
+        ],
+        "charts": {
+            "status": status_counts,
+            "priority": priority_counts,
+            "status_by_priority": status_by_priority,
+            "created_by_day": [
+                {"date": str(day), "status": task_status.value, "count": count}
+                for day, task_status, count in created_by_day
+            ],
+        },
+    }
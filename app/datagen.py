@@ -0,0 +1,203 @@
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy.orm import sessionmaker
+from auth import get_password_hash
+from bulkload import BulkLoader
+from models import TaskPriority, TaskStatus
+from reports import backfill_rollups
+from workload import backfill_workloads
+from tenancy import ensure_default_organization
+
+VERBS = ["Design", "Implement", "Review", "Test", "Document", "Refactor", "Deploy", "Investigate", "Fix", "Plan"]
+NOUNS = [
+    "login flow", "billing page", "search index", "API client", "onboarding email", "audit report",
+    "mobile layout", "data export", "cache layer", "release notes", "dashboard widget", "access rules",
+]
+COMMENTS = [
+    "Started working on this.", "Blocked on review, will follow up.", "Pushed a first draft.",
+    "Can we move the deadline?", "Looks good to me.", "Please use the brand colors from the style guide.",
+    "Added tests for the edge cases.", "Done, ready for another look.",
+]
+PRIORITIES = [p.name for p in TaskPriority]
+STATUSES = [s.name for s in TaskStatus]
+
+
+def parse_mix(spec: str, names):
+    """Parse ``"pending:0.4,in_progress:0.2,completed:0.4"`` into normalised weights."""
+    weights = dict.fromkeys(names, 0.0)
+    for part in spec.split(","):
+        name, _, weight = part.partition(":")
+        if name.strip() not in weights:
+            raise ValueError(f"Unknown value in mix: {name!r}")
+        weights[name.strip()] = float(weight)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Mix weights must sum to a positive number")
+    return np.array([weights[name] / total for name in names])
+
+
+def zipf_weights(n: int, skew: float):
+    """Selection weights where rank ``r`` gets ``1 / r ** skew`` (0 = uniform)."""
+    weights = 1.0 / np.arange(1, n + 1, dtype=np.float64) ** skew
+    return weights / weights.sum()
+
+
+def generate_dataset(
+    engine,
+    users: int = 1000,
+    admins: int = 5,
+    projects: int = 100,
+    tasks_per_project: int = 1000,
+    comments_per_task: float = 2.0,
+    skew: float = 1.0,
+    status_mix: str = "pending:0.4,in_progress:0.2,completed:0.4",
+    priority_mix: str = "low:0.3,medium:0.5,high:0.2",
+    days: int = 365,
+    seed: int = 42,
+    as_of: datetime = None,
+    password: str = "user123",
+    chunk_size: int = 50000,
+    rebuild_rollups: bool = True,
+    progress=print,
+):
+    """Bulk load a deterministic synthetic dataset and return row counts.
+
+    The same ``seed`` and ``as_of`` always produce the same rows. ``as_of``
+    defaults to midnight UTC today, so deadlines stay realistic relative to
+    the current date.
+    """
+    ensure_default_organization(engine)
+    rng = np.random.default_rng(seed)
+    status_weights = parse_mix(status_mix, STATUSES)
+    priority_weights = parse_mix(priority_mix, PRIORITIES)
+    assignee_weights = zipf_weights(users, skew)
+    hashed_password = get_password_hash(password)
+    as_of = as_of or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    origin = as_of - timedelta(days=days)
+    started = time.monotonic()
+    counts = {}
+
+    with BulkLoader(engine, chunk_size=chunk_size) as loader:
+        fmt = loader.format_datetime
+        user_base = loader.next_id("users")
+        project_base = loader.next_id("projects")
+        task_base = loader.next_id("tasks")
+        comment_base = loader.next_id("comments")
+        admin_ids = np.arange(user_base, user_base + admins)
+        user_ids = np.arange(user_base + admins, user_base + admins + users)
+        # Shuffle which user ids are "hot" so skew is not tied to id order.
+        user_ids_by_rank = rng.permutation(user_ids)
+
+        def user_rows():
+            for i, user_id in enumerate(np.concatenate([admin_ids, user_ids]).tolist()):
+                name = f"gen_{'admin' if i < admins else 'user'}_{user_id}"
+                yield (user_id, name, f"{name}@example.com", hashed_password,
+                       "admin" if i < admins else "user", True, fmt(origin))
+
+        counts["users"] = loader.load(
+            "users", ["id", "username", "email", "hashed_password", "role", "is_active", "created_at"],
+            user_rows(),
+        )
+        progress(f"👥 {counts['users']} users")
+
+        project_creators = rng.choice(admin_ids, size=projects).tolist()
+        counts["projects"] = loader.load(
+            "projects", ["id", "title", "description", "creator_id", "created_at"],
+            ((project_base + i, f"Project {project_base + i}", f"Synthetic project #{i + 1}",
+              project_creators[i], fmt(origin)) for i in range(projects)),
+        )
+        progress(f"🏗️ {counts['projects']} projects")
+
+        total_tasks = projects * tasks_per_project
+        counts["tasks"] = counts["comments"] = counts["task_status_events"] = 0
+        for start in range(0, total_tasks, chunk_size):
+            size = min(chunk_size, total_tasks - start)
+            index = np.arange(start, start + size)
+            task_ids = task_base + index
+            project_ids = project_base + index // tasks_per_project
+            assignees = user_ids_by_rank[rng.choice(users, size=size, p=assignee_weights)]
+            statuses = rng.choice(len(STATUSES), size=size, p=status_weights)
+            priorities = rng.choice(len(PRIORITIES), size=size, p=priority_weights)
+            created = rng.uniform(0, days * 86400.0, size=size)
+            # Hours spent pending and in progress before the next transition.
+            pending_for = rng.exponential(48.0, size=size) * 3600.0
+            working_for = rng.exponential(72.0, size=size) * 3600.0
+            started_at = np.minimum(created + pending_for, days * 86400.0)
+            completed_at = np.minimum(started_at + working_for, days * 86400.0)
+            deadlines = created + rng.integers(1, 60, size=size) * 86400.0
+            verbs = rng.integers(0, len(VERBS), size=size)
+            nouns = rng.integers(0, len(NOUNS), size=size)
+
+            def when(offsets):
+                return [fmt(origin + timedelta(seconds=int(s))) for s in offsets.tolist()]
+
+            created_s, started_s, completed_s = when(created), when(started_at), when(completed_at)
+            deadline_s = when(deadlines)
+            updated_s = [
+                (created_s, started_s, completed_s)[code][i] for i, code in enumerate(statuses.tolist())
+            ]
+
+            task_rows = [
+                (task_id, f"{VERBS[v]} {NOUNS[n]} #{task_id}", f"Synthetic task {task_id}",
+                 deadline_s[i], PRIORITIES[p], STATUSES[st], project_id, assignee,
+                 created_s[i], updated_s[i])
+                for i, (task_id, v, n, p, st, project_id, assignee) in enumerate(zip(
+                    task_ids.tolist(), verbs.tolist(), nouns.tolist(), priorities.tolist(),
+                    statuses.tolist(), project_ids.tolist(), assignees.tolist(),
+                ))
+            ]
+            loader.load_chunk("tasks", [
+                "id", "title", "description", "deadline", "priority", "status",
+                "project_id", "assignee_id", "created_at", "updated_at",
+            ], task_rows)
+
+            event_rows = []
+            for i, row in enumerate(task_rows):
+                task_id, project_id, assignee, code = row[0], row[6], row[7], statuses[i]
+                event_rows.append((task_id, project_id, assignee, None, "pending", created_s[i]))
+                if code >= 1:
+                    event_rows.append((task_id, project_id, assignee, "pending", "in_progress", started_s[i]))
+                if code >= 2:
+                    event_rows.append((task_id, project_id, assignee, "in_progress", "completed", completed_s[i]))
+            loader.load_chunk("task_status_events", [
+                "task_id", "project_id", "assignee_id", "from_status", "to_status", "created_at",
+            ], event_rows)
+
+            per_task = rng.poisson(comments_per_task, size=size)
+            comment_task_index = np.repeat(np.arange(size), per_task)
+            n_comments = len(comment_task_index)
+            by_assignee = rng.random(n_comments) < 0.8
+            authors = np.where(
+                by_assignee, assignees[comment_task_index],
+                rng.choice(admin_ids, size=n_comments) if n_comments else admin_ids[:0],
+            )
+            comment_offsets = created[comment_task_index] + rng.uniform(0, 7 * 86400.0, size=n_comments)
+            comment_text = rng.integers(0, len(COMMENTS), size=n_comments)
+            comment_rows = [
+                (comment_base + counts["comments"] + j, COMMENTS[t], int(task_ids[k]), a, s)
+                for j, (t, k, a, s) in enumerate(zip(
+                    comment_text.tolist(), comment_task_index.tolist(), authors.tolist(),
+                    when(np.minimum(comment_offsets, days * 86400.0)),
+                ))
+            ]
+            loader.load_chunk("comments", ["id", "content", "task_id", "author_id", "created_at"], comment_rows)
+            loader.connection.commit()
+
+            counts["tasks"] += size
+            counts["comments"] += n_comments
+            counts["task_status_events"] += len(event_rows)
+            progress(f"📋 {counts['tasks']}/{total_tasks} tasks ({time.monotonic() - started:.1f}s)")
+
+        loader.reset_sequences("users", "projects", "tasks", "comments")
+
+    if rebuild_rollups:
+        db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+        try:
+            counts["task_daily_rollups"] = backfill_rollups(db)
+            counts["user_workloads"] = backfill_workloads(db)
+        finally:
+            db.close()
+
+    counts["seconds"] = round(time.monotonic() - started, 1)
+    return counts
@@ -0,0 +1,90 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+import models
+import access
+
+WINDOW_UNITS = {"h": timedelta(hours=1), "d": timedelta(days=1), "w": timedelta(weeks=1)}
+MAX_CALENDAR_DAYS = 366
+
+Task = models.Task
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Deadlines are stored in UTC; naive values are taken to be UTC already."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def parse_window(within: str) -> timedelta:
+    """``"36h"``, ``"7d"`` or ``"2w"`` as a timedelta."""
+    return int(within[:-1]) * WINDOW_UNITS[within[-1]]
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def _visible(query, principal):
+    scope = access.task_scope(Task, principal)
+    return query if scope is None else query.where(scope)
+
+
+def due_tasks(db: Session, principal, window: timedelta, include_overdue: bool = True, limit: int = 100):
+    """Open tasks due before now + ``window``, soonest first.
+
+    A range scan on ``ix_tasks_org_deadline`` for admins, and on the
+    assignee / project deadline indexes for everyone else.
+    """
+    now = datetime.now(timezone.utc)
+    query = select(
+        Task.id, Task.title, Task.status, Task.priority,
+        Task.project_id, Task.assignee_id, Task.deadline,
+    ).where(
+        Task.org_id == principal.org_id,
+        Task.deadline < now + window,
+        Task.status != models.TaskStatus.completed,
+    )
+    if not include_overdue:
+        query = query.where(Task.deadline >= now)
+    rows = db.execute(_visible(query, principal).order_by(Task.deadline, Task.id).limit(limit)).mappings()
+
+    tasks = []
+    for row in rows:
+        deadline = as_utc(row["deadline"])
+        tasks.append({
+            **row,
+            "deadline": deadline,
+            "overdue": deadline < now,
+            "days_left": (deadline.date() - now.date()).days,
+        })
+    return tasks
+
+
+def calendar(db: Session, principal, date_from: date, date_to: date):
+    """Per-day task counts and ids for deadlines in ``[date_from, date_to]``.
+
+    Only ids and deadlines are read, in index order, so the grouping below
+    is a single pass.
+    """
+    query = select(Task.id, Task.deadline, Task.status).where(
+        Task.org_id == principal.org_id,
+        Task.deadline >= day_start(date_from),
+        Task.deadline < day_start(date_to + timedelta(days=1)),
+    )
+    rows = db.execute(_visible(query, principal).order_by(Task.deadline, Task.id))
+
+    days = []
+    for task_id, deadline, task_status in rows:
+        day = as_utc(deadline).date()
+        if not days or days[-1]["day"] != day:
+            days.append({"day": day, "count": 0, "open": 0, "task_ids": []})
+        entry = days[-1]
+        entry["count"] += 1
+        entry["open"] += task_status != models.TaskStatus.completed
+        entry["task_ids"].append(task_id)
+    return days
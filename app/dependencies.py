@@ -0,0 +1,203 @@
+from collections import defaultdict, deque
+from sqlalchemy import case, delete, insert, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+import models
+import access
+
+Dependency = models.TaskDependency
+Closure = models.TaskClosure
+Task = models.Task
+
+LINKED_TASK_COLUMNS = (Task.id, Task.title, Task.status, Task.deadline, Task.project_id, Task.assignee_id)
+
+
+class DependencyCycle(ValueError):
+    pass
+
+
+def _upsert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(Closure)
+    return sqlite.insert(Closure)
+
+
+def _lock_graph(db: Session, org_id: int):
+    # Cycle checks read the closure before writing it; one writer per
+    # organization at a time keeps two concurrent links from closing a loop.
+    db.execute(select(models.Organization.id).where(models.Organization.id == org_id).with_for_update())
+
+
+def add_dependency(db: Session, blocker_id: int, blocked_id: int, org_id: int):
+    """Record that ``blocked_id`` waits for ``blocker_id`` and extend the closure.
+
+    Raises ``DependencyCycle`` if ``blocker_id`` already (transitively)
+    waits for ``blocked_id``. Every ancestor of the blocker, itself included,
+    becomes an ancestor of every descendant of the blocked task, itself
+    included; depths keep the shortest chain.
+    """
+    _lock_graph(db, org_id)
+    if blocker_id == blocked_id or db.execute(
+        select(Closure.depth).where(Closure.ancestor_id == blocked_id, Closure.descendant_id == blocker_id)
+    ).first():
+        raise DependencyCycle("Dependency would create a cycle")
+    db.execute(insert(Dependency).values(blocker_id=blocker_id, blocked_id=blocked_id, org_id=org_id))
+
+    ups = [(blocker_id, 0), *db.execute(
+        select(Closure.ancestor_id, Closure.depth).where(Closure.descendant_id == blocker_id)
+    ).all()]
+    downs = [(blocked_id, 0), *db.execute(
+        select(Closure.descendant_id, Closure.depth).where(Closure.ancestor_id == blocked_id)
+    ).all()]
+    rows = [
+        {"ancestor_id": ancestor, "descendant_id": descendant, "depth": up + 1 + down, "org_id": org_id}
+        for ancestor, up in ups
+        for descendant, down in downs
+    ]
+    stmt = _upsert(db).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[Closure.ancestor_id, Closure.descendant_id],
+        set_={"depth": case((stmt.excluded.depth < Closure.depth, stmt.excluded.depth), else_=Closure.depth)},
+    ))
+
+
+def remove_dependency(db: Session, blocker_id: int, blocked_id: int, org_id: int) -> bool:
+    _lock_graph(db, org_id)
+    removed = db.execute(
+        delete(Dependency)
+        .where(Dependency.blocker_id == blocker_id, Dependency.blocked_id == blocked_id)
+        .returning(Dependency.blocker_id)
+    ).first()
+    if removed is None:
+        return False
+    ancestors = db.execute(select(Closure.ancestor_id).where(Closure.descendant_id == blocker_id)).scalars()
+    _rebuild(db, {blocker_id, *ancestors})
+    return True
+
+
+def detach_tasks(db: Session, task_ids):
+    """Drop every dependency touching ``task_ids`` (a list or a SELECT of ids)
+    before the tasks themselves are deleted."""
+    removed = db.execute(
+        delete(Dependency)
+        .where(or_(Dependency.blocker_id.in_(task_ids), Dependency.blocked_id.in_(task_ids)))
+        .returning(Dependency.blocker_id)
+    ).first()
+    if removed is None:
+        return
+    sources = set(db.execute(
+        select(Closure.ancestor_id)
+        .where(Closure.descendant_id.in_(task_ids), Closure.ancestor_id.not_in(task_ids))
+    ).scalars())
+    db.execute(delete(Closure).where(or_(Closure.ancestor_id.in_(task_ids), Closure.descendant_id.in_(task_ids))))
+    _rebuild(db, sources)
+
+
+def _rebuild(db: Session, sources: set):
+    """Recompute the closure rows of ``sources`` from the remaining edges.
+
+    Only the part of the graph reachable from ``sources`` is read, so the
+    cost follows the size of the affected region.
+    """
+    if not sources:
+        return
+    reachable = set(sources) | set(db.execute(
+        select(Closure.descendant_id).where(Closure.ancestor_id.in_(sources))
+    ).scalars())
+    edges = defaultdict(list)
+    org_ids = {}
+    for blocker, blocked, org_id in db.execute(
+        select(Dependency.blocker_id, Dependency.blocked_id, Dependency.org_id)
+        .where(Dependency.blocker_id.in_(reachable))
+    ):
+        edges[blocker].append(blocked)
+        org_ids[blocker] = org_id
+    db.execute(delete(Closure).where(Closure.ancestor_id.in_(sources)))
+
+    rows = []
+    for source in sources:
+        depths = {source: 0}
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            for child in edges.get(node, ()):
+                if child not in depths:
+                    depths[child] = depths[node] + 1
+                    queue.append(child)
+        rows.extend(
+            {"ancestor_id": source, "descendant_id": node, "depth": depth, "org_id": org_ids[source]}
+            for node, depth in depths.items() if node != source
+        )
+    if rows:
+        db.execute(insert(Closure), rows)
+
+
+def linked_tasks(db: Session, principal, task_id: int, direction: str):
+    """Tasks transitively blocking (``"blockers"``) or blocked by
+    (``"blocked"``) ``task_id``, nearest first: one index range read of the
+    closure joined to ``tasks``."""
+    if direction == "blockers":
+        join_on, anchor = Closure.ancestor_id, Closure.descendant_id
+    else:
+        join_on, anchor = Closure.descendant_id, Closure.ancestor_id
+    query = (
+        select(*LINKED_TASK_COLUMNS, Closure.depth)
+        .join(Closure, join_on == Task.id)
+        .where(anchor == task_id)
+        .order_by(Closure.depth, Task.id)
+    )
+    scope = access.task_scope(Task, principal)
+    if scope is not None:
+        query = query.where(scope)
+    return db.execute(query).mappings().all()
+
+
+def critical_path(db: Session, project_id: int):
+    """The chain of open tasks that sets the project's finish date.
+
+    Tasks carry deadlines but no durations, so the chain is found by a
+    backward pass: start from the open task with the latest deadline and
+    repeatedly step to its open blocker with the latest deadline. The
+    ancestors and the edges between them come from two index reads.
+    Links whose blocker is due after the task it blocks are reported as
+    conflicts.
+    """
+    is_open = Task.status != models.TaskStatus.completed
+    end = db.execute(
+        select(*LINKED_TASK_COLUMNS)
+        .where(Task.project_id == project_id, is_open, Task.deadline.is_not(None))
+        .order_by(Task.deadline.desc(), Task.id.desc())
+        .limit(1)
+    ).mappings().first()
+    if end is None:
+        return {"project_id": project_id, "finish": None, "tasks": [], "conflicts": []}
+
+    ancestors = {
+        row["id"]: row for row in db.execute(
+            select(*LINKED_TASK_COLUMNS)
+            .join(Closure, Closure.ancestor_id == Task.id)
+            .where(Closure.descendant_id == end["id"], is_open)
+        ).mappings()
+    }
+    ancestors[end["id"]] = end
+    blockers = defaultdict(list)
+    for blocker, blocked in db.execute(
+        select(Dependency.blocker_id, Dependency.blocked_id).where(Dependency.blocked_id.in_(list(ancestors)))
+    ):
+        if blocker in ancestors:
+            blockers[blocked].append(ancestors[blocker])
+
+    path = [end]
+    while blockers.get(path[-1]["id"]):
+        path.append(max(
+            blockers[path[-1]["id"]],
+            key=lambda task: (task["deadline"] is not None, task["deadline"] or 0, task["id"]),
+        ))
+    path.reverse()
+    conflicts = [
+        {"blocker_id": before["id"], "blocked_id": after["id"]}
+        for before, after in zip(path, path[1:])
+        if before["deadline"] is not None and after["deadline"] is not None
+        and before["deadline"] > after["deadline"]
+    ]
+    return {"project_id": project_id, "finish": end["deadline"], "tasks": path, "conflicts": conflicts}
@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import models
+from cache import TTLCache
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# How long a duplicate waits for the first request before giving up with 409.
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+# A pending key older than this is assumed to belong to a crashed worker.
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+MAX_KEY_LENGTH = 255
+
+logger = logging.getLogger(__name__)
+
+Key = models.IdempotencyKey
+results = TTLCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL_SECONDS)
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def fingerprint(payload) -> str:
+    body = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def replay_response(status_code: int, body: str) -> JSONResponse:
+    return JSONResponse(
+        content=json.loads(body),
+        status_code=status_code,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+class Claim:
+    """The right to execute one idempotent request, or the response to replay."""
+
+    def __init__(self, db: Session, scope: str, key: Optional[str], request_hash: str):
+        self.db = db
+        self.scope = scope
+        self.key = key
+        self.request_hash = request_hash
+        self.replay = None
+        self.owned = False
+        self.result = None
+
+    def save(self, schema, obj, status_code: int = 200):
+        """Record the response in the caller's transaction, before its commit."""
+        if not self.owned:
+            return
+        body = json.dumps(jsonable_encoder(schema.model_validate(obj, from_attributes=True)))
+        self.db.execute(
+            update(Key)
+            .where(Key.scope == self.scope, Key.key == self.key)
+            .values(status_code=status_code, response=body, completed_at=func.now())
+        )
+        self.result = (self.request_hash, status_code, body)
+
+
+def _match(claim: Claim, stored) -> JSONResponse:
+    request_hash, status_code, body = stored
+    if request_hash != claim.request_hash:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used with a different request",
+        )
+    return replay_response(status_code, body)
+
+
+def _try_acquire(db: Session, claim: Claim) -> bool:
+    """Insert a pending row for the key on its own connection.
+
+    Returns False when another request already holds or completed the key.
+    Expired results and abandoned pending rows are replaced.
+    """
+    now = datetime.now(timezone.utc)
+    stale = (
+        (Key.completed_at.is_(None) & (Key.created_at < now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)))
+        | (Key.created_at < now - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS))
+    )
+    with db.get_bind().connect() as conn:
+        conn.execute(delete(Key).where(Key.scope == claim.scope, Key.key == claim.key, stale))
+        try:
+            conn.execute(insert(Key).values(
+                scope=claim.scope, key=claim.key, request_hash=claim.request_hash,
+            ))
+            conn.commit()
+            return True
+        except IntegrityError:
+            conn.rollback()
+            return False
+
+
+def _load(db: Session, claim: Claim):
+    with db.get_bind().connect() as conn:
+        return conn.execute(
+            select(Key.request_hash, Key.status_code, Key.response)
+            .where(Key.scope == claim.scope, Key.key == claim.key)
+        ).first()
+
+
+def _acquire(db: Session, claim: Claim):
+    cache_key = (claim.scope, claim.key)
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        stored = results.get(cache_key)
+        if stored is not None:
+            claim.replay = _match(claim, stored)
+            return
+
+        # Duplicates within this process wait on the first request's event.
+        with _in_flight_lock:
+            event = _in_flight.get(cache_key)
+            if event is None:
+                _in_flight[cache_key] = threading.Event()
+        if event is not None:
+            if not event.wait(max(deadline - time.monotonic(), 0)):
+                break
+            continue
+
+        if _try_acquire(db, claim):
+            claim.owned = True
+            return
+
+        # Another worker holds or finished the key; poll the table for it.
+        _wake(cache_key)
+        while time.monotonic() < deadline:
+            row = _load(db, claim)
+            if row is None:
+                break
+            if row.status_code is not None:
+                stored = (row.request_hash, row.status_code, row.response)
+                results.set(cache_key, stored)
+                claim.replay = _match(claim, stored)
+                return
+            time.sleep(0.05)
+        else:
+            break
+
+    raise HTTPException(
+        status_code=409,
+        detail="A request with this Idempotency-Key is still being processed",
+    )
+
+
+def _wake(cache_key):
+    with _in_flight_lock:
+        event = _in_flight.pop(cache_key, None)
+    if event is not None:
+        event.set()
+
+
+def _release(db: Session, claim: Claim):
+    cache_key = (claim.scope, claim.key)
+    if claim.result is not None:
+        results.set(cache_key, claim.result)
+    else:
+        # Failed requests are not recorded, so a retry runs them again.
+        with db.get_bind().connect() as conn:
+            conn.execute(delete(Key).where(
+                Key.scope == claim.scope, Key.key == claim.key, Key.completed_at.is_(None),
+            ))
+            conn.commit()
+    _wake(cache_key)
+
+
+@contextmanager
+def idempotent(db: Session, key: Optional[str], endpoint: str, user_id: Optional[int], payload):
+    """Run the body at most once per ``Idempotency-Key``.
+
+    Yields a ``Claim``. If ``claim.replay`` is set the body must return it
+    unchanged. Otherwise the body performs the write, calls ``claim.save``
+    and commits; the stored response is what later retries receive.
+    """
+    if key is not None and not 0 < len(key) <= MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters")
+    claim = Claim(db, f"{user_id or 'anonymous'}:{endpoint}", key, fingerprint(payload))
+    if key is None:
+        yield claim
+        return
+
+    _acquire(db, claim)
+    if claim.replay is not None:
+        yield claim
+        return
+    try:
+        yield claim
+    except BaseException:
+        # The saved response was rolled back with the rest of the write.
+        claim.result = None
+        db.rollback()
+        raise
+    finally:
+        _release(db, claim)
+
+
+def purge_expired_keys(db: Session) -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+    deleted = db.execute(delete(Key).where(Key.created_at < cutoff)).rowcount
+    db.commit()
+    return deleted
+
+
+async def run_purger(session_factory, interval: float = 3600):
+    def run_once():
+        db = session_factory()
+        try:
+            return purge_expired_keys(db)
+        finally:
+            db.close()
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(run_once)
+        except Exception:
+            logger.exception("Idempotency key purge failed")
@@ -0,0 +1,266 @@
+import csv
+import io
+import json
+import logging
+import os
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Optional
+from sqlalchemy import func, or_, select, text, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+import models
+import schemas
+import reports
+import workload
+import similarity
+import activity
+from bulkload import BulkLoader
+from dashboard import invalidate_dashboards
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+# Per-row errors kept on the import; later ones are only counted.
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+FORMATS = ("csv", "jsonl")
+
+logger = logging.getLogger(__name__)
+
+ImportJob = models.ImportJob
+Task = models.Task
+
+TASK_FIELDS = ("title", "description", "deadline", "priority", "status", "project_id", "assignee_id")
+LOADED_COLUMNS = ("id", "org_id", *TASK_FIELDS)
+LoadedTask = namedtuple("LoadedTask", LOADED_COLUMNS)
+AMBIGUOUS = object()
+
+
+class ImportConflict(Exception):
+    """Another process moved the import on since it was read."""
+
+
+def guess_format(filename: Optional[str]) -> Optional[str]:
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    return {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl"}.get(extension)
+
+
+def read_records(stream, fmt: str, skip: int = 0):
+    """``(row, record)`` pairs from a binary stream, one row at a time.
+
+    ``record`` is a dict, or the exception raised parsing that row. The first
+    ``skip`` rows are passed over; JSONL ones without being parsed.
+    """
+    lines = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for row, record in islice(enumerate(csv.DictReader(lines), start=1), skip, None):
+            yield row, record
+        return
+    rows = enumerate((line for line in lines if line.strip()), start=1)
+    for row, line in islice(rows, skip, None):
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("Expected a JSON object")
+        except ValueError as exc:
+            record = exc
+        yield row, record
+
+
+def start_import(db: Session, org_id: int, fmt: str, filename: Optional[str] = None, created_by: Optional[int] = None):
+    job = ImportJob(org_id=org_id, format=fmt, filename=filename, created_by=created_by, status=models.JobStatus.running)
+    db.add(job)
+    db.commit()
+    return job
+
+
+def _lookup_maps(db: Session, org_id: int, records):
+    """Projects by title and id, users by username and id, for one chunk.
+
+    A title shared by several projects maps to ``AMBIGUOUS``.
+    """
+    titles, usernames, project_ids, user_ids = set(), set(), set(), set()
+    for record in records:
+        if record.get("project"):
+            titles.add(str(record["project"]))
+        if record.get("assignee"):
+            usernames.add(str(record["assignee"]))
+        for key, ids in (("project_id", project_ids), ("assignee_id", user_ids)):
+            value = record.get(key)
+            if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+                ids.add(int(value))
+
+    projects = {}
+    if titles or project_ids:
+        for project_id, title in db.execute(
+            select(models.Project.id, models.Project.title).where(
+                models.Project.org_id == org_id,
+                or_(models.Project.title.in_(titles), models.Project.id.in_(project_ids)),
+            )
+        ):
+            projects[project_id] = project_id
+            if title in titles:
+                projects[title] = AMBIGUOUS if title in projects else project_id
+    users = {}
+    if usernames or user_ids:
+        for user_id, username in db.execute(
+            select(models.User.id, models.User.username).where(
+                models.User.org_id == org_id,
+                or_(models.User.username.in_(usernames), models.User.id.in_(user_ids)),
+            )
+        ):
+            users[user_id] = users[username] = user_id
+    return projects, users
+
+
+def _resolve(record: dict, projects: dict, users: dict) -> dict:
+    values = {key: value for key, value in record.items() if key in TASK_FIELDS and value not in ("", None)}
+    for field, name_field, known, label in (
+        ("project_id", "project", projects, "project"),
+        ("assignee_id", "assignee", users, "user"),
+    ):
+        if field in values:
+            key = int(values[field])
+        elif record.get(name_field):
+            key = str(record[name_field])
+        else:
+            raise ValueError(f"Missing {field} or {name_field}")
+        resolved = known.get(key)
+        if resolved is AMBIGUOUS:
+            raise ValueError(f"More than one {label} is called {key!r}")
+        if resolved is None:
+            raise ValueError(f"Unknown {label} {key!r}")
+        values[field] = resolved
+    return values
+
+
+def _allocate_ids(db: Session, count: int):
+    if db.get_bind().dialect.name == "postgresql":
+        return db.execute(
+            text("SELECT nextval(pg_get_serial_sequence('tasks', 'id')) FROM generate_series(1, :n)"),
+            {"n": count},
+        ).scalars().all()
+    # The progress UPDATE already holds SQLite's write lock, so these are stable.
+    # sqlite_sequence remembers ids of tasks since archived or deleted.
+    used = db.execute(select(func.max(Task.id))).scalar() or 0
+    if db.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'")).first():
+        used = max(used, db.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'tasks'")).scalar() or 0)
+    first = used + 1
+    return list(range(first, first + count))
+
+
+def load_chunk(db: Session, job: ImportJob, chunk, errors: list) -> int:
+    """Validate and load one chunk in a single transaction, together with
+    the import's progress, rollups, status history and workload counters.
+
+    Returns the number of tasks loaded. ``errors`` collects rejected rows.
+    """
+    records = [record for _, record in chunk if isinstance(record, dict)]
+    projects, users = _lookup_maps(db, job.org_id, records)
+    tasks, rejected = [], []
+    for row, record in chunk:
+        try:
+            if isinstance(record, Exception):
+                raise record
+            tasks.append(schemas.TaskCreate(**_resolve(record, projects, users)))
+        except ValueError as exc:
+            rejected.append({"row": row, "error": str(exc)})
+
+    kept = errors + rejected[:max(0, IMPORT_MAX_ERRORS - len(errors))]
+    moved = db.execute(
+        update(ImportJob)
+        .where(ImportJob.id == job.id, ImportJob.rows_read == job.rows_read)
+        .values(
+            rows_read=ImportJob.rows_read + len(chunk),
+            rows_loaded=ImportJob.rows_loaded + len(tasks),
+            rows_failed=ImportJob.rows_failed + len(rejected),
+            errors=json.dumps(kept) if kept else None,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if moved.rowcount != 1:
+        db.rollback()
+        raise ImportConflict(f"Import {job.id} was resumed elsewhere")
+
+    if tasks:
+        ids = _allocate_ids(db, len(tasks))
+        loaded = [
+            LoadedTask(task_id, job.org_id, *(getattr(task, field) for field in TASK_FIELDS))
+            for task_id, task in zip(ids, tasks)
+        ]
+        loader = BulkLoader.in_session(db)
+        loader.load_chunk("tasks", LOADED_COLUMNS, list(loader.convert_rows(loaded)))
+        loader.load_chunk(
+            "task_status_events", ("task_id", "project_id", "assignee_id", "to_status"),
+            list(loader.convert_rows((t.id, t.project_id, t.assignee_id, t.status) for t in loaded)),
+        )
+
+        # One upsert per (project, status) and per workload key, not per task.
+        rollups = defaultdict(lambda: [0, 0])
+        for task in loaded:
+            counts = rollups[(task.project_id, task.status)]
+            counts[0] += 1
+            counts[1] += task.status == models.TaskStatus.completed
+        for (project_id, task_status), (created, completed) in rollups.items():
+            reports.record_rollup_delta(db, project_id, task_status, created=created, completed=completed, open_delta=created)
+        for key, count in Counter(filter(None, map(workload._counted, loaded))).items():
+            workload.record_workload_delta(db, key, count)
+        similarity.note_written(db, loaded)
+        # COPY bypasses the session, so the hook in activity.py never sees these rows.
+        for task in loaded:
+            activity.record(db, "task", task.id, "imported", {"import_id": {"to": job.id}}, org_id=job.org_id)
+
+    db.commit()
+    errors[:] = kept
+    # Mirror what the UPDATE wrote without marking ``job`` dirty.
+    for field, added in (("rows_read", len(chunk)), ("rows_loaded", len(tasks)), ("rows_failed", len(rejected))):
+        set_committed_value(job, field, getattr(job, field) + added)
+    set_committed_value(job, "errors", json.dumps(kept) if kept else None)
+    if tasks:
+        invalidate_dashboards(*{task.assignee_id for task in tasks})
+    return len(tasks)
+
+
+def run_import(db: Session, job: ImportJob, stream, chunk_size: int = IMPORT_CHUNK_SIZE, progress=None):
+    """Stream ``stream`` into ``job``, committing every ``chunk_size`` rows.
+
+    Starts after the rows already covered by ``job``, so an interrupted or
+    failed import continues where its last committed chunk ended when run
+    again with the same file. ``progress(job)`` is called after each chunk.
+    """
+    db.expire_on_commit = False
+    errors = json.loads(job.errors) if job.errors else []
+    records = read_records(stream, job.format, skip=job.rows_read)
+    try:
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            load_chunk(db, job, chunk, errors)
+            if progress is not None:
+                progress(job)
+        job.status = models.JobStatus.done
+        job.finished_at = datetime.now(timezone.utc)
+        job.last_error = None
+        activity.record(db, "import", job.id, "completed", {
+            "rows_loaded": {"to": job.rows_loaded}, "rows_failed": {"to": job.rows_failed},
+        })
+        db.commit()
+    except ImportConflict:
+        raise
+    except Exception as exc:
+        db.rollback()
+        logger.exception("Import %d stopped after %d rows", job.id, job.rows_read)
+        job.status = models.JobStatus.failed
+        job.last_error = repr(exc)[:2000]
+        db.commit()
+    return job
+
+
+def describe(job: ImportJob) -> dict:
+    return {
+        **{c: getattr(job, c) for c in (
+            "id", "filename", "format", "status", "rows_read", "rows_loaded", "rows_failed",
+            "last_error", "created_at", "finished_at",
+        )},
+        "errors": json.loads(job.errors) if job.errors else [],
+    }
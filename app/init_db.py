@@ -1,18 +1,29 @@
 import sys
 import os
-from sqlalchemy import create_engine
+import argparse
+import time
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from database import Base, DATABASE_URL
+from database import Base, DATABASE_URL, build_engine, prepare_schema
 from models import User, Project, Task, Comment, UserRole, TaskStatus, TaskPriority
 from auth import get_password_hash
+from reports import backfill_rollups, backfill_status_events
+from workload import backfill_workloads
+from datagen import generate_dataset
+import activity
+import importer
+import snapshot
+import models
+from tenancy import ensure_default_organization
 
 def create_tables():
-    engine = create_engine(DATABASE_URL)
+    engine = build_engine()
     Base.metadata.create_all(bind=engine)
+    # Users, projects and tasks default to this organization.
+    ensure_default_organization(engine)
     print("✅ Database tables created successfully!")
     return engine
 
@@ -81,7 +92,7 @@ def create_sample_data(engine):
                 description="Create modern homepage design with responsive layout",
                 project_id=project1.id,
                 assignee_id=user1.id,
-                deadline=datetime.now() + timedelta(days=7),
+                deadline=datetime.now(timezone.utc) + timedelta(days=7),
                 priority=TaskPriority.high,
                 status=TaskStatus.in_progress
             ),
@@ -90,7 +101,7 @@ def create_sample_data(engine):
                 description="Set up secure user login and registration system",
                 project_id=project1.id,
                 assignee_id=user2.id,
-                deadline=datetime.now() + timedelta(days=10),
+                deadline=datetime.now(timezone.utc) + timedelta(days=10),
                 priority=TaskPriority.medium,
                 status=TaskStatus.pending
             ),
@@ -99,7 +110,7 @@ def create_sample_data(engine):
                 description="Design mobile app user interface screens",
                 project_id=project2.id,
                 assignee_id=user1.id,
-                deadline=datetime.now() + timedelta(days=14),
+                deadline=datetime.now(timezone.utc) + timedelta(days=14),
                 priority=TaskPriority.medium,
                 status=TaskStatus.pending
             ),
@@ -108,7 +119,7 @@ def create_sample_data(engine):
                 description="Design database structure for mobile app",
                 project_id=project2.id,
                 assignee_id=user2.id,
-                deadline=datetime.now() + timedelta(days=5),
+                deadline=datetime.now(timezone.utc) + timedelta(days=5),
                 priority=TaskPriority.high,
                 status=TaskStatus.completed
             )
@@ -145,6 +156,12 @@ def create_sample_data(engine):
         
         db.commit()
         
+        # The rows above skip the API's write path; derive what it would have recorded.
+        backfill_status_events(db)
+        backfill_rollups(db)
+        backfill_workloads(db)
+        activity.flush(SessionLocal)
+        
         print("✅ Sample data created successfully!")
         print("\n📋 Sample Login Credentials:")
         print("Admin User:")
@@ -162,7 +179,187 @@ def create_sample_data(engine):
     finally:
         db.close()
 
-def main():
+def backfill(engine, command):
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+    try:
+        if command == "backfill-status-events":
+            rows = backfill_status_events(db)
+            print(f"✅ Added {rows} initial status events")
+        elif command == "backfill-workloads":
+            rows = backfill_workloads(db)
+            print(f"✅ Rebuilt workload counters for {rows} users")
+        else:
+            rows = backfill_rollups(db)
+            print(f"✅ Rebuilt {rows} daily rollup rows")
+    finally:
+        db.close()
+
+def migrate():
+    """Bring a database created by an older version up to the models."""
+    engine = build_engine()
+    added = prepare_schema(engine, "create")
+    ensure_default_organization(engine)
+    if not added:
+        print("✅ Schema is up to date")
+        return 0
+    for name in added:
+        print(f"  ➕ {name}")
+    # History and counters introduced with these tables start from the current tasks.
+    for table, command in (
+        ("task_status_events", "backfill-status-events"),
+        ("task_daily_rollups", "backfill-rollups"),
+        ("user_workloads", "backfill-workloads"),
+    ):
+        if table in added:
+            backfill(engine, command)
+    print(f"✅ Added {len(added)} tables and columns")
+    return 0
+
+def generate(engine, args):
+    print(f"🧪 Generating synthetic data (seed={args.seed})...")
+    counts = generate_dataset(
+        engine,
+        users=args.users,
+        admins=args.admins,
+        projects=args.projects,
+        tasks_per_project=args.tasks_per_project,
+        comments_per_task=args.comments_per_task,
+        skew=args.skew,
+        status_mix=args.status_mix,
+        priority_mix=args.priority_mix,
+        days=args.days,
+        seed=args.seed,
+        as_of=args.as_of,
+        password=args.password,
+        chunk_size=args.chunk_size,
+        rebuild_rollups=not args.skip_rollups,
+    )
+    print("✅ Synthetic data loaded:")
+    for table, count in counts.items():
+        print(f"  {table}: {count}")
+
+def import_tasks(engine, args):
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+    try:
+        if args.resume is not None:
+            job = db.get(models.ImportJob, args.resume)
+            if job is None:
+                print(f"❌ Import {args.resume} not found")
+                return 1
+            print(f"🔁 Resuming import {job.id} after row {job.rows_read}")
+        else:
+            fmt = args.format or importer.guess_format(args.file)
+            if fmt is None:
+                print("❌ Pass --format csv or --format jsonl")
+                return 1
+            job = importer.start_import(db, args.org_id, fmt, os.path.basename(args.file))
+            print(f"📥 Import {job.id} started")
+
+        def progress(job):
+            print(f"  {job.rows_read} rows read, {job.rows_loaded} loaded, {job.rows_failed} rejected")
+
+        with open(args.file, "rb") as stream:
+            importer.run_import(db, job, stream, args.chunk_size, progress)
+        for error in importer.describe(job)["errors"][:20]:
+            print(f"  ⚠️  row {error['row']}: {error['error']}")
+        if job.status != models.JobStatus.done:
+            print(f"❌ Import {job.id} stopped: {job.last_error}")
+            print(f"   Run again with --resume {job.id} to continue")
+            return 1
+        print(f"✅ Imported {job.rows_loaded} tasks ({job.rows_failed} rows rejected)")
+        return 0
+    finally:
+        db.close()
+
+def take_snapshot(engine, args):
+    started = time.monotonic()
+    manifest = snapshot.create_snapshot(
+        engine, args.file, project_ids=args.project, chunk_size=args.chunk_size,
+        progress=lambda table, rows: print(f"  {table}: {rows} rows"),
+    )
+    print(f"✅ Snapshot written to {args.file} in {time.monotonic() - started:.1f}s")
+    for entry in manifest["tables"]:
+        print(f"  {entry['name']}: {entry['rows']} rows in {len(entry['chunks'])} chunks")
+    return 0
+
+def restore(engine, args):
+    started = time.monotonic()
+    try:
+        loaded = snapshot.restore_snapshot(
+            engine, args.file, chunk_size=args.chunk_size,
+            progress=lambda table, rows: print(f"  {table}: {rows} rows"),
+        )
+    except snapshot.SnapshotError as exc:
+        print(f"❌ {exc}")
+        return 1
+    print(f"✅ Restored {args.file} in {time.monotonic() - started:.1f}s")
+    for table, rows in loaded.items():
+        print(f"  {table}: {rows}")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Initialize the Team Task Management database")
+    commands = parser.add_subparsers(dest="command")
+
+    gen = commands.add_parser("generate", help="Bulk load a deterministic synthetic dataset")
+    gen.add_argument("--users", type=int, default=1000, help="Regular users to create")
+    gen.add_argument("--admins", type=int, default=5, help="Admin users to create")
+    gen.add_argument("--projects", type=int, default=100)
+    gen.add_argument("--tasks-per-project", type=int, default=1000)
+    gen.add_argument("--comments-per-task", type=float, default=2.0, help="Mean of a Poisson distribution")
+    gen.add_argument("--skew", type=float, default=1.0,
+                     help="Zipf exponent for picking assignees (0 = uniform)")
+    gen.add_argument("--status-mix", default="pending:0.4,in_progress:0.2,completed:0.4")
+    gen.add_argument("--priority-mix", default="low:0.3,medium:0.5,high:0.2")
+    gen.add_argument("--days", type=int, default=365, help="History window for created_at")
+    gen.add_argument("--seed", type=int, default=42)
+    gen.add_argument("--as-of", type=datetime.fromisoformat, default=None,
+                     help="Reference time for generated timestamps (default: today 00:00 UTC)")
+    gen.add_argument("--password", default="user123", help="Password shared by every generated user")
+    gen.add_argument("--chunk-size", type=int, default=50000)
+    gen.add_argument("--skip-rollups", action="store_true", help="Do not rebuild daily rollups and workload counters afterwards")
+
+    commands.add_parser("migrate", help="Add the tables, columns and indexes an older database lacks")
+    commands.add_parser("backfill-rollups", help="Rebuild the daily task rollups")
+    commands.add_parser("backfill-status-events", help="Seed status history for existing tasks")
+    commands.add_parser("backfill-workloads", help="Rebuild per-user workload counters")
+
+    imp = commands.add_parser("import-tasks", help="Load tasks from a CSV or JSONL file")
+    imp.add_argument("file")
+    imp.add_argument("--format", choices=importer.FORMATS, help="Default: from the file extension")
+    imp.add_argument("--org-id", type=int, default=models.DEFAULT_ORG_ID)
+    imp.add_argument("--chunk-size", type=int, default=importer.IMPORT_CHUNK_SIZE)
+    imp.add_argument("--resume", type=int, help="Continue an unfinished import with this id")
+
+    snap = commands.add_parser("snapshot", help="Write a consistent archive of users, projects, tasks and comments")
+    snap.add_argument("file")
+    snap.add_argument("--project", type=int, action="append", help="Only this project (repeatable)")
+    snap.add_argument("--chunk-size", type=int, default=50000)
+
+    rest = commands.add_parser("restore", help="Load a snapshot into an empty database")
+    rest.add_argument("file")
+    rest.add_argument("--chunk-size", type=int, default=50000)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command in ("backfill-rollups", "backfill-status-events", "backfill-workloads"):
+        backfill(create_tables(), args.command)
+        return 0
+    if args.command == "migrate":
+        return migrate()
+    if args.command == "generate":
+        generate(create_tables(), args)
+        return 0
+    if args.command == "import-tasks":
+        return import_tasks(create_tables(), args)
+    if args.command == "snapshot":
+        return take_snapshot(build_engine(), args)
+    if args.command == "restore":
+        return restore(build_engine(), args)
+
     print("🚀 Initializing Team Task Management Database...")
     print(f"📍 Database URL: {DATABASE_URL}")
     
@@ -0,0 +1,265 @@
+import glob
+import json
+import logging
+import os
+import queue
+import select
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Optional
+
+# "auto" picks PostgreSQL LISTEN/NOTIFY when the database is PostgreSQL and
+# the Unix socket bus when INVALIDATION_SOCKET_DIR is set; "off" disables it.
+INVALIDATION_BUS = os.getenv("INVALIDATION_BUS", "auto")
+INVALIDATION_CHANNEL = os.getenv("INVALIDATION_CHANNEL", "cache_invalidation")
+# Shared by the workers of one host; serve.py sets it for its workers.
+INVALIDATION_SOCKET_DIR = os.getenv("INVALIDATION_SOCKET_DIR", "")
+# NOTIFY payloads must stay under 8000 bytes.
+MAX_MESSAGE_BYTES = 7900
+RECONNECT_SECONDS = 2.0
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+_bus = None
+
+
+def handler(topic: str):
+    """Register ``fn(session_factory, keys)`` for messages on ``topic`` sent
+    by other workers. It runs on the bus's listener thread."""
+    def register(fn):
+        HANDLERS[topic] = fn
+        return fn
+    return register
+
+
+def broadcast(topic: str, keys):
+    """Tell the other workers that ``keys`` of ``topic`` changed.
+
+    The caller has already updated its own process. Messages are queued
+    and sent by a background thread, so this never waits on the network.
+    """
+    bus = _bus
+    if bus is not None and keys:
+        bus.outbox.put((topic, list(keys)))
+
+
+def _encode(sender: str, topic: str, keys: list):
+    """JSON messages for ``keys``, split to fit ``MAX_MESSAGE_BYTES``."""
+    message = json.dumps({"s": sender, "t": topic, "k": keys}, separators=(",", ":"))
+    if len(message) <= MAX_MESSAGE_BYTES or len(keys) == 1:
+        return [message]
+    middle = len(keys) // 2
+    return _encode(sender, topic, keys[:middle]) + _encode(sender, topic, keys[middle:])
+
+
+class InvalidationBus:
+    """Carries invalidation messages between the workers of a deployment.
+
+    A sender thread coalesces everything queued by ``broadcast`` into one
+    message per topic; a listener thread hands messages from other workers
+    to the registered handlers. Subclasses implement ``_send``, ``_receive``
+    and ``_close``.
+    """
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.sender = uuid.uuid4().hex
+        self.outbox = queue.SimpleQueue()
+        self._stopped = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._send_loop, name="invalidation-send", daemon=True),
+            threading.Thread(target=self._listen_loop, name="invalidation-listen", daemon=True),
+        ]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stopped.set()
+        self.outbox.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._close()
+
+    def _send_loop(self):
+        while True:
+            item = self.outbox.get()
+            pending = defaultdict(set)
+            while item is not None:
+                topic, keys = item
+                pending[topic].update(map(_hashable, keys))
+                try:
+                    item = self.outbox.get_nowait()
+                except queue.Empty:
+                    break
+            for topic, keys in pending.items():
+                for message in _encode(self.sender, topic, [_plain(key) for key in keys]):
+                    try:
+                        self._send(message)
+                    except Exception:
+                        logger.exception("Sending an invalidation for %s failed", topic)
+            if item is None and self._stopped.is_set():
+                return
+
+    def _listen_loop(self):
+        while not self._stopped.is_set():
+            try:
+                messages = self._receive(timeout=1.0)
+            except Exception:
+                logger.exception("Receiving invalidations failed; retrying")
+                time.sleep(RECONNECT_SECONDS)
+                continue
+            for message in messages:
+                self.dispatch(message)
+
+    def dispatch(self, message: str):
+        try:
+            data = json.loads(message)
+            if data["s"] == self.sender:
+                return
+            fn = HANDLERS.get(data["t"])
+            if fn is not None:
+                fn(self.session_factory, data["k"])
+        except Exception:
+            logger.exception("Applying invalidation %.200s failed", message)
+
+    def _send(self, message: str):
+        raise NotImplementedError
+
+    def _receive(self, timeout: float):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+def _hashable(key):
+    return tuple(key) if isinstance(key, list) else key
+
+
+def _plain(key):
+    return list(key) if isinstance(key, tuple) else key
+
+
+class PostgresBus(InvalidationBus):
+    """LISTEN/NOTIFY on ``INVALIDATION_CHANNEL`` over two dedicated
+    autocommit connections, outside the pool."""
+
+    def __init__(self, session_factory, bind, channel: str = INVALIDATION_CHANNEL):
+        super().__init__(session_factory)
+        self.bind = bind
+        self.channel = channel
+        self._listener = None
+        self._notifier = None
+
+    def _connect(self):
+        dialect = self.bind.dialect
+        cargs, cparams = dialect.create_connect_args(self.bind.url)
+        conn = dialect.connect(*cargs, **cparams)
+        conn.autocommit = True
+        return conn
+
+    def _send(self, message: str):
+        if self._notifier is None or self._notifier.closed:
+            self._notifier = self._connect()
+        try:
+            with self._notifier.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, message))
+        except Exception:
+            self._notifier.close()
+            raise
+
+    def _receive(self, timeout: float):
+        if self._listener is None:
+            listener = self._connect()
+            with listener.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+            self._listener = listener
+        try:
+            if not select.select([self._listener], [], [], timeout)[0]:
+                return []
+            self._listener.poll()
+        except Exception:
+            # Messages sent until the next LISTEN are lost; cache TTLs bound the staleness.
+            self._listener.close()
+            self._listener = None
+            raise
+        messages = [notify.payload for notify in self._listener.notifies]
+        self._listener.notifies.clear()
+        return messages
+
+    def _close(self):
+        for conn in (self._listener, self._notifier):
+            if conn is not None and not conn.closed:
+                conn.close()
+
+
+class SocketBus(InvalidationBus):
+    """Unix datagram sockets, one per worker, in a directory shared by the
+    workers of one host. Sockets nobody listens on any more are removed."""
+
+    def __init__(self, session_factory, directory: str):
+        super().__init__(session_factory)
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}-{self.sender[:8]}.sock")
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(self.path)
+        self._out = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._out.setblocking(False)
+
+    def _send(self, message: str):
+        data = message.encode()
+        for peer in glob.glob(os.path.join(self.directory, "*.sock")):
+            if peer == self.path:
+                continue
+            try:
+                self._out.sendto(data, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                try:
+                    os.unlink(peer)
+                except FileNotFoundError:
+                    pass
+            except BlockingIOError:
+                logger.warning("Invalidation queue of %s is full; dropping a message", peer)
+
+    def _receive(self, timeout: float):
+        if not select.select([self.socket], [], [], timeout)[0]:
+            return []
+        return [self.socket.recv(65536).decode()]
+
+    def _close(self):
+        self.socket.close()
+        self._out.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def start(bind, session_factory, mode: str = INVALIDATION_BUS) -> Optional[InvalidationBus]:
+    global _bus
+    if mode == "auto":
+        if bind.dialect.name == "postgresql":
+            mode = "postgres"
+        elif INVALIDATION_SOCKET_DIR:
+            mode = "socket"
+        else:
+            return None
+    if mode == "postgres":
+        _bus = PostgresBus(session_factory, bind).start()
+    elif mode == "socket":
+        _bus = SocketBus(session_factory, INVALIDATION_SOCKET_DIR).start()
+    return _bus
+
+
+def stop():
+    global _bus
+    bus, _bus = _bus, None
+    if bus is not None:
+        bus.stop()
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.orm import Session
+import models
+
+# Handlers run at most this many at once per process; 0 disables the runner.
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "20"))
+# Idle poll interval; commits that enqueue work wake the runner sooner.
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", "2"))
+JOB_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "600"))
+# A running job locked for longer than this belongs to a dead worker.
+JOB_LOCK_SECONDS = float(os.getenv("JOB_LOCK_SECONDS", "300"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+
+logger = logging.getLogger(__name__)
+
+Job = models.Job
+JobStatus = models.JobStatus
+HANDLERS = {}
+_runners = set()
+
+
+def handler(kind: str, max_attempts: int = JOB_MAX_ATTEMPTS):
+    """Register ``fn(db, payload)`` as the handler for jobs of ``kind``.
+
+    The handler runs in its own session; the job is marked done in the same
+    transaction, so a handler that raises leaves no partial writes behind.
+    """
+    def register(fn):
+        HANDLERS[kind] = (fn, max_attempts)
+        return fn
+    return register
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def enqueue(db: Session, kind: str, payload: dict, delay: float = 0):
+    """Add a job to the caller's transaction; it runs once that commits."""
+    _, max_attempts = HANDLERS.get(kind, (None, JOB_MAX_ATTEMPTS))
+    db.execute(insert(Job).values(
+        kind=kind,
+        payload=json.dumps(jsonable_encoder(payload)),
+        status=JobStatus.queued,
+        attempts=0,
+        max_attempts=max_attempts,
+        run_at=utcnow() + timedelta(seconds=delay),
+    ))
+    db.info["jobs_enqueued"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_runners(session):
+    if session.info.pop("jobs_enqueued", False):
+        for runner in list(_runners):
+            runner.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_enqueued(session):
+    session.info.pop("jobs_enqueued", None)
+
+
+def backoff(attempts: int) -> float:
+    delay = min(JOB_BACKOFF_MAX_SECONDS, JOB_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def claim_jobs(db: Session, worker: str, limit: int):
+    """Lock up to ``limit`` due jobs for ``worker`` and return them.
+
+    PostgreSQL picks candidates with ``FOR UPDATE SKIP LOCKED`` so workers
+    never queue behind each other. SQLite has a single writer, which makes
+    the UPDATE ... WHERE id IN (SELECT ...) atomic on its own.
+    """
+    now = utcnow()
+    db.execute(
+        update(Job)
+        .where(Job.status == JobStatus.running, Job.locked_at < now - timedelta(seconds=JOB_LOCK_SECONDS))
+        .values(status=JobStatus.queued, locked_by=None, locked_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    due = (
+        select(Job.id)
+        .where(Job.status == JobStatus.queued, Job.run_at <= now)
+        .order_by(Job.run_at, Job.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    jobs = db.execute(
+        update(Job)
+        .where(Job.id.in_(due.scalar_subquery()))
+        .values(status=JobStatus.running, locked_by=worker, locked_at=now, attempts=Job.attempts + 1)
+        .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return jobs
+
+
+def purge_finished_jobs(db: Session, older_than: float = JOB_RETENTION_SECONDS) -> int:
+    cutoff = utcnow() - timedelta(seconds=older_than)
+    result = db.execute(
+        delete(Job).where(Job.status == JobStatus.done, Job.finished_at < cutoff)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def queue_depth(db: Session) -> dict:
+    rows = db.execute(select(Job.status, func.count()).group_by(Job.status))
+    depth = {status.value: 0 for status in JobStatus}
+    depth.update({status.value: count for status, count in rows})
+    return depth
+
+
+class JobRunner:
+    """Runs queued jobs in worker threads from an asyncio loop.
+
+    Claims at most as many jobs as it has free slots, retries failures with
+    exponential backoff and keeps per-kind counters in ``metrics``.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        concurrency: int = JOB_CONCURRENCY,
+        batch_size: int = JOB_BATCH_SIZE,
+        poll_interval: float = JOB_POLL_SECONDS,
+    ):
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.worker = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self.metrics = defaultdict(lambda: {"succeeded": 0, "retried": 0, "failed": 0, "seconds": 0.0})
+        self._metrics_lock = threading.Lock()
+        self._running = set()
+        self._loop = None
+        self._wake = None
+        self._purged_at = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._running)
+
+    def wake(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _with_session(self, fn, *args):
+        db = self.session_factory()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+
+    def _record(self, kind: str, outcome: str, seconds: float):
+        with self._metrics_lock:
+            stats = self.metrics[kind]
+            stats[outcome] += 1
+            stats["seconds"] += seconds
+
+    def execute(self, db: Session, job):
+        started = time.perf_counter()
+        try:
+            fn, _ = HANDLERS[job.kind]
+            fn(db, json.loads(job.payload))
+            db.execute(
+                update(Job).where(Job.id == job.id)
+                .values(status=JobStatus.done, finished_at=utcnow(), locked_by=None, last_error=None)
+            )
+            db.commit()
+            self._record(job.kind, "succeeded", time.perf_counter() - started)
+        except Exception as exc:
+            db.rollback()
+            final = job.attempts >= job.max_attempts
+            if final:
+                logger.exception("Job %d (%s) failed for good after %d attempts", job.id, job.kind, job.attempts)
+                values = dict(status=JobStatus.failed, finished_at=utcnow())
+            else:
+                logger.warning("Job %d (%s) failed, retrying: %s", job.id, job.kind, exc)
+                values = dict(status=JobStatus.queued, run_at=utcnow() + timedelta(seconds=backoff(job.attempts)))
+            db.execute(
+                update(Job).where(Job.id == job.id)
+                .values(**values, locked_by=None, locked_at=None, last_error=repr(exc)[:2000])
+            )
+            db.commit()
+            self._record(job.kind, "failed" if final else "retried", time.perf_counter() - started)
+
+    async def _execute(self, job):
+        try:
+            await asyncio.to_thread(self._with_session, self.execute, job)
+        finally:
+            self.wake()
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._purged_at = time.monotonic()
+        _runners.add(self)
+        try:
+            while True:
+                self._wake.clear()
+                free = self.concurrency - len(self._running)
+                claimed = []
+                if free > 0:
+                    try:
+                        claimed = await asyncio.to_thread(
+                            self._with_session, claim_jobs, self.worker, min(free, self.batch_size)
+                        )
+                    except Exception:
+                        logger.exception("Claiming jobs failed")
+                for job in claimed:
+                    task = asyncio.create_task(self._execute(job))
+                    self._running.add(task)
+                    task.add_done_callback(self._running.discard)
+                if time.monotonic() - self._purged_at > JOB_RETENTION_SECONDS / 24:
+                    self._purged_at = time.monotonic()
+                    try:
+                        await asyncio.to_thread(self._with_session, purge_finished_jobs)
+                    except Exception:
+                        logger.exception("Purging finished jobs failed")
+                if free > 0 and len(claimed) == min(free, self.batch_size):
+                    continue
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            _runners.discard(self)
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Wait for handlers already running, e.g. on shutdown."""
+        if self._running:
+            await asyncio.wait(set(self._running), timeout=timeout)
@@ -1,20 +1,77 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Query
+import asyncio
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, status, Query, Header, Response, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import delete, insert, literal, literal_column, or_, select, union_all, update, Text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
-from datetime import timedelta
-from typing import List, Optional
+from datetime import date, datetime
+from typing import List, Literal, Optional
 import models
 import schemas
-from database import engine, get_db
+from config import settings
+from database import engine, get_db, prepare_schema, warm_pool, SessionLocal
 from auth import (
-    authenticate_user, create_access_token, get_current_user, 
-    get_current_admin_user, get_password_hash, ACCESS_TOKEN_EXPIRE_MINUTES
+    authenticate_user, create_token_pair, get_current_user, get_current_admin_user,
+    get_password_hash, rotate_refresh_token, Principal
 )
+from revocation import revoke_tokens
+from dashboard import get_user_dashboard, invalidate_dashboards
+import reports
+import archive
+import deadlines
+import access
+import tenancy
+import idempotency
+import jobs
+import notifications
+import activity
+import dependencies
+import similarity
+import workload
+import importer
+import invalidation
+from admission import AdmissionControlMiddleware, page_size
+from idempotency import idempotent
 
-models.Base.metadata.create_all(bind=engine)
+job_runner = jobs.JobRunner(SessionLocal)
 
-app = FastAPI(title="Team Task Management API")
+def prepare_database():
+    prepare_schema(engine)
+    tenancy.ensure_default_organization(engine)
 
+def start_database():
+    # Nothing touches the database at import time, so workers import even
+    # while it is unreachable and only the schema check waits for it.
+    prepare_database()
+    warm_pool(engine, settings.pool_warm_connections)
+    invalidation.start(engine, SessionLocal)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(start_database)
+    background = [asyncio.create_task(idempotency.run_purger(SessionLocal))]
+    if archive.ARCHIVE_INTERVAL_SECONDS > 0:
+        background.append(asyncio.create_task(archive.run_archiver(SessionLocal)))
+    if jobs.JOB_CONCURRENCY > 0:
+        background.append(asyncio.create_task(job_runner.run()))
+    if notifications.NOTIFY_INTERVAL_SECONDS > 0:
+        background.append(asyncio.create_task(notifications.run_scheduler(SessionLocal)))
+    if activity.ACTIVITY_FLUSH_SECONDS > 0:
+        background.append(asyncio.create_task(activity.run_flusher(SessionLocal)))
+    if similarity.SIMILARITY_REBUILD_SECONDS > 0:
+        background.append(asyncio.create_task(similarity.run_rebuild(SessionLocal)))
+    yield
+    for task in background:
+        task.cancel()
+    await job_runner.drain(timeout=10)
+    await asyncio.to_thread(activity.flush, SessionLocal)
+    await asyncio.to_thread(invalidation.stop)
+
+app = FastAPI(title="Team Task Management API", lifespan=lifespan)
+
+app.add_middleware(AdmissionControlMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -23,26 +80,148 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.post("/auth/register", response_model=schemas.User)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
-    hashed_password = get_password_hash(user.password)
-    db_user = models.User(
-        username=user.username,
-        email=user.email,
-        hashed_password=hashed_password,
-        role=user.role
+USER_COLUMNS = models.User.__table__.c
+PROJECT_COLUMNS = models.Project.__table__.c
+TASK_COLUMNS = models.Task.__table__.c
+COMMENT_COLUMNS = models.Comment.__table__.c
+# Task fields whose changes feed rollups, status history, workloads and dashboards.
+TRACKED_TASK_FIELDS = {"status", "project_id", "assignee_id", "priority", "deadline"}
+TaskSnapshot = namedtuple("TaskSnapshot", ["status", "project_id", "assignee_id", "priority", "deadline"])
+
+def task_access_error(db: Session, task_id: int, owner_id: Optional[int] = None, version: Optional[int] = None):
+    # Only reached after a conditional statement matched nothing.
+    task = db.query(models.Task.assignee_id, models.Task.version).filter(models.Task.id == task_id).first()
+    if task is None:
+        return HTTPException(status_code=404, detail="Task not found")
+    if owner_id is not None and task.assignee_id != owner_id:
+        return HTTPException(status_code=403, detail="Not enough permissions")
+    if version is not None:
+        return version_conflict("Task", task.version)
+    return HTTPException(status_code=403, detail="Not enough permissions")
+
+def version_conflict(kind: str, current_version: int):
+    return HTTPException(
+        status_code=409,
+        detail=f"{kind} was modified by someone else (current version {current_version})",
+        headers={"ETag": f'"{current_version}"'},
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+
+def expected_version(if_match: Optional[str], body_version: Optional[int]) -> Optional[int]:
+    """Combine an ``If-Match`` header and a body ``expected_version``."""
+    header_version = None
+    if if_match is not None and if_match.strip() != "*":
+        tag = if_match.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        try:
+            header_version = int(tag.strip('"'))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="If-Match must be a version ETag such as \"3\"")
+    if header_version is not None and body_version is not None and header_version != body_version:
+        raise HTTPException(status_code=400, detail="If-Match and expected_version disagree")
+    return header_version if header_version is not None else body_version
+
+def update_task_row(
+    db: Session,
+    task_id: int,
+    changes: dict,
+    owner_id: Optional[int] = None,
+    version: Optional[int] = None,
+    with_previous: bool = False,
+):
+    """UPDATE a task in place and return ``(new_row, previous)``.
+
+    The row only matches if it is owned by ``owner_id`` and still at
+    ``version`` (when given); every update bumps the version.
+
+    ``previous`` holds the pre-update values of ``TaskSnapshot``'s fields when
+    ``with_previous`` is set. PostgreSQL returns them from the same statement
+    by joining a CTE that snapshots the row. SQLite cannot return FROM-clause
+    columns, so it reads them first; that costs no network round trip there.
+    """
+    criteria = [models.Task.id == task_id]
+    if owner_id is not None:
+        criteria.append(models.Task.assignee_id == owner_id)
+    if version is not None:
+        criteria.append(models.Task.version == version)
+    stmt = (
+        update(models.Task)
+        .values(**changes, version=models.Task.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+    if not with_previous:
+        row = db.execute(stmt.where(*criteria).returning(*TASK_COLUMNS)).one_or_none()
+        return row, row
+
+    if db.get_bind().dialect.name == "postgresql":
+        previous = (
+            select(models.Task.id, *[getattr(models.Task, field) for field in TaskSnapshot._fields])
+            .where(*criteria)
+            .cte("previous")
+        )
+        row = db.execute(
+            stmt.where(models.Task.id == previous.c.id).returning(
+                *TASK_COLUMNS,
+                *[previous.c[field].label(f"previous_{field}") for field in TaskSnapshot._fields],
+            )
+        ).one_or_none()
+        if row is None:
+            return None, None
+        return row, TaskSnapshot(*[row._mapping[f"previous_{field}"] for field in TaskSnapshot._fields])
+
+    previous = db.execute(
+        select(*[getattr(models.Task, field) for field in TaskSnapshot._fields]).where(*criteria)
+    ).one_or_none()
+    if previous is None:
+        return None, None
+    row = db.execute(stmt.where(*criteria).returning(*TASK_COLUMNS)).one_or_none()
+    return row, previous
+
+@app.get("/health")
+def health():
+    """Ready once start-up has finished and the database answers."""
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("SELECT 1")
+    except OperationalError:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ok"}
+
+@app.post("/auth/register", response_model=schemas.User)
+def register_user(
+    user: schemas.UserCreate,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    with idempotent(db, idempotency_key, "POST /auth/register", None, user) as claim:
+        if claim.replay is not None:
+            return claim.replay
+        taken = db.execute(
+            select(models.User.username, models.User.email)
+            .where(or_(models.User.username == user.username, models.User.email == user.email))
+            .limit(2)
+        ).all()
+        if any(username == user.username for username, _ in taken):
+            raise HTTPException(status_code=400, detail="Username already registered")
+        if taken:
+            raise HTTPException(status_code=400, detail="Email already registered")
+        org_id = user.org_id or models.DEFAULT_ORG_ID
+        if user.org_id is not None and db.get(models.Organization, org_id) is None:
+            raise HTTPException(status_code=404, detail="Organization not found")
+        
+        hashed_password = get_password_hash(user.password)
+        db_user = db.execute(
+            insert(models.User).values(
+                username=user.username,
+                email=user.email,
+                hashed_password=hashed_password,
+                role=user.role,
+                org_id=org_id
+            ).returning(*USER_COLUMNS)
+        ).one()
+        claim.save(schemas.User, db_user)
+        db.commit()
     return db_user
 
 @app.post("/auth/login", response_model=schemas.Token)
@@ -54,34 +233,93 @@ def login_for_access_token(user_credentials: schemas.UserLogin, db: Session = De
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return create_token_pair(db, user)
+
+@app.post("/auth/refresh", response_model=schemas.Token)
+def refresh_access_token(request: schemas.RefreshRequest, db: Session = Depends(get_db)):
+    return rotate_refresh_token(db, request.refresh_token)
+
+@app.post("/auth/logout")
+def logout(db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    revoke_tokens(db, current_user.id)
+    return {"message": "All sessions signed out"}
+
+@app.post("/organizations", response_model=schemas.Organization)
+def create_organization(
+    organization: schemas.OrganizationCreate,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    if db.query(models.Organization.id).filter(models.Organization.name == organization.name).first():
+        raise HTTPException(status_code=400, detail="Organization already exists")
+    db_organization = db.execute(
+        insert(models.Organization).values(name=organization.name).returning(*models.Organization.__table__.c)
+    ).one()
+    db.commit()
+    return db_organization
+
+@app.get("/organizations/me", response_model=schemas.Organization)
+def read_my_organization(db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    return db.get(models.Organization, current_user.org_id)
 
 @app.get("/auth/me", response_model=schemas.User)
-def read_users_me(current_user: models.User = Depends(get_current_user)):
-    return current_user
+def read_users_me(db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    user = db.get(models.User, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+@app.get("/me/dashboard", response_model=schemas.Dashboard)
+def read_my_dashboard(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    return get_user_dashboard(db, current_user.id)
+
+@app.get("/me/notifications", response_model=schemas.NotificationPage)
+def read_my_notifications(
+    cursor: Optional[int] = Query(None),
+    limit: int = Depends(page_size(20)),
+    unread_only: bool = False,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    return notifications.read_page(db, current_user.id, cursor, limit, unread_only)
+
+@app.post("/me/notifications/read")
+def mark_notifications_read(
+    request: schemas.NotificationsRead,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    marked = notifications.mark_read(db, current_user.id, request.ids, request.up_to)
+    return {"message": "Notifications marked as read", "marked": marked}
 
 @app.post("/projects", response_model=schemas.Project)
 def create_project(
     project: schemas.ProjectCreate,
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_user)
 ):
-    db_project = models.Project(**project.dict(), creator_id=current_user.id)
-    db.add(db_project)
-    db.commit()
-    db.refresh(db_project)
+    with idempotent(db, idempotency_key, "POST /projects", current_user.id, project) as claim:
+        if claim.replay is not None:
+            return claim.replay
+        db_project = db.execute(
+            insert(models.Project)
+            .values(**project.dict(), creator_id=current_user.id, org_id=current_user.org_id)
+            .returning(*PROJECT_COLUMNS)
+        ).one()
+        claim.save(schemas.Project, db_project)
+        db.commit()
     return db_project
 
 @app.get("/projects", response_model=List[schemas.Project])
 def read_projects(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Depends(page_size(100)),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     projects = db.query(models.Project).offset(skip).limit(limit).all()
     return projects
@@ -89,183 +327,641 @@ def read_projects(
 @app.get("/projects/{project_id}", response_model=schemas.Project)
 def read_project(
     project_id: int,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     project = db.query(models.Project).filter(models.Project.id == project_id).first()
     if project is None:
         raise HTTPException(status_code=404, detail="Project not found")
+    response.headers["ETag"] = f'"{project.version}"'
     return project
 
 @app.put("/projects/{project_id}", response_model=schemas.Project)
 def update_project(
     project_id: int,
     project: schemas.ProjectUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_user)
 ):
-    db_project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    version = expected_version(if_match, project.expected_version)
+    changes = project.dict(exclude_unset=True, exclude={"expected_version"})
+    criteria = [models.Project.id == project_id]
+    if version is not None:
+        criteria.append(models.Project.version == version)
+    if changes:
+        db_project = db.execute(
+            update(models.Project)
+            .where(*criteria)
+            .values(**changes, version=models.Project.version + 1)
+            .returning(*PROJECT_COLUMNS)
+            .execution_options(synchronize_session=False)
+        ).one_or_none()
+    else:
+        db_project = db.query(models.Project).filter(*criteria).first()
     if db_project is None:
-        raise HTTPException(status_code=404, detail="Project not found")
-    
-    for key, value in project.dict(exclude_unset=True).items():
-        setattr(db_project, key, value)
+        db.rollback()
+        current = db.query(models.Project.version).filter(models.Project.id == project_id).scalar()
+        if current is None:
+            raise HTTPException(status_code=404, detail="Project not found")
+        raise version_conflict("Project", current)
     
+    if changes:
+        activity.record(db, "project", project_id, "updated", activity.diff(changes))
     db.commit()
-    db.refresh(db_project)
+    response.headers["ETag"] = f'"{db_project.version}"'
     return db_project
 
 @app.delete("/projects/{project_id}")
 def delete_project(
     project_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_user)
 ):
-    db_project = db.query(models.Project).filter(models.Project.id == project_id).first()
-    if db_project is None:
+    # Children first, one statement per table, all in one transaction.
+    project_tasks = select(models.Task.id).where(models.Task.project_id == project_id)
+    archived_tasks = select(models.ArchivedTask.id).where(models.ArchivedTask.project_id == project_id)
+    db.execute(delete(models.Comment).where(models.Comment.task_id.in_(project_tasks)))
+    db.execute(delete(models.ArchivedComment).where(models.ArchivedComment.task_id.in_(archived_tasks)))
+    dependencies.detach_tasks(db, project_tasks)
+    deleted_tasks = db.execute(
+        delete(models.Task).where(models.Task.project_id == project_id).returning(
+            models.Task.id, models.Task.status, models.Task.assignee_id,
+            models.Task.org_id, models.Task.priority, models.Task.deadline,
+        )
+    ).all()
+    similarity.note_deleted(db, [task.id for task in deleted_tasks])
+    workload.defer_tasks_removed(db, deleted_tasks)
+    db.execute(delete(models.ArchivedTask).where(models.ArchivedTask.project_id == project_id))
+    members = db.execute(
+        delete(models.ProjectMember).where(models.ProjectMember.project_id == project_id)
+        .returning(models.ProjectMember.user_id)
+    ).scalars().all()
+    deleted = db.execute(
+        delete(models.Project).where(models.Project.id == project_id).returning(models.Project.id)
+    ).first()
+    if deleted is None:
+        db.rollback()
         raise HTTPException(status_code=404, detail="Project not found")
-    
-    db.delete(db_project)
+    reports.rollup_project_deleted(db, project_id)
+    activity.record(db, "project", project_id, "deleted")
     db.commit()
+    invalidate_dashboards(*{task.assignee_id for task in deleted_tasks})
+    access.invalidate_access(*members)
     return {"message": "Project deleted successfully"}
 
+@app.get("/projects/{project_id}/members", response_model=List[schemas.ProjectMember])
+def read_project_members(
+    project_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    # Memberships carry no org_id; the project decides which tenant they belong to.
+    if db.execute(select(literal(1)).where(tenancy.in_tenant(models.Project, current_user.org_id, project_id))).first() is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return db.query(models.ProjectMember).filter(models.ProjectMember.project_id == project_id).all()
+
+@app.post("/projects/{project_id}/members", response_model=schemas.ProjectMember)
+def add_project_member(
+    project_id: int,
+    member: schemas.ProjectMemberCreate,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    if db.query(models.Project.id).filter(models.Project.id == project_id).first() is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if db.query(models.User.id).filter(models.User.id == member.user_id).first() is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    db_member = db.get(models.ProjectMember, (project_id, member.user_id))
+    if db_member is None:
+        db_member = models.ProjectMember(project_id=project_id, user_id=member.user_id)
+        db.add(db_member)
+        db.commit()
+        db.refresh(db_member)
+    access.invalidate_access(member.user_id)
+    return db_member
+
+@app.delete("/projects/{project_id}/members/{user_id}")
+def remove_project_member(
+    project_id: int,
+    user_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    removed = db.execute(
+        delete(models.ProjectMember)
+        .where(
+            models.ProjectMember.project_id == project_id,
+            models.ProjectMember.user_id == user_id,
+            tenancy.in_tenant(models.Project, current_user.org_id, project_id),
+        )
+        .returning(models.ProjectMember.user_id)
+    ).first()
+    if removed is None:
+        raise HTTPException(status_code=404, detail="Membership not found")
+    activity.record(db, "project", project_id, "member_removed", {"user_id": {"from": user_id, "to": None}})
+    db.commit()
+    access.invalidate_access(user_id)
+    return {"message": "Member removed successfully"}
+
 @app.post("/tasks", response_model=schemas.Task)
 def create_task(
     task: schemas.TaskCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_user)
 ):
-    db_task = models.Task(**task.dict())
-    db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
+    with idempotent(db, idempotency_key, "POST /tasks", current_user.id, task) as claim:
+        if claim.replay is not None:
+            return claim.replay
+        org_id = current_user.org_id
+        db_task = db.execute(
+            tenancy.insert_checked(
+                models.Task, task.dict(), org_id,
+                tenancy.in_tenant(models.Project, org_id, task.project_id),
+                tenancy.in_tenant(models.User, org_id, task.assignee_id),
+            ).returning(*TASK_COLUMNS)
+        ).one_or_none()
+        if db_task is None:
+            raise HTTPException(status_code=404, detail="Project or assignee not found")
+        reports.defer_task_created(db, db_task)
+        similarity.note_written(db, [db_task])
+        claim.save(schemas.Task, db_task)
+        db.commit()
+    invalidate_dashboards(db_task.assignee_id)
+    duplicates = similarity.possible_duplicates(
+        db_task.org_id, db_task.title, db_task.description, exclude=[db_task.id]
+    )
+    if duplicates:
+        response.headers["X-Possible-Duplicates"] = ", ".join(map(str, duplicates))
     return db_task
 
+def filter_tasks(query, model, current_user, status=None, priority=None, assignee_id=None):
+    # The session listener skips UNIONs, so filter on the tenant here too.
+    query = query.filter(model.org_id == current_user.org_id)
+    scope = access.task_scope(model, current_user)
+    if scope is not None:
+        query = query.filter(scope)
+    if assignee_id:
+        query = query.filter(model.assignee_id == assignee_id)
+    
+    if status:
+        query = query.filter(model.status == status)
+    if priority:
+        query = query.filter(model.priority == priority)
+    return query
+
 @app.get("/tasks", response_model=List[schemas.Task])
 def read_tasks(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Depends(page_size(100)),
     status: Optional[models.TaskStatus] = Query(None),
     priority: Optional[models.TaskPriority] = Query(None),
     assignee_id: Optional[int] = Query(None),
+    include_archived: bool = False,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    query = db.query(models.Task)
+    if not include_archived:
+        query = filter_tasks(db.query(models.Task), models.Task, current_user, status, priority, assignee_id)
+        return query.offset(skip).limit(limit).all()
 
-    if current_user.role != models.UserRole.admin:
-        query = query.filter(models.Task.assignee_id == current_user.id)
-    elif assignee_id:
-        query = query.filter(models.Task.assignee_id == assignee_id)
-    
-    if status:
-        query = query.filter(models.Task.status == status)
-    if priority:
-        query = query.filter(models.Task.priority == priority)
-    
-    tasks = query.offset(skip).limit(limit).all()
-    return tasks
+    live, archived = [
+        filter_tasks(
+            select(*[getattr(model, c) for c in archive.TASK_COLUMNS]),
+            model, current_user, status, priority, assignee_id,
+        )
+        for model in (models.Task, models.ArchivedTask)
+    ]
+    tasks = db.execute(union_all(live, archived).offset(skip).limit(limit))
+    return tasks.mappings().all()
+
+# Static /tasks/... routes are declared before /tasks/{task_id} so that
+# "suggest-assignee" and "due" are not parsed as task ids.
+@app.get("/tasks/suggest-assignee", response_model=List[schemas.UserWorkload])
+def suggest_assignee(
+    project_id: int,
+    limit: int = Depends(page_size(5)),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    if db.execute(select(literal(1)).where(tenancy.in_tenant(models.Project, current_user.org_id, project_id))).first() is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return workload.suggest_assignees(db, current_user.org_id, project_id, limit)
+
+@app.get("/tasks/due", response_model=List[schemas.DueTask])
+def read_due_tasks(
+    within: str = Query("7d", pattern=r"^[1-9][0-9]{0,3}[hdw]$"),
+    include_overdue: bool = True,
+    limit: int = Depends(page_size(100)),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    window = deadlines.parse_window(within)
+    if window.days > deadlines.MAX_CALENDAR_DAYS:
+        raise HTTPException(status_code=400, detail="Window too large")
+    return deadlines.due_tasks(db, current_user, window, include_overdue, limit)
+
+@app.get("/calendar", response_model=List[schemas.CalendarDay])
+def read_calendar(
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (date_to - date_from).days >= deadlines.MAX_CALENDAR_DAYS:
+        raise HTTPException(status_code=400, detail="Date range too large")
+    return deadlines.calendar(db, current_user, date_from, date_to)
 
 @app.get("/tasks/{task_id}", response_model=schemas.Task)
 def read_task(
     task_id: int,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     task = db.query(models.Task).filter(models.Task.id == task_id).first()
     if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    if current_user.role != models.UserRole.admin and task.assignee_id != current_user.id:
+    if not access.can_see_task(db, current_user, task.assignee_id, task.project_id):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
+    response.headers["ETag"] = f'"{task.version}"'
     return task
 
 @app.put("/tasks/{task_id}", response_model=schemas.Task)
 def update_task(
     task_id: int,
     task: schemas.TaskUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    db_task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if db_task is None:
-        raise HTTPException(status_code=404, detail="Task not found")
+    is_admin = current_user.role == models.UserRole.admin
+    changes = task.dict(exclude_unset=True, exclude={"expected_version"})
+    if not is_admin and changes.keys() - {"status"}:
+        raise HTTPException(status_code=403, detail="Users can only update task status")
+    owner_id = None if is_admin else current_user.id
+    version = expected_version(if_match, task.expected_version)
 
-    if current_user.role != models.UserRole.admin and db_task.assignee_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if not changes:
+        db_task = db.query(models.Task).filter(models.Task.id == task_id).first()
+        if (
+            db_task is None
+            or (owner_id is not None and db_task.assignee_id != owner_id)
+            or (version is not None and db_task.version != version)
+        ):
+            raise task_access_error(db, task_id, owner_id, version)
+        response.headers["ETag"] = f'"{db_task.version}"'
+        return db_task
 
-    if current_user.role != models.UserRole.admin:
-        if task.dict(exclude_unset=True).keys() - {"status"}:
-            raise HTTPException(status_code=403, detail="Users can only update task status")
-    
-    for key, value in task.dict(exclude_unset=True).items():
-        setattr(db_task, key, value)
+    if changes.get("project_id") is not None or changes.get("assignee_id") is not None:
+        references = [
+            tenancy.in_tenant(model, current_user.org_id, changes[field])
+            for model, field in ((models.Project, "project_id"), (models.User, "assignee_id"))
+            if changes.get(field) is not None
+        ]
+        if db.execute(select(literal(1)).where(*references)).first() is None:
+            raise HTTPException(status_code=404, detail="Project or assignee not found")
+
+    tracked = bool(changes.keys() & TRACKED_TASK_FIELDS)
+    db_task, previous = update_task_row(db, task_id, changes, owner_id, version, with_previous=tracked)
+    if db_task is None:
+        db.rollback()
+        raise task_access_error(db, task_id, owner_id, version)
     
+    if tracked:
+        reports.defer_task_moved(db, db_task, previous)
+    activity.record(db, "task", task_id, "updated", activity.diff(changes, previous if tracked else None))
+    if changes.keys() & {"title", "description"}:
+        similarity.note_written(db, [db_task])
     db.commit()
-    db.refresh(db_task)
+    invalidate_dashboards(previous.assignee_id, db_task.assignee_id)
+    response.headers["ETag"] = f'"{db_task.version}"'
     return db_task
 
 @app.delete("/tasks/{task_id}")
 def delete_task(
     task_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_user)
 ):
-    db_task = db.query(models.Task).filter(models.Task.id == task_id).first()
+    db.execute(delete(models.Comment).where(models.Comment.task_id == task_id))
+    dependencies.detach_tasks(db, [task_id])
+    db_task = db.execute(
+        delete(models.Task)
+        .where(models.Task.id == task_id)
+        .returning(
+            models.Task.project_id, models.Task.status, models.Task.assignee_id,
+            models.Task.org_id, models.Task.priority, models.Task.deadline,
+        )
+    ).one_or_none()
     if db_task is None:
+        db.rollback()
         raise HTTPException(status_code=404, detail="Task not found")
     
-    db.delete(db_task)
+    reports.defer_task_deleted(db, db_task)
+    activity.record(db, "task", task_id, "deleted")
+    similarity.note_deleted(db, [task_id])
     db.commit()
+    invalidate_dashboards(db_task.assignee_id)
     return {"message": "Task deleted successfully"}
 
 @app.post("/comments", response_model=schemas.Comment)
 def create_comment(
     comment: schemas.CommentCreate,
+    idempotency_key: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
+    with idempotent(db, idempotency_key, "POST /comments", current_user.id, comment) as claim:
+        if claim.replay is not None:
+            return claim.replay
+        # INSERT ... SELECT only matches when the task exists and is visible.
+        target = select(
+            literal(comment.content, Text), models.Task.id, literal(current_user.id), models.Task.org_id
+        ).where(models.Task.id == comment.task_id, models.Task.org_id == current_user.org_id)
+        scope = access.task_scope(models.Task, current_user)
+        if scope is not None:
+            target = target.where(scope)
+        # RETURNING renders target columns unqualified, so spell the correlation out.
+        task_assignee = (
+            select(models.Task.assignee_id)
+            .where(models.Task.id == literal_column("comments.task_id"))
+            .scalar_subquery()
+        )
+        db_comment = db.execute(
+            insert(models.Comment)
+            .from_select(["content", "task_id", "author_id", "org_id"], target)
+            .returning(*COMMENT_COLUMNS, task_assignee.label("task_assignee_id"))
+        ).one_or_none()
+        if db_comment is None:
+            db.rollback()
+            raise task_access_error(db, comment.task_id)
+        
+        claim.save(schemas.Comment, db_comment)
+        db.commit()
+    invalidate_dashboards(db_comment.task_assignee_id)
+    return db_comment
 
-    task = db.query(models.Task).filter(models.Task.id == comment.task_id).first()
+@app.get("/tasks/{task_id}/comments", response_model=List[schemas.Comment])
+def read_task_comments(
+    task_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    task = db.query(models.Task.assignee_id, models.Task.project_id).filter(models.Task.id == task_id).first()
     if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    if current_user.role != models.UserRole.admin and task.assignee_id != current_user.id:
+    if not access.can_see_task(db, current_user, task.assignee_id, task.project_id):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    db_comment = models.Comment(**comment.dict(), author_id=current_user.id)
-    db.add(db_comment)
+    comments = db.query(models.Comment).filter(models.Comment.task_id == task_id).all()
+    return comments
+
+@app.post("/tasks/{task_id}/dependencies", response_model=schemas.Dependency)
+def add_task_dependency(
+    task_id: int,
+    dependency: schemas.DependencyCreate,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    found = db.execute(
+        select(models.Task.id).where(models.Task.id.in_([task_id, dependency.blocker_id]))
+    ).scalars().all()
+    if len(set(found)) != len({task_id, dependency.blocker_id}):
+        raise HTTPException(status_code=404, detail="Task not found")
+    if db.get(models.TaskDependency, (dependency.blocker_id, task_id)) is not None:
+        raise HTTPException(status_code=400, detail="Dependency already exists")
+    try:
+        dependencies.add_dependency(db, dependency.blocker_id, task_id, current_user.org_id)
+    except dependencies.DependencyCycle as exc:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(exc))
+    activity.record(db, "task", task_id, "blocker_added", {"blocker_id": {"to": dependency.blocker_id}})
     db.commit()
-    db.refresh(db_comment)
-    return db_comment
+    return {"blocker_id": dependency.blocker_id, "blocked_id": task_id}
 
-@app.get("/tasks/{task_id}/comments", response_model=List[schemas.Comment])
-def read_task_comments(
+@app.delete("/tasks/{task_id}/dependencies/{blocker_id}")
+def remove_task_dependency(
+    task_id: int,
+    blocker_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    if not dependencies.remove_dependency(db, blocker_id, task_id, current_user.org_id):
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Dependency not found")
+    activity.record(db, "task", task_id, "blocker_removed", {"blocker_id": {"from": blocker_id, "to": None}})
+    db.commit()
+    return {"message": "Dependency removed successfully"}
+
+def visible_task_or_error(db: Session, task_id: int, current_user: Principal):
+    task = db.query(models.Task.assignee_id, models.Task.project_id).filter(models.Task.id == task_id).first()
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if not access.can_see_task(db, current_user, task.assignee_id, task.project_id):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+@app.get("/tasks/{task_id}/blockers", response_model=List[schemas.LinkedTask])
+def read_task_blockers(
+    task_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    visible_task_or_error(db, task_id, current_user)
+    return dependencies.linked_tasks(db, current_user, task_id, "blockers")
+
+@app.get("/tasks/{task_id}/blocked", response_model=List[schemas.LinkedTask])
+def read_blocked_tasks(
+    task_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    visible_task_or_error(db, task_id, current_user)
+    return dependencies.linked_tasks(db, current_user, task_id, "blocked")
+
+@app.get("/tasks/{task_id}/similar", response_model=List[schemas.SimilarTask])
+def read_similar_tasks(
     task_id: int,
+    limit: int = Depends(page_size(10)),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     task = db.query(models.Task).filter(models.Task.id == task_id).first()
     if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    
-    if current_user.role != models.UserRole.admin and task.assignee_id != current_user.id:
+    if not access.can_see_task(db, current_user, task.assignee_id, task.project_id):
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    comments = db.query(models.Comment).filter(models.Comment.task_id == task_id).all()
-    return comments
+
+    # Over-fetch so that tasks the caller cannot see still leave ``limit``.
+    scores = dict(similarity.similar_to(task.org_id, task.title, task.description, limit * 3, exclude=[task_id]))
+    if not scores:
+        return []
+    query = select(
+        models.Task.id, models.Task.title, models.Task.status, models.Task.project_id, models.Task.assignee_id
+    ).where(models.Task.id.in_(list(scores)))
+    scope = access.task_scope(models.Task, current_user)
+    if scope is not None:
+        query = query.where(scope)
+    rows = [{**row, "score": scores[row["id"]]} for row in db.execute(query).mappings()]
+    rows.sort(key=lambda row: (-row["score"], row["id"]))
+    return rows[:limit]
+
+@app.get("/projects/{project_id}/critical-path", response_model=schemas.CriticalPath)
+def read_critical_path(
+    project_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    if db.get(models.Project, project_id) is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return dependencies.critical_path(db, project_id)
+
+@app.get("/tasks/{task_id}/activity", response_model=schemas.ActivityPage)
+def read_task_activity(
+    task_id: int,
+    cursor: Optional[int] = Query(None),
+    limit: int = Depends(page_size(50)),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    task = db.query(models.Task.assignee_id, models.Task.project_id).filter(models.Task.id == task_id).first()
+    if task is None:
+        # Deleted tasks keep their history; only admins can still read it.
+        if not access.is_admin(current_user):
+            raise HTTPException(status_code=404, detail="Task not found")
+    elif not access.can_see_task(db, current_user, task.assignee_id, task.project_id):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    criteria = [models.ActivityLog.entity == "task", models.ActivityLog.entity_id == task_id]
+    return activity.read_page(db, criteria, cursor, limit)
+
+@app.get("/activity", response_model=schemas.ActivityPage)
+def read_activity(
+    since: Optional[datetime] = Query(None),
+    cursor: Optional[int] = Query(None),
+    actor_id: Optional[int] = Query(None),
+    limit: int = Depends(page_size(100)),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    criteria = []
+    if since is not None:
+        criteria.append(models.ActivityLog.created_at >= deadlines.as_utc(since))
+    if actor_id is not None:
+        criteria.append(models.ActivityLog.actor_id == actor_id)
+    return activity.read_page(db, criteria, cursor, limit, newest_first=False)
+
+@app.get("/reports/timeseries", response_model=List[schemas.TimeseriesPoint])
+def read_timeseries(
+    date_from: date = Query(..., alias="from"),
+    date_to: date = Query(..., alias="to"),
+    granularity: Literal["day", "week", "month"] = "day",
+    project_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (date_to - date_from).days > 3660:
+        raise HTTPException(status_code=400, detail="Date range too large")
+    return reports.read_timeseries(db, date_from, date_to, granularity, project_id)
+
+@app.get("/reports/cycle-time", response_model=schemas.CycleTimeReport)
+def read_cycle_time(
+    project_id: Optional[int] = Query(None),
+    since: Optional[datetime] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    return reports.cycle_time_report(db, project_id, since)
+
+@app.post("/reports/rollups/backfill")
+def backfill_rollups(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    rows = reports.backfill_rollups(db)
+    return {"message": "Rollups rebuilt", "rows": rows}
+
+@app.post("/import/tasks", response_model=schemas.ImportJob)
+def import_tasks(
+    file: UploadFile = File(...),
+    format: Optional[Literal["csv", "jsonl"]] = None,
+    resume: Optional[int] = Query(None, description="Id of an unfinished import to continue"),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    if resume is not None:
+        job = db.get(models.ImportJob, resume)
+        if job is None or job.org_id != current_user.org_id:
+            raise HTTPException(status_code=404, detail="Import not found")
+        if job.status == models.JobStatus.done:
+            raise HTTPException(status_code=409, detail="Import already finished")
+    else:
+        fmt = format or importer.guess_format(file.filename)
+        if fmt is None:
+            raise HTTPException(status_code=400, detail="Pass format=csv or format=jsonl")
+        job = importer.start_import(db, current_user.org_id, fmt, file.filename, current_user.id)
+    try:
+        importer.run_import(db, job, file.file)
+    except importer.ImportConflict as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return importer.describe(job)
+
+@app.get("/import/tasks/{import_id}", response_model=schemas.ImportJob)
+def read_import(
+    import_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    job = db.get(models.ImportJob, import_id)
+    if job is None or job.org_id != current_user.org_id:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return importer.describe(job)
+
+@app.get("/jobs/metrics")
+def read_job_metrics(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    return {
+        "worker": job_runner.worker,
+        "running": job_runner.in_flight,
+        "queue": jobs.queue_depth(db),
+        "handlers": job_runner.metrics,
+    }
+
+@app.get("/users/workload", response_model=List[schemas.UserWorkload])
+def read_user_workloads(
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    return workload.read_workloads(db, current_user.org_id)
 
 @app.get("/users", response_model=List[schemas.User])
 def read_users(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Depends(page_size(100)),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_user)
 ):
     users = db.query(models.User).offset(skip).limit(limit).all()
     return users
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Hand over to the multi-worker launcher in a fresh interpreter; its
+    # spawned workers would otherwise re-import this script as __mp_main__.
+    import os
+    import sys
+    launcher = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py")
+    os.execv(sys.executable, [sys.executable, launcher, *sys.argv[1:]])
\ No newline at end of file
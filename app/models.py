@@ -1,9 +1,34 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Boolean, ForeignKey, Enum, Index
+from sqlalchemy.orm import declared_attr, relationship
 from sqlalchemy.sql import func
+from sqlalchemy.types import TypeDecorator
+from datetime import timezone
 from database import Base
 import enum
 
+class UTCDateTime(TypeDecorator):
+    """``DateTime(timezone=True)`` that reads back as aware UTC everywhere.
+
+    PostgreSQL stores an instant; SQLite stores whatever text it is given, so
+    aware values are converted to UTC before they are written there and the
+    naive values it returns are marked as UTC.
+    """
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value.tzinfo is not None and dialect.name == "sqlite":
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+
+
 class UserRole(enum.Enum):
     admin = "admin"
     user = "user"
@@ -18,64 +43,341 @@ class TaskPriority(enum.Enum):
     medium = "medium"
     high = "high"
 
-class User(Base):
+DEFAULT_ORG_ID = 1
+
+class Organization(Base):
+    __tablename__ = "organizations"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, nullable=False)
+    created_at = Column(UTCDateTime(), server_default=func.now())
+
+class TenantScoped:
+    # Rows of these models are filtered to the caller's organization by the
+    # session listener in tenancy.py; indexes lead with org_id to match.
+    @declared_attr
+    def org_id(cls):
+        return Column(
+            Integer, ForeignKey("organizations.id"), nullable=False,
+            default=DEFAULT_ORG_ID, server_default=str(DEFAULT_ORG_ID),
+        )
+
+class User(TenantScoped, Base):
     __tablename__ = "users"
     
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True)
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
-    role = Column(Enum(UserRole), default=UserRole.user)
+    role = Column(Enum(UserRole, create_constraint=True), default=UserRole.user)
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(UTCDateTime(), server_default=func.now())
+    token_version = Column(Integer, nullable=False, default=1, server_default="1")
+    tokens_changed_at = Column(UTCDateTime(), server_default=func.now(), index=True)
     
     # Relationships
     assigned_tasks = relationship("Task", back_populates="assignee")
     created_projects = relationship("Project", back_populates="creator")
     comments = relationship("Comment", back_populates="author")
 
-class Project(Base):
+    # Usernames and emails stay globally unique: login happens before the
+    # organization is known.
+    __table_args__ = (
+        Index("ix_users_org_id_id", "org_id", "id"),
+    )
+
+class Project(TenantScoped, Base):
     __tablename__ = "projects"
     
     id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, index=True)
+    title = Column(String)
     description = Column(Text)
     creator_id = Column(Integer, ForeignKey("users.id"))
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(UTCDateTime(), server_default=func.now())
+    updated_at = Column(UTCDateTime(), onupdate=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Relationships
     creator = relationship("User", back_populates="created_projects")
     tasks = relationship("Task", back_populates="project")
 
-class Task(Base):
+    __table_args__ = (
+        Index("ix_projects_org_title", "org_id", "title"),
+    )
+
+class Task(TenantScoped, Base):
     __tablename__ = "tasks"
     
     id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, index=True)
+    title = Column(String)
     description = Column(Text)
-    deadline = Column(DateTime)
-    priority = Column(Enum(TaskPriority), default=TaskPriority.medium)
-    status = Column(Enum(TaskStatus), default=TaskStatus.pending)
+    deadline = Column(UTCDateTime())
+    priority = Column(Enum(TaskPriority, create_constraint=True), default=TaskPriority.medium)
+    status = Column(Enum(TaskStatus, create_constraint=True), default=TaskStatus.pending)
     project_id = Column(Integer, ForeignKey("projects.id"))
     assignee_id = Column(Integer, ForeignKey("users.id"))
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(UTCDateTime(), server_default=func.now())
+    updated_at = Column(UTCDateTime(), onupdate=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Relationships
     project = relationship("Project", back_populates="tasks")
     assignee = relationship("User", back_populates="assigned_tasks")
     comments = relationship("Comment", back_populates="task")
 
-class Comment(Base):
+    __table_args__ = (
+        Index("ix_tasks_org_status_updated_at", "org_id", "status", "updated_at"),
+        Index("ix_tasks_org_assignee_status", "org_id", "assignee_id", "status"),
+        Index("ix_tasks_org_project_deadline", "org_id", "project_id", "deadline"),
+        Index("ix_tasks_org_assignee_deadline", "org_id", "assignee_id", "deadline"),
+        Index("ix_tasks_org_deadline", "org_id", "deadline"),
+        Index("ix_tasks_org_title", "org_id", "title"),
+        # Archived rows keep their ids, so SQLite must never hand them out again.
+        {"sqlite_autoincrement": True},
+    )
+
+class Comment(TenantScoped, Base):
     __tablename__ = "comments"
     
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text)
     task_id = Column(Integer, ForeignKey("tasks.id"))
     author_id = Column(Integer, ForeignKey("users.id"))
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(UTCDateTime(), server_default=func.now())
     
     # Relationships
     task = relationship("Task", back_populates="comments")
-    author = relationship("User", back_populates="comments")
\ No newline at end of file
+    author = relationship("User", back_populates="comments")
+
+    __table_args__ = (
+        Index("ix_comments_org_task", "org_id", "task_id"),
+        {"sqlite_autoincrement": True},
+    )
+
+class TaskDailyRollup(Base):
+    __tablename__ = "task_daily_rollups"
+    
+    day = Column(Date, primary_key=True)
+    project_id = Column(Integer, primary_key=True)
+    status = Column(Enum(TaskStatus, create_constraint=True), primary_key=True)
+    created = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    # Tasks sitting in this status at the end of the day
+    open_eod = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_task_daily_rollups_project_status_day", "project_id", "status", "day"),
+    )
+
+class TaskStatusEvent(Base):
+    __tablename__ = "task_status_events"
+    
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=False)
+    project_id = Column(Integer)
+    assignee_id = Column(Integer)
+    from_status = Column(Enum(TaskStatus, create_constraint=True))
+    to_status = Column(Enum(TaskStatus, create_constraint=True), nullable=False)
+    created_at = Column(UTCDateTime(), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_task_status_events_task_created", "task_id", "created_at"),
+        Index("ix_task_status_events_project_created", "project_id", "created_at"),
+    )
+
+class ArchivedTask(TenantScoped, Base):
+    __tablename__ = "archived_tasks"
+    
+    id = Column(Integer, primary_key=True)
+    title = Column(String)
+    description = Column(Text)
+    deadline = Column(UTCDateTime())
+    priority = Column(Enum(TaskPriority, create_constraint=True))
+    status = Column(Enum(TaskStatus, create_constraint=True))
+    project_id = Column(Integer)
+    assignee_id = Column(Integer)
+    created_at = Column(UTCDateTime())
+    updated_at = Column(UTCDateTime())
+    version = Column(Integer)
+    archived_at = Column(UTCDateTime(), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_archived_tasks_org_project", "org_id", "project_id"),
+        Index("ix_archived_tasks_org_assignee", "org_id", "assignee_id"),
+    )
+
+class ArchivedComment(TenantScoped, Base):
+    __tablename__ = "archived_comments"
+    
+    id = Column(Integer, primary_key=True)
+    content = Column(Text)
+    task_id = Column(Integer)
+    author_id = Column(Integer)
+    created_at = Column(UTCDateTime())
+    archived_at = Column(UTCDateTime(), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_archived_comments_org_task", "org_id", "task_id"),
+    )
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    
+    scope = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    request_hash = Column(String, nullable=False)
+    status_code = Column(Integer)
+    response = Column(Text)
+    created_at = Column(UTCDateTime(), server_default=func.now(), index=True)
+    completed_at = Column(UTCDateTime())
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    
+    jti = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    created_at = Column(UTCDateTime(), server_default=func.now())
+    expires_at = Column(UTCDateTime(), nullable=False)
+    used_at = Column(UTCDateTime())
+
+class ProjectMember(Base):
+    __tablename__ = "project_members"
+    
+    project_id = Column(Integer, ForeignKey("projects.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    created_at = Column(UTCDateTime(), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_project_members_user_project", "user_id", "project_id"),
+    )
+
+class JobStatus(enum.Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(Enum(JobStatus, create_constraint=True), nullable=False, default=JobStatus.queued)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(UTCDateTime(), nullable=False)
+    locked_by = Column(String)
+    locked_at = Column(UTCDateTime())
+    last_error = Column(Text)
+    created_at = Column(UTCDateTime(), server_default=func.now())
+    finished_at = Column(UTCDateTime())
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+class Notification(TenantScoped, Base):
+    __tablename__ = "notifications"
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String, nullable=False)
+    title = Column(String, nullable=False)
+    body = Column(Text)
+    # JSON list of the task ids the digest covers
+    task_ids = Column(Text)
+    created_at = Column(UTCDateTime(), server_default=func.now())
+    read_at = Column(UTCDateTime())
+    delivered_at = Column(UTCDateTime())
+
+    __table_args__ = (
+        Index("ix_notifications_user_id", "user_id", "id"),
+        Index("ix_notifications_user_read_at", "user_id", "read_at"),
+    )
+
+class Watermark(Base):
+    __tablename__ = "watermarks"
+    
+    name = Column(String, primary_key=True)
+    value = Column(UTCDateTime(), nullable=False)
+
+class ActivityLog(TenantScoped, Base):
+    __tablename__ = "activity_log"
+    
+    id = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)
+    actor_id = Column(Integer)
+    # JSON object of field -> {"from": old, "to": new}; "from" only when known
+    changes = Column(Text)
+    created_at = Column(UTCDateTime(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_activity_log_org_entity_time", "org_id", "entity", "entity_id", "created_at"),
+        Index("ix_activity_log_org_actor_time", "org_id", "actor_id", "created_at"),
+        Index("ix_activity_log_org_time", "org_id", "created_at"),
+    )
+
+class TaskDependency(TenantScoped, Base):
+    __tablename__ = "task_dependencies"
+    
+    # blocked_id cannot start until blocker_id is done
+    blocker_id = Column(Integer, ForeignKey("tasks.id"), primary_key=True)
+    blocked_id = Column(Integer, ForeignKey("tasks.id"), primary_key=True)
+    created_at = Column(UTCDateTime(), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_task_dependencies_org_blocked_blocker", "org_id", "blocked_id", "blocker_id"),
+    )
+
+class TaskClosure(TenantScoped, Base):
+    __tablename__ = "task_closure"
+    
+    # One row per pair connected by a chain of dependencies, derived from
+    # task_dependencies; depth is the length of the shortest chain.
+    ancestor_id = Column(Integer, primary_key=True)
+    descendant_id = Column(Integer, primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_task_closure_org_descendant_ancestor", "org_id", "descendant_id", "ancestor_id"),
+    )
+
+class UserWorkload(TenantScoped, Base):
+    __tablename__ = "user_workloads"
+    
+    # Open (not completed) tasks assigned to the user, by priority
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    open_low = Column(Integer, nullable=False, default=0)
+    open_medium = Column(Integer, nullable=False, default=0)
+    open_high = Column(Integer, nullable=False, default=0)
+
+class UserDueDay(TenantScoped, Base):
+    __tablename__ = "user_due_days"
+    
+    # Open tasks of the user with a deadline on this UTC day; empty days are deleted
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    open = Column(Integer, nullable=False, default=0)
+
+class ImportJob(TenantScoped, Base):
+    __tablename__ = "import_jobs"
+    
+    id = Column(Integer, primary_key=True)
+    created_by = Column(Integer, ForeignKey("users.id"))
+    filename = Column(String)
+    format = Column(String, nullable=False)
+    status = Column(Enum(JobStatus, create_constraint=True), nullable=False, default=JobStatus.running)
+    # Rows covered by committed chunks, rejected ones included; a resumed
+    # import skips this many.
+    rows_read = Column(Integer, nullable=False, default=0)
+    rows_loaded = Column(Integer, nullable=False, default=0)
+    rows_failed = Column(Integer, nullable=False, default=0)
+    # JSON list of {"row", "error"}; only the first few are kept
+    errors = Column(Text)
+    last_error = Column(Text)
+    created_at = Column(UTCDateTime(), server_default=func.now())
+    updated_at = Column(UTCDateTime(), onupdate=func.now())
+    finished_at = Column(UTCDateTime())
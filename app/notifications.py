@@ -0,0 +1,223 @@
+import asyncio
+import json
+import logging
+import os
+import smtplib
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import Optional
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+import models
+import jobs
+from deadlines import as_utc
+
+# How far ahead a deadline counts as "due soon".
+REMINDER_LEAD_SECONDS = float(os.getenv("REMINDER_LEAD_SECONDS", "86400"))
+# Set to 0 to disable the deadline scan.
+NOTIFY_INTERVAL_SECONDS = float(os.getenv("NOTIFY_INTERVAL_SECONDS", "60"))
+# "file", "smtp" or "none"
+NOTIFICATION_SINK = os.getenv("NOTIFICATION_SINK", "file")
+NOTIFICATION_FILE = os.getenv("NOTIFICATION_FILE", "notifications.log")
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "25"))
+SMTP_FROM = os.getenv("SMTP_FROM", "tasks@localhost")
+
+WATERMARK = "deadline_reminders"
+
+logger = logging.getLogger(__name__)
+
+Task = models.Task
+Notification = models.Notification
+
+
+class FileSink:
+    """Appends one JSON line per message; the stand-in for a mail server."""
+
+    def __init__(self, path: str = NOTIFICATION_FILE):
+        self.path = path
+
+    def send(self, recipient: str, subject: str, body: str):
+        line = json.dumps({"to": recipient, "subject": subject, "body": body})
+        with open(self.path, "a", encoding="utf-8") as sink:
+            sink.write(line + "\n")
+
+
+class SmtpSink:
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, sender: str = SMTP_FROM):
+        self.host = host
+        self.port = port
+        self.sender = sender
+
+    def send(self, recipient: str, subject: str, body: str):
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = recipient
+        message["Subject"] = subject
+        message.set_content(body)
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            smtp.send_message(message)
+
+
+class NullSink:
+    def send(self, recipient: str, subject: str, body: str):
+        pass
+
+
+def make_sink(kind: str = NOTIFICATION_SINK):
+    return {"file": FileSink, "smtp": SmtpSink, "none": NullSink}[kind]()
+
+
+sink = make_sink()
+
+
+def scan_deadlines(db: Session, now: Optional[datetime] = None) -> int:
+    """Turn deadlines crossed since the last scan into per-user digests.
+
+    Each scan covers only the deadline window that moved past since the
+    previous one: tasks that became overdue in ``(watermark, now]`` and
+    tasks that came within the reminder lead in ``(watermark + lead,
+    now + lead]``. Both are range scans on ``ix_tasks_org_deadline``, so the
+    cost follows the number of crossings, not the size of ``tasks``. The
+    watermark moves with a compare-and-set in the same transaction as the
+    digests, so concurrent scanners cannot both report a window. Returns the
+    number of digests written.
+    """
+    now = now or datetime.now(timezone.utc)
+    lead = timedelta(seconds=REMINDER_LEAD_SECONDS)
+    watermark = db.get(models.Watermark, WATERMARK)
+    if watermark is None:
+        # Start from now rather than reporting every deadline already missed.
+        db.execute(insert(models.Watermark).values(name=WATERMARK, value=now))
+        db.commit()
+        return 0
+    since = as_utc(watermark.value)
+    if since >= now:
+        return 0
+
+    # Naming the organizations lets the scan use the org-leading deadline index.
+    org_ids = db.execute(select(models.Organization.id)).scalars().all()
+    crossed = db.execute(
+        select(Task.id, Task.title, Task.deadline, Task.assignee_id, Task.org_id)
+        .where(
+            Task.org_id.in_(org_ids),
+            or_(
+                and_(Task.deadline > since, Task.deadline <= now),
+                and_(Task.deadline > since + lead, Task.deadline <= now + lead),
+            ),
+            Task.status != models.TaskStatus.completed,
+            Task.assignee_id.is_not(None),
+        )
+        .order_by(Task.deadline, Task.id)
+    ).all()
+
+    digests = defaultdict(list)
+    for task in crossed:
+        digests[(task.org_id, task.assignee_id)].append(task)
+    rows = [build_digest(org_id, user_id, tasks, now) for (org_id, user_id), tasks in digests.items()]
+
+    moved = db.execute(
+        update(models.Watermark)
+        .where(models.Watermark.name == WATERMARK, models.Watermark.value == watermark.value)
+        .values(value=now)
+        .execution_options(synchronize_session=False)
+    )
+    if moved.rowcount != 1:
+        db.rollback()
+        return 0
+    if rows:
+        ids = db.execute(insert(Notification).returning(Notification.id), rows).scalars().all()
+        for notification_id in ids:
+            jobs.enqueue(db, "notifications.deliver", {"id": notification_id})
+    db.commit()
+    return len(rows)
+
+
+def build_digest(org_id: int, user_id: int, tasks, now: datetime) -> dict:
+    lines = []
+    for task in tasks:
+        deadline = as_utc(task.deadline)
+        when = "overdue since" if deadline <= now else "due"
+        lines.append(f"- {task.title} ({when} {deadline:%Y-%m-%d %H:%M} UTC)")
+    overdue = sum(as_utc(task.deadline) <= now for task in tasks)
+    parts = []
+    if overdue:
+        parts.append(f"{overdue} overdue")
+    if len(tasks) - overdue:
+        parts.append(f"{len(tasks) - overdue} due soon")
+    return {
+        "org_id": org_id,
+        "user_id": user_id,
+        "kind": "deadline_digest",
+        "title": f"Deadlines: {', '.join(parts)}",
+        "body": "\n".join(lines),
+        "task_ids": json.dumps([task.id for task in tasks]),
+    }
+
+
+@jobs.handler("notifications.deliver")
+def deliver(db: Session, payload: dict):
+    row = db.execute(
+        select(Notification, models.User.email)
+        .join(models.User, models.User.id == Notification.user_id)
+        .where(Notification.id == payload["id"], Notification.delivered_at.is_(None))
+    ).first()
+    if row is None:
+        return
+    notification, email = row
+    sink.send(email, notification.title, notification.body or "")
+    notification.delivered_at = datetime.now(timezone.utc)
+
+
+def read_page(db: Session, user_id: int, cursor: Optional[int], limit: int, unread_only: bool = False):
+    """Newest first; pass the returned ``next_cursor`` back to continue."""
+    query = select(Notification).where(Notification.user_id == user_id)
+    if cursor is not None:
+        query = query.where(Notification.id < cursor)
+    if unread_only:
+        query = query.where(Notification.read_at.is_(None))
+    items = db.execute(query.order_by(Notification.id.desc()).limit(limit + 1)).scalars().all()
+    unread = db.execute(
+        select(func.count()).where(Notification.user_id == user_id, Notification.read_at.is_(None))
+    ).scalar_one()
+    return {
+        "items": [
+            {**{c: getattr(n, c) for c in ("id", "kind", "title", "body", "created_at", "read_at")},
+             "task_ids": json.loads(n.task_ids or "[]")}
+            for n in items[:limit]
+        ],
+        "next_cursor": items[limit - 1].id if len(items) > limit else None,
+        "unread": unread,
+    }
+
+
+def mark_read(db: Session, user_id: int, ids=None, up_to: Optional[int] = None) -> int:
+    criteria = [Notification.user_id == user_id, Notification.read_at.is_(None)]
+    if ids is not None:
+        criteria.append(Notification.id.in_(ids))
+    if up_to is not None:
+        criteria.append(Notification.id <= up_to)
+    result = db.execute(
+        update(Notification).where(*criteria)
+        .values(read_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+async def run_scheduler(session_factory, interval: float = NOTIFY_INTERVAL_SECONDS):
+    def run_once():
+        db = session_factory()
+        try:
+            return scan_deadlines(db)
+        finally:
+            db.close()
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(run_once)
+        except Exception:
+            logger.exception("Deadline scan failed")
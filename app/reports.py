@@ -0,0 +1,536 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from itertools import chain
+from typing import Optional
+import numpy as np
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+import models
+import jobs
+import workload
+from tenancy import tenant_project_ids
+
+Rollup = models.TaskDailyRollup
+StatusEvent = models.TaskStatusEvent
+
+STATUS_CODES = {task_status: code for code, task_status in enumerate(models.TaskStatus)}
+STATUSES = list(models.TaskStatus)
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+def utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _upsert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(Rollup)
+    return sqlite.insert(Rollup)
+
+
+def record_rollup_delta(
+    db: Session,
+    project_id: Optional[int],
+    status: models.TaskStatus,
+    created: int = 0,
+    completed: int = 0,
+    open_delta: int = 0,
+    day: Optional[date] = None,
+):
+    if project_id is None or not (created or completed or open_delta):
+        return
+    day = day or utc_today()
+    previous_open = (
+        select(Rollup.open_eod)
+        .where(Rollup.project_id == project_id, Rollup.status == status, Rollup.day < day)
+        .order_by(Rollup.day.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    stmt = _upsert(db).values(
+        day=day,
+        project_id=project_id,
+        status=status,
+        created=created,
+        completed=completed,
+        open_eod=func.coalesce(previous_open, 0) + open_delta,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Rollup.day, Rollup.project_id, Rollup.status],
+        set_={
+            "created": Rollup.created + created,
+            "completed": Rollup.completed + completed,
+            "open_eod": Rollup.open_eod + open_delta,
+        },
+    )
+    db.execute(stmt)
+    if open_delta:
+        # Jobs can land out of order: days already rolled up after this one
+        # carried the old count forward, so move them along with it.
+        db.execute(
+            update(Rollup)
+            .where(Rollup.project_id == project_id, Rollup.status == status, Rollup.day > day)
+            .values(open_eod=Rollup.open_eod + open_delta)
+        )
+
+
+def rollup_task_created(db: Session, task: models.Task, day: Optional[date] = None):
+    record_rollup_delta(
+        db, task.project_id, task.status,
+        created=1,
+        completed=int(task.status == models.TaskStatus.completed),
+        open_delta=1,
+        day=day,
+    )
+
+
+def rollup_task_moved(db: Session, old_project_id, old_status, new_project_id, new_status, day: Optional[date] = None):
+    if (old_project_id, old_status) == (new_project_id, new_status):
+        return
+    record_rollup_delta(db, old_project_id, old_status, open_delta=-1, day=day)
+    record_rollup_delta(
+        db, new_project_id, new_status,
+        completed=int(
+            new_status == models.TaskStatus.completed and old_status != models.TaskStatus.completed
+        ),
+        open_delta=1,
+        day=day,
+    )
+
+
+def rollup_task_deleted(db: Session, task: models.Task, day: Optional[date] = None):
+    record_rollup_delta(db, task.project_id, task.status, open_delta=-1, day=day)
+
+
+def rollup_project_deleted(db: Session, project_id: int):
+    db.execute(delete(Rollup).where(Rollup.project_id == project_id))
+
+
+def backfill_rollups(db: Session, batch_size: int = 10000) -> int:
+    """Rebuild the rollup table from the current contents of ``tasks``.
+
+    A task is assumed to have sat in its current status since creation, or
+    in ``pending`` until its last update if it is completed. In a session
+    scoped to an organization only that organization's projects are rebuilt.
+    """
+    deltas = defaultdict(lambda: [0, 0, 0])
+    rows = db.execute(
+        select(
+            models.Task.project_id,
+            models.Task.status,
+            models.Task.created_at,
+            models.Task.updated_at,
+        ).where(models.Task.project_id.is_not(None)).execution_options(yield_per=batch_size)
+    )
+    for project_id, task_status, created_at, updated_at in rows:
+        created_day = (created_at or datetime.now(timezone.utc)).date()
+        if task_status == models.TaskStatus.completed:
+            changed_at = updated_at or created_at
+            completed_day = max(changed_at.date(), created_day) if changed_at else created_day
+            deltas[(created_day, project_id, models.TaskStatus.pending)][0] += 1
+            deltas[(created_day, project_id, models.TaskStatus.pending)][2] += 1
+            deltas[(completed_day, project_id, models.TaskStatus.pending)][2] -= 1
+            deltas[(completed_day, project_id, models.TaskStatus.completed)][1] += 1
+            deltas[(completed_day, project_id, models.TaskStatus.completed)][2] += 1
+        else:
+            deltas[(created_day, project_id, task_status)][0] += 1
+            deltas[(created_day, project_id, task_status)][2] += 1
+
+    running_open = defaultdict(int)
+    values = []
+    for (day, project_id, task_status) in sorted(deltas, key=lambda k: (k[0], k[1], k[2].value)):
+        created, completed, open_delta = deltas[(day, project_id, task_status)]
+        running_open[(project_id, task_status)] += open_delta
+        values.append({
+            "day": day,
+            "project_id": project_id,
+            "status": task_status,
+            "created": created,
+            "completed": completed,
+            "open_eod": running_open[(project_id, task_status)],
+        })
+
+    stale = delete(Rollup)
+    tenant_projects = tenant_project_ids(db)
+    if tenant_projects is not None:
+        # Rollups carry no org_id, so the tenant filter cannot reach them.
+        stale = stale.where(Rollup.project_id.in_(tenant_projects))
+    db.execute(stale)
+    for start in range(0, len(values), batch_size):
+        db.execute(insert(Rollup), values[start:start + batch_size])
+    db.commit()
+    return len(values)
+
+
+def _period_start(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def read_timeseries(
+    db: Session,
+    date_from: date,
+    date_to: date,
+    granularity: str = "day",
+    project_id: Optional[int] = None,
+):
+    tenant_projects = tenant_project_ids(db)
+    in_range = db.query(Rollup).filter(Rollup.day >= date_from, Rollup.day <= date_to)
+    if project_id is not None:
+        in_range = in_range.filter(Rollup.project_id == project_id)
+    if tenant_projects is not None:
+        in_range = in_range.filter(Rollup.project_id.in_(tenant_projects))
+    rows = in_range.order_by(Rollup.day).all()
+
+    # Carry forward each (project, status) from its last row before the window.
+    last_day = (
+        db.query(Rollup.project_id, Rollup.status, func.max(Rollup.day).label("day"))
+        .filter(Rollup.day < date_from)
+    )
+    if project_id is not None:
+        last_day = last_day.filter(Rollup.project_id == project_id)
+    if tenant_projects is not None:
+        last_day = last_day.filter(Rollup.project_id.in_(tenant_projects))
+    last_day = last_day.group_by(Rollup.project_id, Rollup.status).subquery()
+    seeds = (
+        db.query(Rollup)
+        .join(
+            last_day,
+            (Rollup.project_id == last_day.c.project_id)
+            & (Rollup.status == last_day.c.status)
+            & (Rollup.day == last_day.c.day),
+        )
+        .all()
+    )
+
+    open_now = {(r.project_id, r.status): r.open_eod for r in seeds}
+    open_total = defaultdict(int)
+    for (_, task_status), open_eod in open_now.items():
+        open_total[task_status] += open_eod
+    rows_by_day = defaultdict(list)
+    for row in rows:
+        rows_by_day[row.day].append(row)
+
+    points = []
+    bucket = None
+    created = completed = None
+    day = date_from
+    while day <= date_to:
+        period = _period_start(day, granularity)
+        if period != bucket:
+            bucket = period
+            created = defaultdict(int)
+            completed = defaultdict(int)
+        for row in rows_by_day.get(day, ()):
+            created[row.status] += row.created
+            completed[row.status] += row.completed
+            key = (row.project_id, row.status)
+            open_total[row.status] += row.open_eod - open_now.get(key, 0)
+            open_now[key] = row.open_eod
+        next_day = day + timedelta(days=1)
+        if next_day > date_to or _period_start(next_day, granularity) != bucket:
+            for task_status in models.TaskStatus:
+                points.append({
+                    "period": bucket,
+                    "status": task_status,
+                    "created": created[task_status],
+                    "completed": completed[task_status],
+                    "open": open_total[task_status],
+                })
+        day = next_day
+    return points
+
+
+def record_status_event(db: Session, task: models.Task, from_status=None, created_at=None):
+    if from_status == task.status:
+        return
+    values = dict(
+        task_id=task.id,
+        project_id=task.project_id,
+        assignee_id=task.assignee_id,
+        from_status=from_status,
+        to_status=task.status,
+    )
+    if created_at is not None:
+        values["created_at"] = created_at
+    db.execute(insert(StatusEvent).values(**values))
+
+
+# Rollups and status history are kept up to date by background jobs so that
+# task writes only pay for one extra INSERT. Each job carries the day and
+# time of the change, so applying it late files it under the right day.
+
+def defer_task_created(db: Session, task):
+    jobs.enqueue(db, "reports.task_created", {
+        "task": _task_fields(task), "at": datetime.now(timezone.utc),
+    })
+
+
+def defer_task_moved(db: Session, task, previous):
+    jobs.enqueue(db, "reports.task_moved", {
+        "task": _task_fields(task),
+        "previous_project_id": previous.project_id,
+        "previous_status": previous.status,
+        "previous_assignee_id": previous.assignee_id,
+        "previous_priority": previous.priority,
+        "previous_deadline": previous.deadline,
+        "at": datetime.now(timezone.utc),
+    })
+
+
+def defer_task_deleted(db: Session, task):
+    jobs.enqueue(db, "reports.task_deleted", {
+        "task": _task_fields(task), "at": datetime.now(timezone.utc),
+    })
+
+
+def _task_fields(task) -> dict:
+    return {"id": getattr(task, "id", None), "project_id": task.project_id,
+            "assignee_id": task.assignee_id, "status": task.status,
+            "org_id": task.org_id, "priority": task.priority, "deadline": task.deadline}
+
+
+def _task(fields: dict) -> models.Task:
+    return models.Task(
+        id=fields.get("id"), project_id=fields["project_id"], assignee_id=fields["assignee_id"],
+        status=models.TaskStatus(fields["status"]), org_id=fields.get("org_id"),
+        priority=models.TaskPriority(fields.get("priority") or "medium"),
+        deadline=datetime.fromisoformat(fields["deadline"]) if fields.get("deadline") else None,
+    )
+
+
+def _unpack(db: Session, payload: dict):
+    """The task as it was at the change, the same task as far as rollups are
+    concerned, and when the change happened.
+
+    Rollups of a project deleted since the change went with it, so the
+    rollup copy drops the project and ``record_rollup_delta`` skips it.
+    """
+    task = _task(payload["task"])
+    rollup_task = models.Task(project_id=_live_project(db, task.project_id), status=task.status)
+    return task, rollup_task, datetime.fromisoformat(payload["at"])
+
+
+def _live_project(db: Session, project_id):
+    if project_id is not None and db.get(models.Project, project_id) is not None:
+        return project_id
+    return None
+
+
+@jobs.handler("reports.task_created")
+def _apply_task_created(db: Session, payload: dict):
+    task, rollup_task, at = _unpack(db, payload)
+    rollup_task_created(db, rollup_task, day=at.date())
+    record_status_event(db, task, created_at=at)
+    workload.apply_task_change(db, after=task)
+
+
+@jobs.handler("reports.task_moved")
+def _apply_task_moved(db: Session, payload: dict):
+    task, rollup_task, at = _unpack(db, payload)
+    old_status = models.TaskStatus(payload["previous_status"])
+    old_project_id = payload["previous_project_id"]
+    if (old_project_id, old_status) != (task.project_id, task.status):
+        rollup_task_moved(
+            db, _live_project(db, old_project_id), old_status,
+            rollup_task.project_id, rollup_task.status, day=at.date(),
+        )
+    record_status_event(db, task, from_status=old_status, created_at=at)
+    previous = _task({
+        **payload["task"],
+        "project_id": old_project_id,
+        "status": old_status,
+        # Jobs queued before workloads were tracked lack the previous values.
+        **{field: payload[f"previous_{field}"] for field in ("assignee_id", "priority", "deadline")
+           if f"previous_{field}" in payload},
+    })
+    workload.apply_task_change(db, previous, task)
+
+
+@jobs.handler("reports.task_deleted")
+def _apply_task_deleted(db: Session, payload: dict):
+    task, rollup_task, at = _unpack(db, payload)
+    rollup_task_deleted(db, rollup_task, day=at.date())
+    workload.apply_task_change(db, before=task)
+
+
+def backfill_status_events(db: Session) -> int:
+    """Give every task without history a single event for its current status."""
+    has_events = select(StatusEvent.id).where(StatusEvent.task_id == models.Task.id).exists()
+    result = db.execute(
+        insert(StatusEvent).from_select(
+            ["task_id", "project_id", "assignee_id", "to_status", "created_at"],
+            select(
+                models.Task.id,
+                models.Task.project_id,
+                models.Task.assignee_id,
+                models.Task.status,
+                func.coalesce(models.Task.updated_at, models.Task.created_at),
+            ).where(~has_events),
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+def _epoch_seconds(db: Session, column):
+    if db.get_bind().dialect.name == "postgresql":
+        return func.extract("epoch", column)
+    return (func.julianday(column) - 2440587.5) * 86400.0
+
+
+def fetch_status_events(db: Session, project_id=None, since=None, chunk_size=200000):
+    status_code = case(
+        *[(StatusEvent.to_status == task_status, code) for task_status, code in STATUS_CODES.items()]
+    )
+    stmt = select(
+        StatusEvent.task_id,
+        func.coalesce(StatusEvent.project_id, -1),
+        func.coalesce(StatusEvent.assignee_id, -1),
+        status_code,
+        _epoch_seconds(db, StatusEvent.created_at),
+    )
+    if project_id is not None:
+        stmt = stmt.where(StatusEvent.project_id == project_id)
+    tenant_projects = tenant_project_ids(db)
+    if tenant_projects is not None:
+        stmt = stmt.where(StatusEvent.project_id.in_(tenant_projects))
+    if since is not None:
+        stmt = stmt.where(StatusEvent.created_at >= since)
+    stmt = stmt.order_by(StatusEvent.task_id, StatusEvent.created_at, StatusEvent.id)
+
+    # Core rows flattened through fromiter; np.array() over Row objects probes
+    # every row for the array protocol and is an order of magnitude slower.
+    result = db.connection().execute(stmt.execution_options(yield_per=chunk_size))
+    chunks = [
+        np.fromiter(chain.from_iterable(chunk), dtype=np.float64, count=5 * len(chunk)).reshape(-1, 5)
+        for chunk in result.partitions()
+    ]
+    events = np.concatenate(chunks) if chunks else np.empty((0, 5), dtype=np.float64)
+    return (
+        events[:, 0].astype(np.int64),
+        events[:, 1].astype(np.int64),
+        events[:, 2].astype(np.int64),
+        events[:, 3].astype(np.int8),
+        events[:, 4],
+    )
+
+
+def _grouped_percentiles(keys: np.ndarray, values: np.ndarray):
+    """Linear-interpolated percentiles of ``values`` for every distinct key."""
+    if len(keys) == 0:
+        return keys, np.empty(0, dtype=np.int64), np.empty(0), np.empty((len(PERCENTILES), 0))
+    span = float(values.max() - values.min()) + 1.0
+    offset = keys - keys.min()
+    if float(offset.max()) * span < 2.0 ** 52:
+        # One float argsort over a composite (key, value) is several times
+        # faster than lexsort and exact enough for ordering durations.
+        order = np.argsort(offset * span + (values - values.min()))
+    else:
+        order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    starts = _group_starts(keys)
+    counts = np.diff(np.append(starts, len(keys)))
+    means = np.add.reduceat(values, starts) / counts
+    quantiles = []
+    for q in PERCENTILES:
+        position = starts + q * (counts - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        quantiles.append(values[lower] + (values[upper] - values[lower]) * (position - lower))
+    return keys[starts], counts, means, np.vstack(quantiles)
+
+
+def _stats_rows(keys, counts, means, quantiles, **key_columns):
+    rows = []
+    for i in range(len(keys)):
+        row = {name: int(column[i]) if column[i] >= 0 else None for name, column in key_columns.items()}
+        row.update({
+            "count": int(counts[i]),
+            "mean": float(means[i]) / 3600.0,
+            "p50": float(quantiles[0, i]) / 3600.0,
+            "p90": float(quantiles[1, i]) / 3600.0,
+            "p99": float(quantiles[2, i]) / 3600.0,
+        })
+        rows.append(row)
+    return rows
+
+
+def _group_starts(sorted_keys: np.ndarray) -> np.ndarray:
+    return np.concatenate(([0], np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1))
+
+
+def _first_time_per_task(tasks, times, mask):
+    """First timestamp per task among the events selected by ``mask``.
+
+    ``tasks`` must be sorted, which the event query guarantees.
+    """
+    tasks, times = tasks[mask], times[mask]
+    first = _group_starts(tasks) if len(tasks) else np.empty(0, dtype=np.int64)
+    return tasks[first], times[first]
+
+
+def cycle_time_report(db: Session, project_id: Optional[int] = None, since: Optional[datetime] = None):
+    return cycle_time_stats(*fetch_status_events(db, project_id, since))
+
+
+def cycle_time_stats(tasks, projects, assignees, statuses, times):
+    """The cycle time report over event arrays ordered by task and time."""
+    n_status = len(STATUSES)
+    completed = STATUS_CODES[models.TaskStatus.completed]
+
+    # Time in status: gap to the next event of the same task. The open
+    # interval of each task's latest status is not counted.
+    closed = np.zeros(len(tasks), dtype=bool)
+    closed[:-1] = tasks[1:] == tasks[:-1]
+    durations = np.zeros(len(tasks))
+    durations[:-1] = times[1:] - times[:-1]
+    closed &= statuses != completed
+    closed_durations = durations[closed]
+    closed_status = statuses[closed].astype(np.int64)
+
+    by_project = _grouped_percentiles(projects[closed] * n_status + closed_status, closed_durations)
+    by_assignee = _grouped_percentiles(assignees[closed] * n_status + closed_status, closed_durations)
+
+    # Lead time: first event to first completion; cycle time: first move to
+    # in_progress to first completion.
+    first_index = _group_starts(tasks) if len(tasks) else np.empty(0, dtype=np.int64)
+    task_ids, first_seen, task_projects = tasks[first_index], times[first_index], projects[first_index]
+    done_ids, done_at = _first_time_per_task(tasks, times, statuses == completed)
+    started_ids, started_at = _first_time_per_task(
+        tasks, times, statuses == STATUS_CODES[models.TaskStatus.in_progress]
+    )
+
+    done_index = np.searchsorted(task_ids, done_ids)
+    lead = _grouped_percentiles(task_projects[done_index], done_at - first_seen[done_index])
+
+    has_start = np.isin(done_ids, started_ids)
+    start_index = np.searchsorted(started_ids, done_ids[has_start])
+    cycle_durations = done_at[has_start] - started_at[start_index]
+    valid = cycle_durations >= 0
+    cycle = _grouped_percentiles(
+        task_projects[done_index[has_start]][valid], cycle_durations[valid]
+    )
+
+    time_in_status_by_project = _stats_rows(
+        *by_project, project_id=by_project[0] // n_status, status=by_project[0] % n_status
+    )
+    time_in_status_by_assignee = _stats_rows(
+        *by_assignee, assignee_id=by_assignee[0] // n_status, status=by_assignee[0] % n_status
+    )
+    for row in time_in_status_by_project + time_in_status_by_assignee:
+        row["status"] = STATUSES[row["status"]]
+
+    return {
+        "generated_at": datetime.now(timezone.utc),
+        "events": int(len(tasks)),
+        "unit": "hours",
+        "time_in_status_by_project": time_in_status_by_project,
+        "time_in_status_by_assignee": time_in_status_by_assignee,
+        "lead_time_by_project": _stats_rows(*lead, project_id=lead[0]),
+        "cycle_time_by_project": _stats_rows(*cycle, project_id=cycle[0]),
+    }
@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from datetime import timedelta
+import numpy as np
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+import models
+import invalidation
+
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "5"))
+# Re-read rows changed this long before the watermark, to catch transactions
+# that committed after a later timestamp had already been seen.
+REVOCATION_OVERLAP_SECONDS = 10.0
+
+UNKNOWN = 0
+DISABLED = -1
+
+
+class RevocationIndex:
+    """The current ``token_version`` of every user, by id, in one int32 array.
+
+    A token is valid while its ``token_version`` claim equals the user's
+    entry. Bumping the column revokes every token issued before. The index is
+    refreshed incrementally from rows whose ``tokens_changed_at`` moved since
+    the last refresh, so steady-state cost is one small query per interval.
+    """
+
+    def __init__(self, refresh_interval: float = REVOCATION_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self.versions = np.zeros(1024, dtype=np.int32)
+        self.watermark = None
+        self.refreshed_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def _grow(self, max_id: int):
+        if max_id >= len(self.versions):
+            size = max(max_id + 1, len(self.versions) * 2)
+            self.versions = np.concatenate([self.versions, np.zeros(size - len(self.versions), dtype=np.int32)])
+
+    def set(self, user_id: int, version: int):
+        with self._lock:
+            self._grow(user_id)
+            self.versions[user_id] = version
+
+    def get(self, user_id: int) -> int:
+        versions = self.versions
+        return int(versions[user_id]) if 0 <= user_id < len(versions) else UNKNOWN
+
+    def refresh(self, bind):
+        with self._lock:
+            query = select(
+                models.User.id, models.User.token_version, models.User.is_active,
+                models.User.tokens_changed_at,
+            )
+            if self.watermark is not None:
+                query = query.where(
+                    models.User.tokens_changed_at >= self.watermark - timedelta(seconds=REVOCATION_OVERLAP_SECONDS)
+                )
+            with bind.connect() as conn:
+                rows = conn.execute(query).all()
+            self.refreshed_at = time.monotonic()
+            if not rows:
+                return
+            ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows))
+            versions = np.fromiter(
+                (row.token_version if row.is_active is not False else DISABLED for row in rows),
+                dtype=np.int32, count=len(rows),
+            )
+            self._grow(int(ids.max()))
+            self.versions[ids] = versions
+            changed = [row.tokens_changed_at for row in rows if row.tokens_changed_at is not None]
+            if changed:
+                self.watermark = max(changed + ([self.watermark] if self.watermark else []))
+
+    def load(self, user_id: int, bind) -> int:
+        """Read one user's entry from the database."""
+        with bind.connect() as conn:
+            row = conn.execute(
+                select(models.User.token_version, models.User.is_active).where(models.User.id == user_id)
+            ).first()
+        if row is None:
+            # Deleted. Not cached: SQLite may hand the id to the next new user.
+            return UNKNOWN
+        version = row.token_version if row.is_active is not False else DISABLED
+        self.set(user_id, version)
+        return version
+
+    def is_current(self, user_id: int, token_version: int, bind) -> bool:
+        if time.monotonic() - self.refreshed_at > self.refresh_interval:
+            self.refresh(bind)
+        current = self.get(user_id)
+        if current == UNKNOWN or (current != DISABLED and token_version > current):
+            # A user or token newer than the index: look that user up.
+            current = self.load(user_id, bind)
+        return current == token_version
+
+
+revocation_index = RevocationIndex()
+
+
+def revoke_tokens(db: Session, user_id: int) -> int:
+    """Invalidate every token issued to ``user_id`` so far; returns the new version."""
+    version = db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(token_version=models.User.token_version + 1, tokens_changed_at=func.now())
+        .returning(models.User.token_version)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+    db.commit()
+    revocation_index.set(user_id, version)
+    invalidation.broadcast("tokens", [[user_id, version]])
+    return version
+
+
+@invalidation.handler("tokens")
+def _revoked_elsewhere(session_factory, versions):
+    # Other workers would otherwise accept the old tokens until their next refresh.
+    for user_id, version in versions:
+        if revocation_index.get(user_id) < version:
+            revocation_index.set(user_id, version)
@@ -1,7 +1,18 @@
-from pydantic import BaseModel, EmailStr
-from datetime import datetime
-from typing import Optional, List
-from models import UserRole, TaskStatus, TaskPriority
+from pydantic import BaseModel, EmailStr, validator
+from datetime import date, datetime
+from typing import Any, Dict, Optional, List
+from models import UserRole, TaskStatus, TaskPriority, JobStatus
+from deadlines import as_utc
+
+class OrganizationCreate(BaseModel):
+    name: str
+
+class Organization(OrganizationCreate):
+    id: int
+    created_at: Optional[datetime] = None
+    
+    class Config:
+        orm_mode = True
 
 class UserBase(BaseModel):
     username: str
@@ -10,6 +21,7 @@ class UserBase(BaseModel):
 
 class UserCreate(UserBase):
     password: str
+    org_id: Optional[int] = None
 
 class UserLogin(BaseModel):
     username: str
@@ -19,6 +31,7 @@ class User(UserBase):
     id: int
     is_active: bool
     created_at: datetime
+    org_id: int = 1
     
     class Config:
         orm_mode = True
@@ -32,12 +45,24 @@ class ProjectCreate(ProjectBase):
 
 class ProjectUpdate(ProjectBase):
     title: Optional[str] = None
+    expected_version: Optional[int] = None
 
 class Project(ProjectBase):
     id: int
     creator_id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    version: int = 1
+    
+    class Config:
+        orm_mode = True
+
+class ProjectMemberCreate(BaseModel):
+    user_id: int
+
+class ProjectMember(ProjectMemberCreate):
+    project_id: int
+    created_at: Optional[datetime] = None
     
     class Config:
         orm_mode = True
@@ -49,6 +74,8 @@ class TaskBase(BaseModel):
     priority: TaskPriority = TaskPriority.medium
     status: TaskStatus = TaskStatus.pending
 
+    _deadline_utc = validator("deadline", allow_reuse=True)(as_utc)
+
 class TaskCreate(TaskBase):
     project_id: int
     assignee_id: int
@@ -60,6 +87,9 @@ class TaskUpdate(BaseModel):
     priority: Optional[TaskPriority] = None
     status: Optional[TaskStatus] = None
     assignee_id: Optional[int] = None
+    expected_version: Optional[int] = None
+
+    _deadline_utc = validator("deadline", allow_reuse=True)(as_utc)
 
 class Task(TaskBase):
     id: int
@@ -67,10 +97,28 @@ class Task(TaskBase):
     assignee_id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    version: int = 1
     
     class Config:
         orm_mode = True
 
+class DueTask(BaseModel):
+    id: int
+    title: str
+    status: TaskStatus
+    priority: TaskPriority
+    project_id: int
+    assignee_id: int
+    deadline: datetime
+    overdue: bool
+    days_left: int
+
+class CalendarDay(BaseModel):
+    day: date
+    count: int
+    open: int
+    task_ids: List[int]
+
 class CommentBase(BaseModel):
     content: str
 
@@ -89,6 +137,158 @@ class Comment(CommentBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
-    username: Optional[str] = None
\ No newline at end of file
+    username: Optional[str] = None
+
+class DashboardCounts(BaseModel):
+    total: int
+    pending: int
+    in_progress: int
+    completed: int
+    overdue: int
+    due_today: int
+
+class DashboardComment(Comment):
+    task_title: str
+
+class DashboardCharts(BaseModel):
+    status: Dict[str, int]
+    priority: Dict[str, int]
+    status_by_priority: List[Dict[str, Any]]
+    created_by_day: List[Dict[str, Any]]
+
+class Dashboard(BaseModel):
+    user_id: int
+    generated_at: datetime
+    open_tasks: Dict[str, List[Task]]
+    counts: DashboardCounts
+    completion_rate: float
+    recent_comments: List[DashboardComment]
+    charts: DashboardCharts
+
+class TimeseriesPoint(BaseModel):
+    period: date
+    status: TaskStatus
+    created: int
+    completed: int
+    open: int
+
+class DurationStats(BaseModel):
+    count: int
+    mean: float
+    p50: float
+    p90: float
+    p99: float
+
+class ProjectDurationStats(DurationStats):
+    project_id: Optional[int] = None
+
+class ProjectStatusDurationStats(ProjectDurationStats):
+    status: TaskStatus
+
+class AssigneeStatusDurationStats(DurationStats):
+    assignee_id: Optional[int] = None
+    status: TaskStatus
+
+class CycleTimeReport(BaseModel):
+    generated_at: datetime
+    events: int
+    unit: str
+    time_in_status_by_project: List[ProjectStatusDurationStats]
+    time_in_status_by_assignee: List[AssigneeStatusDurationStats]
+    lead_time_by_project: List[ProjectDurationStats]
+    cycle_time_by_project: List[ProjectDurationStats]
+
+class Notification(BaseModel):
+    id: int
+    kind: str
+    title: str
+    body: Optional[str] = None
+    task_ids: List[int]
+    created_at: datetime
+    read_at: Optional[datetime] = None
+
+class NotificationPage(BaseModel):
+    items: List[Notification]
+    next_cursor: Optional[int] = None
+    unread: int
+
+class NotificationsRead(BaseModel):
+    ids: Optional[List[int]] = None
+    up_to: Optional[int] = None
+
+class ActivityEntry(BaseModel):
+    id: int
+    entity: str
+    entity_id: int
+    action: str
+    actor_id: Optional[int] = None
+    changes: Optional[Dict[str, Any]] = None
+    created_at: datetime
+
+class ActivityPage(BaseModel):
+    items: List[ActivityEntry]
+    next_cursor: Optional[int] = None
+
+class DependencyCreate(BaseModel):
+    blocker_id: int
+
+class Dependency(DependencyCreate):
+    blocked_id: int
+
+class LinkedTask(BaseModel):
+    id: int
+    title: str
+    status: TaskStatus
+    deadline: Optional[datetime] = None
+    project_id: int
+    assignee_id: int
+    depth: Optional[int] = None
+
+class UserWorkload(BaseModel):
+    user_id: int
+    username: str
+    open_low: int
+    open_medium: int
+    open_high: int
+    open_total: int
+    due_this_week: int
+    overdue: int
+    load: int
+
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+class ImportJob(BaseModel):
+    id: int
+    filename: Optional[str] = None
+    format: str
+    status: JobStatus
+    rows_read: int
+    rows_loaded: int
+    rows_failed: int
+    errors: List[ImportRowError]
+    last_error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class SimilarTask(BaseModel):
+    id: int
+    title: str
+    status: TaskStatus
+    project_id: int
+    assignee_id: int
+    score: float
+
+class CriticalPath(BaseModel):
+    project_id: int
+    finish: Optional[datetime] = None
+    tasks: List[LinkedTask]
+    conflicts: List[Dependency]
@@ -0,0 +1,152 @@
+"""Production launcher: several uvicorn workers sharing one listening socket.
+
+    python serve.py --workers 4 --port 8000
+
+Without ``--workers`` (or ``WEB_CONCURRENCY``) there is one worker per
+available core. SIGHUP replaces the workers one at a time with freshly
+imported ones, each new worker taking traffic before an old one is told
+to finish; SIGTERM and SIGINT drain and stop them all. Workers that die
+are restarted. Caches stay coherent across workers through
+``invalidation``; workers of one host share a Unix socket directory for it
+unless the database is PostgreSQL.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import uvicorn
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0"))
+# How long a worker gets to start, and to finish its requests when stopped.
+WORKER_START_TIMEOUT_SECONDS = float(os.getenv("WORKER_START_TIMEOUT_SECONDS", "60"))
+GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30"))
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def default_workers() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _signal_started(server: uvicorn.Server, started):
+    while not server.started and not server.should_exit:
+        time.sleep(0.05)
+    if server.started:
+        started.set()
+
+
+def prepare_database():
+    import main
+    main.prepare_database()
+
+
+def run_worker(config: uvicorn.Config, sockets, started):
+    server = uvicorn.Server(config)
+    threading.Thread(target=_signal_started, args=(server, started), daemon=True).start()
+    server.run(sockets=sockets)
+
+
+class Supervisor:
+    def __init__(self, config: uvicorn.Config, workers: int):
+        self.config = config
+        self.workers = workers
+        self.sockets = [config.bind_socket()]
+        self.context = multiprocessing.get_context("spawn")
+        # (process, started event) pairs; the event must outlive the child's start.
+        self.processes = []
+        self._reload = threading.Event()
+        self._exit = threading.Event()
+
+    def spawn(self):
+        started = self.context.Event()
+        process = self.context.Process(target=run_worker, args=(self.config, self.sockets, started))
+        process.start()
+        return process, started
+
+    def stop_worker(self, process):
+        # uvicorn drains in-flight requests on SIGTERM, bounded by timeout_graceful_shutdown.
+        process.terminate()
+        process.join(GRACEFUL_TIMEOUT_SECONDS + 5)
+        if process.is_alive():
+            logger.warning("Worker %d did not stop in time; killing it", process.pid)
+            process.kill()
+            process.join()
+
+    def reload(self):
+        logger.info("🔄 Reloading %d workers", len(self.processes))
+        for index, (old, _) in enumerate(list(self.processes)):
+            new, started = self.spawn()
+            if not started.wait(WORKER_START_TIMEOUT_SECONDS):
+                logger.error("Worker %d failed to start; keeping the current workers", new.pid)
+                self.stop_worker(new)
+                return
+            self.processes[index] = (new, started)
+            self.stop_worker(old)
+        logger.info("✅ Reload complete")
+
+    def run(self):
+        signal.signal(signal.SIGHUP, lambda *_: self._reload.set())
+        signal.signal(signal.SIGTERM, lambda *_: self._exit.set())
+        signal.signal(signal.SIGINT, lambda *_: self._exit.set())
+        # Once, before the workers, which would otherwise race to create the same tables.
+        prepare = self.context.Process(target=prepare_database)
+        prepare.start()
+        prepare.join()
+        if prepare.exitcode != 0:
+            logger.error("Preparing the database failed; not starting any workers")
+            return 1
+        logger.info("🚀 Starting %d workers on %s:%d", self.workers, self.config.host, self.config.port)
+        self.processes = [self.spawn() for _ in range(self.workers)]
+        while not self._exit.wait(0.5):
+            if self._reload.is_set():
+                self._reload.clear()
+                self.reload()
+            for index, (process, _) in enumerate(self.processes):
+                if not process.is_alive() and not self._exit.is_set():
+                    logger.warning("Worker %d exited with %s; restarting it", process.pid, process.exitcode)
+                    self.processes[index] = self.spawn()
+        logger.info("🛑 Stopping workers")
+        for process, _ in self.processes:
+            process.terminate()
+        for process, _ in self.processes:
+            self.stop_worker(process)
+        return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY or default_workers())
+    parser.add_argument("--log-level", default="info")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    socket_dir = None
+    if not os.getenv("INVALIDATION_SOCKET_DIR"):
+        # Inherited by the workers; PostgreSQL deployments use LISTEN/NOTIFY instead.
+        socket_dir = os.environ["INVALIDATION_SOCKET_DIR"] = tempfile.mkdtemp(prefix="tasks-invalidation-")
+    config = uvicorn.Config(
+        "main:app", host=args.host, port=args.port, log_level=args.log_level,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT_SECONDS,
+    )
+    try:
+        return Supervisor(config, max(args.workers, 1)).run()
+    finally:
+        if socket_dir is not None:
+            shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
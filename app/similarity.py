@@ -0,0 +1,364 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from typing import Optional
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+import models
+import invalidation
+
+# Trigrams are hashed into 2**bits features.
+SIMILARITY_FEATURE_BITS = int(os.getenv("SIMILARITY_FEATURE_BITS", "20"))
+SIMILARITY_DESCRIPTION_CHARS = int(os.getenv("SIMILARITY_DESCRIPTION_CHARS", "300"))
+SIMILARITY_DESCRIPTION_WEIGHT = float(os.getenv("SIMILARITY_DESCRIPTION_WEIGHT", "0.5"))
+SIMILARITY_DUPLICATE_THRESHOLD = float(os.getenv("SIMILARITY_DUPLICATE_THRESHOLD", "0.6"))
+# Time allowed for the startup rebuild; 0 skips it.
+SIMILARITY_REBUILD_SECONDS = float(os.getenv("SIMILARITY_REBUILD_SECONDS", "60"))
+SIMILARITY_BATCH_SIZE = int(os.getenv("SIMILARITY_BATCH_SIZE", "20000"))
+
+FEATURES = 1 << SIMILARITY_FEATURE_BITS
+FEATURE_MASK = FEATURES - 1
+DESCRIPTION_FIELD = 1 << 24
+MIN_MERGE_POSTINGS = 50000
+
+logger = logging.getLogger(__name__)
+
+Task = models.Task
+_WORDS = re.compile(r"\w+")
+_GOLDEN = np.uint64(2654435761)
+
+
+def _normalize(text: Optional[str]) -> bytes:
+    return (" " + " ".join(_WORDS.findall((text or "").lower())) + " ").encode()
+
+
+def _trigrams(texts, field: int = 0):
+    """``(row, feature)`` for every character trigram of every text, vectorized
+    over the whole batch: the texts are joined into one byte array and
+    trigrams straddling two texts are dropped."""
+    encoded = [_normalize(text) for text in texts]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+    rows = np.repeat(np.arange(len(encoded), dtype=np.int64), lengths)
+    inside = rows[:-2] == rows[2:]
+    codes = ((data[:-2] << 16) | (data[1:-1] << 8) | data[2:])[inside] | np.uint64(field)
+    features = ((codes * _GOLDEN) & np.uint64(0xFFFFFFFF)) >> np.uint64(32 - SIMILARITY_FEATURE_BITS)
+    return rows[:-2][inside], features.astype(np.int64)
+
+
+def term_weights(titles, descriptions):
+    """Sublinear term frequencies of each title/description pair as COO
+    triples ``(rows, features, weights)``, sorted by row then feature.
+
+    Title and description trigrams hash to different features, and
+    description trigrams count for ``SIMILARITY_DESCRIPTION_WEIGHT``.
+    """
+    title_rows, title_features = _trigrams(titles)
+    description_rows, description_features = _trigrams(
+        [(text or "")[:SIMILARITY_DESCRIPTION_CHARS] for text in descriptions], DESCRIPTION_FIELD
+    )
+    keys = np.concatenate([
+        (title_rows << SIMILARITY_FEATURE_BITS) | title_features,
+        (description_rows << SIMILARITY_FEATURE_BITS) | description_features,
+    ])
+    counts = np.concatenate([
+        np.ones(len(title_rows)), np.full(len(description_rows), SIMILARITY_DESCRIPTION_WEIGHT)
+    ])
+    keys, inverse = np.unique(keys, return_inverse=True)
+    tf = 1 + np.log(np.bincount(inverse, weights=counts))
+    return keys >> SIMILARITY_FEATURE_BITS, keys & FEATURE_MASK, tf.astype(np.float32)
+
+
+class SimilarityIndex:
+    """L2-normalised TF-IDF vectors of every task, for top-k cosine queries.
+
+    Postings are kept CSC-style: feature ``f`` owns
+    ``rows[indptr[f]:indptr[f + 1]]`` and the matching ``vals``, so a query
+    gathers the postings of its own trigrams and sums them per row with one
+    ``bincount``. Writes go to a small unsorted delta that is merged into the
+    sorted arrays once it passes an eighth of their size; rewritten and
+    deleted tasks only lose their ``alive`` flag until then. A vector keeps
+    the IDF of the moment it was added; ``rebuild`` refreshes them all.
+    Memory is about 8 bytes per posting, roughly 100 postings per task.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.df = np.zeros(FEATURES, dtype=np.int32)
+        self.indptr = np.zeros(FEATURES + 1, dtype=np.int64)
+        self.rows = np.zeros(0, dtype=np.int32)
+        self.vals = np.zeros(0, dtype=np.float32)
+        self.task_ids = np.zeros(1024, dtype=np.int64)
+        self.org_ids = np.zeros(1024, dtype=np.int32)
+        self.alive = np.zeros(1024, dtype=bool)
+        self.size = 0
+        self.live = 0
+        self.slots = {}
+        self.journal = None
+        self._delta = []
+        self._delta_size = 0
+        self._delta_arrays = None
+
+    def __len__(self):
+        return self.live
+
+    def _idf(self, features):
+        return (np.log((1 + self.live) / (1 + self.df[features])) + 1).astype(np.float32)
+
+    def _reserve(self, count: int):
+        if self.size + count > len(self.task_ids):
+            capacity = max(self.size + count, len(self.task_ids) * 2)
+            grow = capacity - len(self.task_ids)
+            self.task_ids = np.concatenate([self.task_ids, np.zeros(grow, dtype=np.int64)])
+            self.org_ids = np.concatenate([self.org_ids, np.zeros(grow, dtype=np.int32)])
+            self.alive = np.concatenate([self.alive, np.zeros(grow, dtype=bool)])
+
+    def _append(self, task_ids, org_ids, rows, features, tf):
+        count = len(task_ids)
+        first = self.size
+        self._reserve(count)
+        self.task_ids[first:first + count] = task_ids
+        self.org_ids[first:first + count] = org_ids
+        self.alive[first:first + count] = True
+        self.slots.update(zip(np.asarray(task_ids).tolist(), range(first, first + count)))
+        self.size += count
+        self.live += count
+
+        np.add.at(self.df, features, 1)
+        weights = tf * self._idf(features)
+        norms = np.sqrt(np.bincount(rows, weights=weights.astype(np.float64) ** 2, minlength=count))
+        weights /= np.maximum(norms[rows], 1e-12).astype(np.float32)
+        self._delta.append(((rows + first).astype(np.int32), features, weights))
+        self._delta_size += len(rows)
+        self._delta_arrays = None
+        if self._delta_size > max(MIN_MERGE_POSTINGS, len(self.rows) // 8):
+            self._merge()
+
+    def _merge(self):
+        """Fold the delta into the sorted arrays, dropping dead rows and
+        renumbering the live ones densely."""
+        rows, features, vals = self._delta_postings()
+        old_features = np.repeat(np.arange(FEATURES, dtype=np.int64), np.diff(self.indptr))
+        rows = np.concatenate([self.rows, rows])
+        features = np.concatenate([old_features, features])
+        vals = np.concatenate([self.vals, vals])
+        alive = self.alive[:self.size]
+        keep = alive[rows]
+        renumber = (np.cumsum(alive) - 1).astype(np.int32)
+        rows, features, vals = renumber[rows[keep]], features[keep], vals[keep]
+
+        order = np.argsort(features, kind="stable")
+        self.rows, self.vals = rows[order], vals[order]
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(features, minlength=FEATURES))])
+
+        live = int(alive.sum())
+        self.task_ids[:live] = self.task_ids[:self.size][alive]
+        self.org_ids[:live] = self.org_ids[:self.size][alive]
+        self.alive[:live] = True
+        self.alive[live:self.size] = False
+        self.size = live
+        self.slots = dict(zip(self.task_ids[:live].tolist(), range(live)))
+        self._delta, self._delta_size, self._delta_arrays = [], 0, None
+
+    def _delta_postings(self):
+        if self._delta_arrays is None:
+            if self._delta:
+                self._delta_arrays = tuple(np.concatenate(parts) for parts in zip(*self._delta))
+            else:
+                self._delta_arrays = (np.zeros(0, np.int32), np.zeros(0, np.int64), np.zeros(0, np.float32))
+        return self._delta_arrays
+
+    def _remove(self, task_ids):
+        for task_id in task_ids:
+            slot = self.slots.pop(task_id, None)
+            if slot is not None and self.alive[slot]:
+                self.alive[slot] = False
+                self.live -= 1
+
+    def _apply(self, op):
+        kind, data = op
+        if kind == "remove":
+            self._remove(data)
+            return
+        task_ids, org_ids, titles, descriptions = data
+        self._remove(task_ids)
+        self._append(np.asarray(task_ids), np.asarray(org_ids), *term_weights(titles, descriptions))
+
+    def query(self, org_id: int, title: str, description: Optional[str], k: int = 10, exclude=()):
+        """Up to ``k`` ``(task_id, score)`` pairs of the organization, best first."""
+        _, features, tf = term_weights([title], [description])
+        with self._lock:
+            if not len(features) or not self.live:
+                return []
+            weights = tf * self._idf(features)
+            weights /= np.linalg.norm(weights)
+
+            starts = self.indptr[features]
+            lengths = self.indptr[features + 1] - starts
+            offsets = np.cumsum(lengths) - lengths
+            positions = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+            scores = np.zeros(self.size)
+            scores += np.bincount(
+                self.rows[positions], weights=self.vals[positions] * np.repeat(weights, lengths),
+                minlength=self.size,
+            )
+            delta_rows, delta_features, delta_vals = self._delta_postings()
+            if len(delta_rows):
+                # ``features`` come out of np.unique, so they are sorted.
+                match = np.minimum(np.searchsorted(features, delta_features), len(features) - 1)
+                hit = features[match] == delta_features
+                scores += np.bincount(
+                    delta_rows[hit], weights=delta_vals[hit] * weights[match[hit]], minlength=self.size
+                )
+
+            scores[~(self.alive[:self.size] & (self.org_ids[:self.size] == org_id))] = 0
+            for task_id in exclude:
+                slot = self.slots.get(task_id)
+                if slot is not None:
+                    scores[slot] = 0
+            k = min(k, self.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [
+                (int(self.task_ids[slot]), round(float(scores[slot]), 4))
+                for slot in top if scores[slot] > 1e-6
+            ]
+
+
+index = SimilarityIndex()
+
+
+def _publish(ops):
+    while True:
+        target = index
+        with target._lock:
+            # ``rebuild`` may have swapped in a new index while we waited.
+            if target is not index:
+                continue
+            if target.journal is not None:
+                target.journal.extend(ops)
+            for op in ops:
+                target._apply(op)
+            return
+
+
+def note_written(db: Session, rows):
+    """Index rows with ``id``, ``org_id``, ``title`` and ``description`` once
+    ``db``'s transaction commits."""
+    rows = list(rows)
+    if rows:
+        db.info.setdefault("similarity", []).append(("add", (
+            [row.id for row in rows], [row.org_id for row in rows],
+            [row.title for row in rows], [row.description for row in rows],
+        )))
+
+
+def note_deleted(db: Session, task_ids):
+    task_ids = list(task_ids)
+    if task_ids:
+        db.info.setdefault("similarity", []).append(("remove", task_ids))
+
+
+@event.listens_for(Session, "after_commit")
+def _index_committed(session):
+    ops = session.info.pop("similarity", None)
+    if ops:
+        _publish(ops)
+        # Other workers re-read the rows rather than receive their text.
+        invalidation.broadcast("similarity", {
+            task_id for kind, data in ops for task_id in (data if kind == "remove" else data[0])
+        })
+
+
+@invalidation.handler("similarity")
+def _changed_elsewhere(session_factory, task_ids):
+    db = session_factory()
+    try:
+        rows = db.execute(
+            select(Task.id, Task.org_id, Task.title, Task.description).where(Task.id.in_(task_ids))
+        ).all()
+    finally:
+        db.close()
+    ops = [("remove", sorted(set(task_ids) - {row.id for row in rows}))]
+    if rows:
+        ops.append(("add", tuple(map(list, zip(*rows)))))
+    _publish(ops)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop("similarity", None)
+
+
+def similar_to(org_id: int, title: str, description: Optional[str], k: int = 10, exclude=()):
+    return index.query(org_id, title, description, k, exclude)
+
+
+def possible_duplicates(org_id: int, title: str, description: Optional[str], exclude=(), k: int = 5):
+    return [
+        task_id for task_id, score in index.query(org_id, title, description, k, exclude)
+        if score >= SIMILARITY_DUPLICATE_THRESHOLD
+    ]
+
+
+def rebuild(session_factory, budget: float = SIMILARITY_REBUILD_SECONDS, batch_size: int = SIMILARITY_BATCH_SIZE):
+    """Replace ``index`` with one built from ``tasks``, newest first.
+
+    Reading stops once ``budget`` seconds have passed; older tasks left out
+    are indexed the next time they are written. Writes committed meanwhile
+    are journaled on the old index and replayed onto the new one before the
+    swap. Returns the number of tasks read.
+    """
+    global index
+    current = index
+    with current._lock:
+        current.journal = []
+    started = time.monotonic()
+    parts, read, after = [], 0, None
+    db = session_factory()
+    try:
+        while True:
+            query = select(Task.id, Task.org_id, Task.title, Task.description).order_by(Task.id.desc())
+            if after is not None:
+                query = query.where(Task.id < after)
+            batch = db.execute(query.limit(batch_size)).all()
+            if not batch:
+                break
+            task_ids, org_ids, titles, descriptions = zip(*batch)
+            rows, features, tf = term_weights(titles, descriptions)
+            parts.append((np.array(task_ids), np.array(org_ids), rows + read, features, tf))
+            read += len(batch)
+            after = task_ids[-1]
+            if time.monotonic() - started > budget:
+                logger.warning("Similarity rebuild stopped after %d tasks (budget %.0fs)", read, budget)
+                break
+    except Exception:
+        with current._lock:
+            current.journal = None
+        raise
+    finally:
+        db.close()
+
+    fresh = SimilarityIndex()
+    if parts:
+        fresh._append(*(np.concatenate(column) for column in zip(*parts)))
+        if fresh._delta:
+            fresh._merge()
+    with current._lock:
+        for op in current.journal:
+            fresh._apply(op)
+        current.journal = None
+        index = fresh
+    logger.info("Similarity index rebuilt from %d tasks in %.1fs", read, time.monotonic() - started)
+    return read
+
+
+async def run_rebuild(session_factory, budget: float = SIMILARITY_REBUILD_SECONDS):
+    try:
+        await asyncio.to_thread(rebuild, session_factory, budget)
+    except Exception:
+        logger.exception("Rebuilding the similarity index failed")
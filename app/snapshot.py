@@ -0,0 +1,221 @@
+import enum
+import gzip
+import hashlib
+import io
+import json
+import tarfile
+import time
+from datetime import date, datetime, timezone
+from sqlalchemy import Date, DateTime, TypeDecorator, select, union
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateIndex, DropIndex
+import models
+from bulkload import BulkLoader
+from reports import backfill_rollups, backfill_status_events
+from workload import backfill_workloads
+from tenancy import ensure_default_organization
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+# Load order; every table only references the ones before it.
+TABLES = [
+    models.Organization.__table__,
+    models.User.__table__,
+    models.Project.__table__,
+    models.ProjectMember.__table__,
+    models.Task.__table__,
+    models.Comment.__table__,
+]
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _dump(value):
+    if isinstance(value, enum.Enum):
+        return value.name
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _column_kinds(table) -> dict:
+    kinds = {}
+    for column in table.columns:
+        column_type = column.type.impl if isinstance(column.type, TypeDecorator) else column.type
+        if isinstance(column_type, DateTime):
+            kinds[column.name] = "datetime"
+        elif isinstance(column_type, Date):
+            kinds[column.name] = "date"
+    return kinds
+
+
+def _selections(project_ids):
+    """One SELECT per table in ``TABLES``, limited to ``project_ids`` and
+    the users and organizations those projects reference."""
+    if not project_ids:
+        return [select(table).order_by(*table.primary_key.columns) for table in TABLES]
+    Project, Task, Comment, Member = models.Project, models.Task, models.Comment, models.ProjectMember
+    task_ids = select(Task.id).where(Task.project_id.in_(project_ids))
+    user_ids = union(
+        select(Project.creator_id).where(Project.id.in_(project_ids)),
+        select(Task.assignee_id).where(Task.project_id.in_(project_ids)),
+        select(Comment.author_id).where(Comment.task_id.in_(task_ids)),
+        select(Member.user_id).where(Member.project_id.in_(project_ids)),
+    )
+    org_ids = union(
+        select(Project.org_id).where(Project.id.in_(project_ids)),
+        select(models.User.org_id).where(models.User.id.in_(user_ids)),
+    )
+    criteria = {
+        "organizations": models.Organization.id.in_(org_ids),
+        "users": models.User.id.in_(user_ids),
+        "projects": Project.id.in_(project_ids),
+        "project_members": Member.project_id.in_(project_ids),
+        "tasks": Task.project_id.in_(project_ids),
+        "comments": Comment.task_id.in_(task_ids),
+    }
+    return [
+        select(table).where(criteria[table.name]).order_by(*table.primary_key.columns)
+        for table in TABLES
+    ]
+
+
+def _add_member(archive: tarfile.TarFile, name: str, data: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    archive.addfile(info, io.BytesIO(data))
+
+
+def create_snapshot(engine, path: str, project_ids=None, chunk_size: int = 50000, progress=None) -> dict:
+    """Write a consistent copy of ``TABLES`` to the tar archive at ``path``.
+
+    Every table is read inside one REPEATABLE READ (PostgreSQL) or deferred
+    read (SQLite) transaction, so the archive is a single point in time even
+    while the API keeps writing. Rows are streamed ``chunk_size`` at a time
+    into gzipped JSONL members of column-ordered arrays; ``manifest.json``
+    lists columns, row counts and a SHA-256 per chunk. Returns the manifest.
+    """
+    manifest = {
+        "format": FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "dialect": engine.dialect.name,
+        "project_ids": sorted(project_ids) if project_ids else None,
+        "tables": [],
+    }
+    with engine.connect() as conn, tarfile.open(path, "w") as archive:
+        if engine.dialect.name == "postgresql":
+            conn = conn.execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True)
+        else:
+            conn.exec_driver_sql("BEGIN")
+        for table, query in zip(TABLES, _selections(project_ids)):
+            entry = {"name": table.name, "columns": [c.name for c in table.columns], "rows": 0, "chunks": []}
+            result = conn.execution_options(yield_per=chunk_size).execute(query)
+            for number, rows in enumerate(result.partitions(), start=1):
+                lines = "".join(json.dumps([_dump(value) for value in row]) + "\n" for row in rows)
+                data = gzip.compress(lines.encode(), compresslevel=6)
+                name = f"{table.name}/{number:06d}.jsonl.gz"
+                _add_member(archive, name, data)
+                entry["chunks"].append({"name": name, "rows": len(rows), "sha256": hashlib.sha256(data).hexdigest()})
+                entry["rows"] += len(rows)
+                if progress is not None:
+                    progress(table.name, entry["rows"])
+            manifest["tables"].append(entry)
+        conn.rollback()
+        _add_member(archive, MANIFEST, json.dumps(manifest, indent=2).encode())
+    return manifest
+
+
+def read_manifest(archive: tarfile.TarFile) -> dict:
+    try:
+        manifest = json.load(archive.extractfile(MANIFEST))
+    except KeyError:
+        raise SnapshotError("Not a snapshot: manifest.json is missing")
+    if manifest.get("format") != FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format {manifest.get('format')!r}")
+    return manifest
+
+
+def _read_chunk(archive: tarfile.TarFile, chunk: dict, kinds: dict, columns):
+    data = archive.extractfile(chunk["name"]).read()
+    if hashlib.sha256(data).hexdigest() != chunk["sha256"]:
+        raise SnapshotError(f"{chunk['name']} is corrupt")
+    parsers = [
+        (i, datetime.fromisoformat if kinds[name] == "datetime" else date.fromisoformat)
+        for i, name in enumerate(columns) if name in kinds
+    ]
+    for line in gzip.decompress(data).splitlines():
+        row = json.loads(line)
+        for i, parse in parsers:
+            if row[i] is not None:
+                row[i] = parse(row[i])
+        yield row
+
+
+def _has_rows(engine, table) -> bool:
+    with engine.connect() as conn:
+        return conn.execute(select(table.c[table.primary_key.columns.keys()[0]]).limit(1)).first() is not None
+
+
+def restore_snapshot(engine, path: str, chunk_size: int = 50000, progress=None) -> dict:
+    """Load a snapshot into an empty database and return rows per table.
+
+    Secondary indexes of each table are dropped for the load and rebuilt
+    once its rows are in, which also re-checks unique ones. Rows go through
+    ``BulkLoader`` (COPY or executemany). Organizations that already exist,
+    such as the default one, are skipped rather than loaded twice. Rollups,
+    status history and workload counters are derived afterwards.
+    """
+    models.Base.metadata.create_all(bind=engine)
+    # Snapshots of databases that never had it still reference the default organization.
+    ensure_default_organization(engine)
+    loaded = {}
+    with tarfile.open(path, "r") as archive:
+        manifest = read_manifest(archive)
+        entries = {entry["name"]: entry for entry in manifest["tables"]}
+        tables = [table for table in TABLES if table.name in entries]
+        for table in tables:
+            if table is not models.Organization.__table__ and _has_rows(engine, table):
+                raise SnapshotError(f"Table {table.name} is not empty; restore into a fresh database")
+        with engine.connect() as conn:
+            existing_orgs = set(conn.execute(select(models.Organization.id)).scalars())
+
+        with BulkLoader(engine, chunk_size) as loader:
+            cursor = loader.connection.cursor()
+            for table in tables:
+                entry = entries[table.name]
+                kinds = _column_kinds(table)
+                indexes = list(table.indexes)
+                for index in indexes:
+                    cursor.execute(str(DropIndex(index, if_exists=True).compile(dialect=engine.dialect)))
+                loader.connection.commit()
+
+                loaded[table.name] = 0
+                for chunk in entry["chunks"]:
+                    rows = _read_chunk(archive, chunk, kinds, entry["columns"])
+                    if table is models.Organization.__table__:
+                        rows = (row for row in rows if row[0] not in existing_orgs)
+                    rows = list(loader.convert_rows(rows))
+                    if rows:
+                        loader.load_chunk(table.name, entry["columns"], rows)
+                        loader.connection.commit()
+                    loaded[table.name] += len(rows)
+                    if progress is not None:
+                        progress(table.name, loaded[table.name])
+
+                for index in indexes:
+                    cursor.execute(str(CreateIndex(index).compile(dialect=engine.dialect)))
+                loader.connection.commit()
+            cursor.close()
+            loader.reset_sequences(*[table.name for table in tables if "id" in table.c])
+
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        backfill_status_events(db)
+        backfill_rollups(db)
+        backfill_workloads(db)
+    finally:
+        db.close()
+    return loaded
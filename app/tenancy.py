@@ -0,0 +1,69 @@
+from typing import Optional
+from sqlalchemy import event, exists, insert, literal, select
+from sqlalchemy.sql.selectable import CompoundSelect
+from sqlalchemy.orm import Session, with_loader_criteria
+import models
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _scope_to_tenant(orm_execute_state):
+    """Add ``org_id = :org`` for every tenant-scoped entity in ORM statements.
+
+    Active when ``session.info["org_id"]`` is set, which ``get_current_user``
+    does from the token's ``org`` claim. SELECT, UPDATE and DELETE are
+    covered, including subqueries; INSERTs must set ``org_id`` themselves and
+    compound selects (UNION) must filter on it explicitly.
+    Sessions without an organization (login, background jobs) see all rows.
+    """
+    org_id = orm_execute_state.session.info.get("org_id")
+    if org_id is None or orm_execute_state.is_column_load or orm_execute_state.is_relationship_load:
+        return
+    if isinstance(orm_execute_state.statement, CompoundSelect):
+        # Criteria added here would be cached with the first caller's org_id.
+        return
+    if orm_execute_state.is_select or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.statement = orm_execute_state.statement.options(
+            with_loader_criteria(models.TenantScoped, lambda cls: cls.org_id == org_id, include_aliases=True)
+        )
+
+
+def current_org(db: Session) -> Optional[int]:
+    return db.info.get("org_id")
+
+
+def tenant_project_ids(db: Session):
+    """Project ids of the session's organization, or None when unscoped.
+
+    For tables keyed by project that carry no ``org_id`` of their own.
+    """
+    org_id = current_org(db)
+    if org_id is None:
+        return None
+    return select(models.Project.id).where(models.Project.org_id == org_id)
+
+
+def insert_checked(model, values: dict, org_id: int, *conditions):
+    """INSERT ``values`` into ``model`` only if every condition holds.
+
+    Compiles to ``INSERT ... SELECT :v1, :v2 ... WHERE <conditions>``, so
+    references to other tenants' rows are refused in the same statement.
+    """
+    table = model.__table__
+    columns = list(values) + ["org_id"]
+    row = [literal(values[name], table.c[name].type) for name in values] + [literal(org_id)]
+    return insert(model).from_select(columns, select(*row).where(*conditions))
+
+
+def in_tenant(model, org_id: int, id_value):
+    return exists().where(model.id == id_value, model.org_id == org_id)
+
+
+def ensure_default_organization(engine):
+    with engine.begin() as conn:
+        if conn.execute(select(models.Organization.id).where(models.Organization.id == models.DEFAULT_ORG_ID)).first() is None:
+            conn.execute(insert(models.Organization).values(id=models.DEFAULT_ORG_ID, name="Default"))
+            if engine.dialect.name == "postgresql":
+                conn.exec_driver_sql(
+                    "SELECT setval(pg_get_serial_sequence('organizations', 'id'), "
+                    "(SELECT MAX(id) FROM organizations))"
+                )
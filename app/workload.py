@@ -0,0 +1,180 @@
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+import models
+import jobs
+from deadlines import as_utc
+
+Workload = models.UserWorkload
+DueDay = models.UserDueDay
+
+DUE_SOON_DAYS = 7
+PRIORITY_COLUMNS = {
+    models.TaskPriority.low: "open_low",
+    models.TaskPriority.medium: "open_medium",
+    models.TaskPriority.high: "open_high",
+}
+# How much each open task adds to a user's load when ranking assignees.
+PRIORITY_WEIGHTS = {"open_low": 1, "open_medium": 2, "open_high": 3}
+DUE_SOON_WEIGHT = 2
+OVERDUE_WEIGHT = 3
+
+
+def _upsert(db: Session, model):
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def _counted(task):
+    """What ``task`` adds to the counters: ``(org, assignee, priority column,
+    deadline day)``, or None for completed and unassigned tasks."""
+    if task is None or task.assignee_id is None or task.status == models.TaskStatus.completed:
+        return None
+    deadline = as_utc(task.deadline)
+    return (
+        task.org_id,
+        task.assignee_id,
+        PRIORITY_COLUMNS[task.priority or models.TaskPriority.medium],
+        deadline.date() if deadline else None,
+    )
+
+
+def record_workload_delta(db: Session, key, delta: int):
+    org_id, user_id, column, day = key
+    counts = {name: 0 for name in PRIORITY_WEIGHTS}
+    counts[column] = delta
+    stmt = _upsert(db, Workload).values(user_id=user_id, org_id=org_id, **counts)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[Workload.user_id],
+        set_={column: getattr(Workload, column) + delta},
+    ))
+    if day is None:
+        return
+    stmt = _upsert(db, DueDay).values(user_id=user_id, day=day, org_id=org_id, open=delta)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[DueDay.user_id, DueDay.day],
+        set_={"open": DueDay.open + delta},
+    ))
+    if delta < 0:
+        db.execute(delete(DueDay).where(DueDay.user_id == user_id, DueDay.day == day, DueDay.open <= 0))
+
+
+def apply_task_change(db: Session, before=None, after=None):
+    """Move one task's contribution from ``before`` to ``after``; either may
+    be None for a created or deleted task."""
+    old, new = _counted(before), _counted(after)
+    if old == new:
+        return
+    if old is not None:
+        record_workload_delta(db, old, -1)
+    if new is not None:
+        record_workload_delta(db, new, 1)
+
+
+def defer_tasks_removed(db: Session, tasks):
+    """Queue the release of tasks deleted in bulk, e.g. with their project."""
+    keys = Counter(key for key in map(_counted, tasks) if key is not None)
+    if keys:
+        jobs.enqueue(db, "workload.release", {"counts": [[*key, count] for key, count in keys.items()]})
+
+
+@jobs.handler("workload.release")
+def _release(db: Session, payload: dict):
+    for org_id, user_id, column, day, count in payload["counts"]:
+        day = date.fromisoformat(day) if day else None
+        record_workload_delta(db, (org_id, user_id, column, day), -count)
+
+
+def backfill_workloads(db: Session) -> int:
+    """Rebuild both counter tables from the current contents of ``tasks``."""
+    is_open = models.Task.status != models.TaskStatus.completed
+    priorities = [
+        func.sum(case((models.Task.priority == priority, 1), else_=0)).label(column)
+        for priority, column in PRIORITY_COLUMNS.items()
+    ]
+    workloads = db.execute(
+        select(models.Task.assignee_id.label("user_id"), func.min(models.Task.org_id).label("org_id"), *priorities)
+        .where(is_open, models.Task.assignee_id.is_not(None))
+        .group_by(models.Task.assignee_id)
+    ).mappings().all()
+    due_days = Counter()
+    for org_id, user_id, deadline in db.execute(
+        select(models.Task.org_id, models.Task.assignee_id, models.Task.deadline)
+        .where(is_open, models.Task.assignee_id.is_not(None), models.Task.deadline.is_not(None))
+        .execution_options(yield_per=50000)
+    ):
+        due_days[(org_id, user_id, as_utc(deadline).date())] += 1
+
+    db.execute(delete(Workload))
+    db.execute(delete(DueDay))
+    if workloads:
+        db.execute(insert(Workload), [dict(row) for row in workloads])
+    if due_days:
+        db.execute(insert(DueDay), [
+            {"org_id": org_id, "user_id": user_id, "day": day, "open": count}
+            for (org_id, user_id, day), count in due_days.items()
+        ])
+    db.commit()
+    return len(workloads)
+
+
+def read_workloads(db: Session, org_id: int, user_ids=None):
+    """Counters of the organization's active users, lightest load first.
+
+    Reads one ``user_workloads`` row and at most a week of ``user_due_days``
+    rows (plus days already overdue) per user; tasks are never scanned.
+    """
+    today = datetime.now(timezone.utc).date()
+    due = (
+        select(
+            DueDay.user_id,
+            func.sum(case((DueDay.day < today, DueDay.open), else_=0)).label("overdue"),
+            func.sum(case((DueDay.day >= today, DueDay.open), else_=0)).label("due_this_week"),
+        )
+        .where(DueDay.org_id == org_id, DueDay.day < today + timedelta(days=DUE_SOON_DAYS))
+        .group_by(DueDay.user_id)
+        .subquery()
+    )
+    query = (
+        select(
+            models.User.id.label("user_id"), models.User.username,
+            *[func.coalesce(getattr(Workload, column), 0).label(column) for column in PRIORITY_WEIGHTS],
+            func.coalesce(due.c.due_this_week, 0).label("due_this_week"),
+            func.coalesce(due.c.overdue, 0).label("overdue"),
+        )
+        .outerjoin(Workload, Workload.user_id == models.User.id)
+        .outerjoin(due, due.c.user_id == models.User.id)
+        .where(
+            models.User.org_id == org_id,
+            models.User.role == models.UserRole.user,
+            models.User.is_active.is_not(False),
+        )
+    )
+    if user_ids is not None:
+        query = query.where(models.User.id.in_(user_ids))
+
+    rows = []
+    for row in db.execute(query).mappings():
+        row = dict(row)
+        row["open_total"] = sum(row[column] for column in PRIORITY_WEIGHTS)
+        row["load"] = (
+            sum(row[column] * weight for column, weight in PRIORITY_WEIGHTS.items())
+            + DUE_SOON_WEIGHT * row["due_this_week"]
+            + OVERDUE_WEIGHT * row["overdue"]
+        )
+        rows.append(row)
+    rows.sort(key=lambda row: (row["load"], row["open_total"], row["user_id"]))
+    return rows
+
+
+def suggest_assignees(db: Session, org_id: int, project_id: int, limit: Optional[int] = None):
+    """Project members ranked by load, or every user if the project has no
+    members yet."""
+    members = db.execute(
+        select(models.ProjectMember.user_id).where(models.ProjectMember.project_id == project_id)
+    ).scalars().all()
+    return read_workloads(db, org_id, members or None)[:limit]
@@ -0,0 +1,92 @@
+"""Time ``GET /reports/cycle-time`` on a large synthetic status history.
+
+Seeds ``--events`` status events (four per task, spread over projects and
+assignees) into a fresh SQLite database unless ``--database-url`` is given,
+then times the two halves of the report separately: fetching the events
+into arrays, and the NumPy statistics over them.
+
+    python bench/cycle_time.py --events 1000000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+STATUS_CYCLE = ("pending", "in_progress", "completed", "pending")
+
+
+def seed(engine, events: int, batch_size: int = 50000):
+    from sqlalchemy import insert
+    import models
+
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with engine.begin() as conn:
+        for first in range(0, events, batch_size):
+            conn.execute(insert(models.TaskStatusEvent), [
+                {
+                    "task_id": i // 4 + 1,
+                    "project_id": i // 4 % 50 + 1,
+                    "assignee_id": i // 4 % 200 + 1,
+                    "to_status": STATUS_CYCLE[i % 4],
+                    "created_at": start + timedelta(seconds=37 * i),
+                }
+                for i in range(first, min(first + batch_size, events))
+            ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Defaults to a fresh SQLite file")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--out", default=str(Path(__file__).resolve().parent / "results" / "cycle_time.json"))
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tmp}/cycle_time.db"
+        sys.path.insert(0, str(APP_DIR))
+        import reports
+        from database import Base, SessionLocal, engine
+
+        Base.metadata.create_all(engine)
+        started = time.perf_counter()
+        seed(engine, args.events)
+        print(f"🌱 Seeded {args.events:,} events in {time.perf_counter() - started:.1f}s")
+
+        fetches, stats = [], []
+        for run in range(args.runs):
+            db = SessionLocal()
+            try:
+                started = time.perf_counter()
+                arrays = reports.fetch_status_events(db)
+                fetches.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                reports.cycle_time_stats(*arrays)
+                stats.append(time.perf_counter() - started)
+            finally:
+                db.close()
+            print(f"⏱️  run {run + 1}: fetch {fetches[-1]:.2f}s, statistics {stats[-1]:.2f}s")
+        engine.dispose()
+
+    result = {
+        "events": args.events,
+        "fetch_seconds": min(fetches),
+        "statistics_seconds": min(stats),
+        "events_per_second": args.events / (min(fetches) + min(stats)),
+    }
+    print(f"📊 best of {args.runs}: fetch {result['fetch_seconds']:.2f}s, "
+          f"statistics {result['statistics_seconds']:.2f}s, {result['events_per_second']:,.0f} events/s")
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+    print(f"💾 Results written to {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+
+import httpx
+import numpy as np
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.recording = False
+
+    def add(self, label, seconds, status_code):
+        if not self.recording:
+            return
+        self.latencies[label].append(seconds)
+        self.statuses[label][status_code] += 1
+        if status_code >= 400:
+            self.errors[label] += 1
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for label, values in sorted(self.latencies.items()):
+            ms = np.array(values) * 1000.0
+            endpoints[label] = {
+                "requests": int(len(ms)),
+                "errors": int(self.errors[label]),
+                "throughput_rps": len(ms) / elapsed,
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p95_ms": float(np.percentile(ms, 95)),
+                "p99_ms": float(np.percentile(ms, 99)),
+                "status_codes": {str(k): v for k, v in sorted(self.statuses[label].items())},
+            }
+        total = sum(e["requests"] for e in endpoints.values())
+        return {
+            "elapsed_s": elapsed,
+            "total_requests": total,
+            "total_errors": sum(e["errors"] for e in endpoints.values()),
+            "throughput_rps": total / elapsed if elapsed else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+class Session:
+    """One virtual user: an HTTP client plus the credentials it acts with."""
+
+    def __init__(self, client, recorder, username, password, is_admin):
+        self.client = client
+        self.recorder = recorder
+        self.username = username
+        self.password = password
+        self.is_admin = is_admin
+        self.headers = {}
+        self.task_ids = []
+
+    async def request(self, label, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+            status_code = response.status_code
+        except httpx.HTTPError:
+            response, status_code = None, 599
+        self.recorder.add(label, time.perf_counter() - started, status_code)
+        return response
+
+    async def login(self):
+        response = await self.request(
+            "POST /auth/login", "POST", "/auth/login",
+            json={"username": self.username, "password": self.password},
+        )
+        if response is not None and response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return response
+
+
+async def login_storm(session, rng, ctx):
+    await session.login()
+
+
+async def dashboard_read(session, rng, ctx):
+    await session.request("GET /me/dashboard", "GET", "/me/dashboard")
+
+
+async def task_filter(session, rng, ctx):
+    params = {}
+    if rng.random() < 0.7:
+        params["status"] = rng.choice(["pending", "in_progress", "completed"])
+    if rng.random() < 0.5:
+        params["priority"] = rng.choice(["low", "medium", "high"])
+    if session.is_admin and rng.random() < 0.5 and ctx["user_ids"]:
+        params["assignee_id"] = rng.choice(ctx["user_ids"])
+    response = await session.request("GET /tasks", "GET", "/tasks", params=params)
+    if response is not None and response.status_code == 200 and not session.is_admin:
+        session.task_ids = [t["id"] for t in response.json()] or session.task_ids
+
+
+async def bulk_update(session, rng, ctx):
+    task_ids = session.task_ids or ctx["task_ids"]
+    for task_id in rng.sample(task_ids, min(5, len(task_ids))):
+        status = rng.choice(["pending", "in_progress", "completed"])
+        await session.request("PUT /tasks/{id}", "PUT", f"/tasks/{task_id}", json={"status": status})
+
+
+async def comment_write(session, rng, ctx):
+    task_ids = session.task_ids or ctx["task_ids"]
+    if task_ids:
+        await session.request("POST /comments", "POST", "/comments", json={
+            "task_id": rng.choice(task_ids),
+            "content": f"Benchmark comment {rng.randrange(1_000_000)}",
+        })
+
+
+SCENARIOS = {
+    "login_storm": login_storm,
+    "dashboard_read": dashboard_read,
+    "task_filter": task_filter,
+    "bulk_update": bulk_update,
+    "comment_write": comment_write,
+}
+
+WORKLOADS = {
+    # Weights of each scenario per virtual-user iteration.
+    "mixed": {"login_storm": 1, "dashboard_read": 5, "task_filter": 6, "bulk_update": 2, "comment_write": 3},
+    "reads": {"dashboard_read": 1, "task_filter": 1},
+    "writes": {"bulk_update": 1, "comment_write": 1},
+    "logins": {"login_storm": 1},
+}
+
+
+async def virtual_user(session, rng, ctx, weights, stop_at):
+    names = list(weights)
+    probabilities = [weights[name] for name in names]
+    await session.login()
+    while time.monotonic() < stop_at:
+        scenario = rng.choices(names, probabilities)[0]
+        # Only regular users own tasks; admins may write to any task.
+        if scenario in ("bulk_update", "comment_write") and not (session.task_ids or session.is_admin):
+            scenario = "task_filter"
+        await SCENARIOS[scenario](session, rng, ctx)
+
+
+async def run_workload(base_url, accounts, ctx, workload="mixed", concurrency=16,
+                       duration=30.0, warmup=5.0, seed=42):
+    """Drive ``concurrency`` virtual users against ``base_url`` and summarise latencies."""
+    recorder = Recorder()
+    weights = WORKLOADS[workload]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        sessions = [
+            Session(client, recorder, *accounts[i % len(accounts)])
+            for i in range(concurrency)
+        ]
+        stop_at = time.monotonic() + warmup + duration
+        tasks = [
+            asyncio.create_task(virtual_user(s, random.Random(seed + i), ctx, weights, stop_at))
+            for i, s in enumerate(sessions)
+        ]
+        await asyncio.sleep(warmup)
+        recorder.recording = True
+        started = time.monotonic()
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+    return recorder.summary(elapsed)
@@ -0,0 +1,232 @@
+"""Reproducible API load benchmark.
+
+Seeds a database with ``init_db.py generate``, starts the FastAPI app under
+uvicorn, drives a mixed async workload against it and writes per-endpoint
+throughput and latency percentiles to JSON. With ``--baseline`` the run is
+compared against a stored result and exits non-zero on regression.
+
+    python bench/run.py --duration 30 --out bench/results/latest.json
+    python bench/run.py --baseline bench/baseline.json --threshold 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from loadgen import WORKLOADS, run_workload
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_DIR = ROOT / "app"
+DATA_DIR = Path(__file__).resolve().parent / ".data"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seed_database(database_url, args):
+    command = [
+        sys.executable, "init_db.py", "generate",
+        "--users", str(args.users),
+        "--projects", str(args.projects),
+        "--tasks-per-project", str(args.tasks_per_project),
+        "--comments-per-task", str(args.comments_per_task),
+        "--seed", str(args.seed),
+        "--as-of", "2026-01-01T00:00:00",
+        "--password", args.password,
+    ]
+    env = dict(os.environ, DATABASE_URL=database_url, BCRYPT_ROUNDS=str(args.bcrypt_rounds))
+    subprocess.run(command, cwd=APP_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+def start_server(database_url, port, workers):
+    # Every virtual user shares one client IP, so per-IP and per-user rate
+    # limits would measure the limiter rather than the API. The login slots
+    # go too: a 503 at login leaves a virtual user without a token, and all
+    # its later requests fail. The archiver would move the seeded completed
+    # tasks away mid-run.
+    env = dict(
+        os.environ, DATABASE_URL=database_url,
+        RATE_LIMIT_IP_PER_SECOND="0", RATE_LIMIT_USER_PER_SECOND="0", CONCURRENCY_LIMIT_AUTH="0",
+        ARCHIVE_INTERVAL_SECONDS="0",
+    )
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+    ]
+    return subprocess.Popen(command, cwd=APP_DIR, env=env)
+
+
+def wait_until_ready(base_url, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{base_url}/health", timeout=1.0).raise_for_status()
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready within {timeout}s")
+
+
+def discover(base_url, admin_username, password):
+    """Collect accounts and task ids to drive the workload with."""
+    with httpx.Client(base_url=base_url, timeout=30.0) as client:
+        users = client.post("/auth/login", json={"username": admin_username, "password": password})
+        users.raise_for_status()
+        headers = {"Authorization": f"Bearer {users.json()['access_token']}"}
+        all_users = client.get("/users", params={"limit": 100}, headers=headers).json()
+        tasks = client.get("/tasks", params={"limit": 100}, headers=headers).json()
+    accounts = [(u["username"], password, u["role"] == "admin") for u in all_users]
+    ctx = {
+        "user_ids": [u["id"] for u in all_users if u["role"] == "user"],
+        "task_ids": [t["id"] for t in tasks],
+    }
+    return accounts, ctx
+
+
+def compare(result, baseline, threshold):
+    """Return human-readable regressions of ``result`` against ``baseline``."""
+    regressions = []
+    for label, base in baseline["endpoints"].items():
+        current = result["endpoints"].get(label)
+        if current is None:
+            regressions.append(f"{label}: missing from this run")
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if current[metric] > base[metric] * (1 + threshold):
+                regressions.append(
+                    f"{label}: {metric} {current[metric]:.1f} > {base[metric]:.1f} (+{threshold:.0%})"
+                )
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(
+                f"{label}: throughput {current['throughput_rps']:.1f} < {base['throughput_rps']:.1f} rps"
+            )
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(result):
+    print(f"\n{'endpoint':<22}{'req':>8}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for label, e in result["endpoints"].items():
+        print(f"{label:<22}{e['requests']:>8}{e['errors']:>6}{e['throughput_rps']:>9.1f}"
+              f"{e['p50_ms']:>9.1f}{e['p95_ms']:>9.1f}{e['p99_ms']:>9.1f}")
+    print(f"\nTotal: {result['total_requests']} requests, {result['throughput_rps']:.1f} rps, "
+          f"{result['total_errors']} errors")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Defaults to a fresh SQLite file under bench/.data")
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse an already seeded database")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--tasks-per-project", type=int, default=500)
+    parser.add_argument("--comments-per-task", type=float, default=2.0)
+    parser.add_argument("--password", default="user123")
+    parser.add_argument(
+        "--bcrypt-rounds", type=int, default=4,
+        help="Cost of the seeded password hashes; 12 in production makes login time the hash's",
+    )
+    parser.add_argument("--admin-username", default="gen_admin_1", help="Admin used to discover accounts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workload", choices=sorted(WORKLOADS), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--out", default=str(Path(__file__).resolve().parent / "results" / "latest.json"))
+    parser.add_argument("--baseline", help="Compare against this result file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run to --baseline")
+    return parser
+
+
+def run(args):
+    database_url = args.database_url
+    if database_url is None:
+        DATA_DIR.mkdir(exist_ok=True)
+        db_path = DATA_DIR / "bench.db"
+        if not args.skip_seed:
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+        database_url = f"sqlite:///{db_path}"
+    if not args.skip_seed:
+        print("🧪 Seeding database...")
+        seed_database(database_url, args)
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(database_url, port, args.workers)
+    try:
+        wait_until_ready(base_url)
+        accounts, ctx = discover(base_url, args.admin_username, args.password)
+        print(f"🚀 Running '{args.workload}' for {args.duration}s with {args.concurrency} virtual users...")
+        result = asyncio.run(run_workload(
+            base_url, accounts, ctx,
+            workload=args.workload, concurrency=args.concurrency,
+            duration=args.duration, warmup=args.warmup, seed=args.seed,
+        ))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    result["meta"] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "database": database_url.split(":", 1)[0],
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("database_url", "password")},
+    }
+    return result
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    result = run(args)
+    print_table(result)
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+    print(f"💾 Results written to {out}")
+
+    if args.baseline:
+        baseline_path = Path(args.baseline)
+        if args.save_baseline or not baseline_path.exists():
+            baseline_path.write_text(json.dumps(result, indent=2))
+            print(f"📌 Baseline saved to {baseline_path}")
+            return 0
+        regressions = compare(result, json.loads(baseline_path.read_text()), args.threshold)
+        if regressions:
+            print("❌ Performance regressions:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print("✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,13 +3,17 @@ import requests
 import pandas as pd
 from datetime import datetime, date, timedelta
 import json
+import uuid
 import plotly.express as px
 import plotly.graph_objects as go
 
 API_BASE_URL = "http://localhost:8000"
+POST_RETRIES = 2
 
 if 'token' not in st.session_state:
     st.session_state.token = None
+if 'refresh_token' not in st.session_state:
+    st.session_state.refresh_token = None
 if 'user_info' not in st.session_state:
     st.session_state.user_info = None
 if 'selected_task_id' not in st.session_state:
@@ -17,7 +21,25 @@ if 'selected_task_id' not in st.session_state:
 if 'show_task_details' not in st.session_state:
     st.session_state.show_task_details = {}
 
-def make_request(method, endpoint, data=None, params=None):
+def store_tokens(token_data):
+    st.session_state.token = token_data["access_token"]
+    st.session_state.refresh_token = token_data.get("refresh_token")
+
+def refresh_session():
+    """Swap the refresh token for a new pair instead of logging in again"""
+    if not st.session_state.get("refresh_token"):
+        return False
+    response = requests.post(
+        f"{API_BASE_URL}/auth/refresh",
+        json={"refresh_token": st.session_state.refresh_token},
+        timeout=30,
+    )
+    if response.status_code != 200:
+        return False
+    store_tokens(response.json())
+    return True
+
+def make_request(method, endpoint, data=None, params=None, retry_auth=True):
     """Make API request with authentication"""
     headers = {}
     if st.session_state.token:
@@ -29,20 +51,33 @@ def make_request(method, endpoint, data=None, params=None):
         if method == "GET":
             response = requests.get(url, headers=headers, params=params)
         elif method == "POST":
-            response = requests.post(url, headers=headers, json=data)
+            # The same key on every attempt makes retries safe to replay.
+            headers["Idempotency-Key"] = str(uuid.uuid4())
+            for attempt in range(POST_RETRIES + 1):
+                try:
+                    response = requests.post(url, headers=headers, json=data, timeout=30)
+                    break
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                    if attempt == POST_RETRIES:
+                        raise
         elif method == "PUT":
             response = requests.put(url, headers=headers, json=data)
         elif method == "DELETE":
             response = requests.delete(url, headers=headers)
         
+        if response.status_code == 401 and retry_auth and not endpoint.startswith("/auth/") and refresh_session():
+            return make_request(method, endpoint, data, params, retry_auth=False)
         if response.status_code == 401:
             st.session_state.token = None
+            st.session_state.refresh_token = None
             st.session_state.user_info = None
             st.error("⚠️ Session expired. Please login again.")
             st.rerun()
+        elif response.status_code in (429, 503):
+            st.warning(f"⏳ The server is busy. Please retry in {response.headers.get('Retry-After', '1')}s.")
         
         return response
-    except requests.exceptions.ConnectionError:
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
         st.error("🚫 Cannot connect to API. Make sure the backend server is running.")
         return None
 
@@ -81,6 +116,48 @@ def show_task_analytics():
                            title="Task Priority Distribution")
                 st.plotly_chart(fig, use_container_width=True)
 
+def show_deadlines():
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        st.markdown("#### ⏰ Due This Week")
+        response = make_request("GET", "/tasks/due", params={"within": "7d"})
+        if response and response.status_code == 200:
+            due = response.json()
+            if due:
+                for task in due:
+                    if task['overdue']:
+                        st.error(f"⚠️ **{task['title']}** - overdue by {abs(task['days_left'])} days")
+                    elif task['days_left'] == 0:
+                        st.warning(f"🚨 **{task['title']}** - due today")
+                    else:
+                        st.info(f"📅 **{task['title']}** - due in {task['days_left']} days")
+            else:
+                st.success("🎉 Nothing due this week")
+    
+    with col2:
+        st.markdown("#### 📅 Calendar")
+        start = date.today().replace(day=1)
+        response = make_request("GET", "/calendar", params={
+            "from": start.isoformat(),
+            "to": (start + timedelta(days=41)).isoformat()
+        })
+        if response and response.status_code == 200:
+            days = {d['day']: d for d in response.json()}
+            cells = []
+            for offset in range(42):
+                day = start + timedelta(days=offset)
+                cells.append({
+                    "week": (day - timedelta(days=day.weekday())).isoformat(),
+                    "weekday": day.strftime("%a"),
+                    "open": days.get(day.isoformat(), {}).get('open', 0)
+                })
+            cells = pd.DataFrame(cells)
+            grid = cells.pivot_table(index='week', columns='weekday', values='open', fill_value=0, sort=False)
+            grid = grid.reindex(columns=["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"], fill_value=0)
+            fig = px.imshow(grid, title="Open Tasks by Deadline", text_auto=True,
+                          labels=dict(x="Day", y="Week of", color="Open"))
+            st.plotly_chart(fig, use_container_width=True)
+
 def login_page():
     st.title("🔐 Team Task Management System")
     st.markdown("### Welcome! Please login to continue")
@@ -109,8 +186,7 @@ def login_page():
                                 })
                                 
                                 if response and response.status_code == 200:
-                                    token_data = response.json()
-                                    st.session_state.token = token_data["access_token"]
+                                    store_tokens(response.json())
                                     
                                     user_response = make_request("GET", "/auth/me")
                                     if user_response and user_response.status_code == 200:
@@ -241,12 +317,15 @@ def display_projects():
                                 response = make_request("PUT", f"/projects/{project['id']}", {
                                     "title": new_title,
                                     "description": new_description,
-                                    "status": new_status
+                                    "status": new_status,
+                                    "expected_version": project.get('version')
                                 })
                                 if response and response.status_code == 200:
                                     st.success("✅ Project updated!")
                                     st.session_state[f"edit_project_{project['id']}"] = False
                                     st.rerun()
+                                elif response and response.status_code == 409:
+                                    st.warning("⚠️ Someone else changed this project. Reload to see their changes.")
                             
                             if cancel:
                                 st.session_state[f"edit_project_{project['id']}"] = False
@@ -283,6 +362,13 @@ def create_task_form():
                     
                     if users:
                         user_options = {u['username']: u['id'] for u in users if u['role'] == 'user'}
+                        workload_response = make_request("GET", "/users/workload")
+                        if workload_response and workload_response.status_code == 200:
+                            # Lightest load first, with the counts in the label
+                            user_options = {
+                                f"{w['username']} · {w['open_total']} open, {w['due_this_week']} due this week": w['user_id']
+                                for w in workload_response.json()
+                            }
                         if user_options:
                             selected_user = st.selectbox("👤 Assign to", list(user_options.keys()))
                             assignee_id = user_options.get(selected_user)
@@ -322,7 +408,11 @@ def create_task_form():
                         response = make_request("POST", "/tasks", task_data)
                         if response and response.status_code == 200:
                             st.success("✅ Task created successfully!")
-                            st.rerun()
+                            duplicates = response.headers.get("X-Possible-Duplicates")
+                            if duplicates:
+                                st.warning(f"⚠️ Looks similar to existing task(s) #{duplicates.replace(', ', ', #')}")
+                            else:
+                                st.rerun()
                         else:
                             st.error("❌ Failed to create task")
                 elif submit:
@@ -439,13 +529,16 @@ def display_tasks_interactive():
                                     "description": new_description,
                                     "status": new_status,
                                     "priority": new_priority,
-                                    "estimated_hours": new_estimated_hours
+                                    "estimated_hours": new_estimated_hours,
+                                    "expected_version": task.get('version')
                                 }
                                 response = make_request("PUT", f"/tasks/{task['id']}", update_data)
                                 if response and response.status_code == 200:
                                     st.success("✅ Task updated!")
                                     st.session_state[f"edit_task_{task['id']}"] = False
                                     st.rerun()
+                                elif response and response.status_code == 409:
+                                    st.warning("⚠️ Someone else changed this task. Reload to see their changes.")
                             
                             if cancel:
                                 st.session_state[f"edit_task_{task['id']}"] = False
@@ -460,7 +553,7 @@ def admin_dashboard():
     
     show_task_analytics()
     
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(["🏗️ Projects", "📋 Tasks", "👥 Users", "💬 Comments", "📊 Reports"])
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["🏗️ Projects", "📋 Tasks", "👥 Users", "💬 Comments", "📊 Reports", "📅 Deadlines"])
     
     with tab1:
         st.subheader("🏗️ Project Management")
@@ -527,48 +620,66 @@ def admin_dashboard():
     with tab5:
         st.subheader("📊 Reports & Analytics")
         
+        col1, col2 = st.columns(2)
+        with col1:
+            report_range = st.date_input("📅 Period", value=(date.today() - timedelta(days=90), date.today()))
+        with col2:
+            granularity = st.selectbox("🗓️ Granularity", ["day", "week", "month"])
+        
+        if isinstance(report_range, (list, tuple)) and len(report_range) == 2:
+            response = make_request("GET", "/reports/timeseries", params={
+                "from": report_range[0].isoformat(),
+                "to": report_range[1].isoformat(),
+                "granularity": granularity
+            })
+            if response and response.status_code == 200 and response.json():
+                series = pd.DataFrame(response.json())
+                created = series.pivot_table(index='period', columns='status', values='created', fill_value=0)
+                fig = px.area(created, title="Task Creation Over Time by Status")
+                st.plotly_chart(fig, use_container_width=True)
+                
+                open_tasks = series.pivot_table(index='period', columns='status', values='open', fill_value=0)
+                fig = px.line(open_tasks, title="Tasks per Status at End of Period")
+                st.plotly_chart(fig, use_container_width=True)
+        
         response = make_request("GET", "/tasks")
         if response and response.status_code == 200:
             tasks = response.json()
             if tasks:
                 df = pd.DataFrame(tasks)
 
-                if 'created_at' in df.columns:
-                    df['created_date'] = pd.to_datetime(df['created_at']).dt.date
-                    daily_tasks = df.groupby(['created_date', 'status']).size().unstack(fill_value=0)
-                    
-                    if not daily_tasks.empty:
-                        fig = px.area(daily_tasks, title="Task Creation Over Time by Status")
-                        st.plotly_chart(fig, use_container_width=True)
-
                 if len(df) > 0:
                     priority_status = pd.crosstab(df['priority'], df['status'])
                     fig = px.imshow(priority_status, title="Priority vs Status Heatmap", 
                                   labels=dict(x="Status", y="Priority", color="Count"))
                     st.plotly_chart(fig, use_container_width=True)
+    
+    with tab6:
+        st.subheader("📅 Deadlines")
+        show_deadlines()
 
 def user_dashboard():
     st.title("👤 User Dashboard")
 
-    response = make_request("GET", "/tasks")
+    dashboard = None
+    response = make_request("GET", "/me/dashboard")
     if response and response.status_code == 200:
-        tasks = response.json()
-        user_tasks = [t for t in tasks if t.get('assignee_id') == st.session_state.user_info.get('id')]
+        dashboard = response.json()
+        counts = dashboard['counts']
         
-        col1, col2, col3, col4 = st.columns(4)
+        col1, col2, col3, col4, col5 = st.columns(5)
         with col1:
-            st.metric("📋 My Tasks", len(user_tasks))
+            st.metric("📋 My Tasks", counts['total'])
         with col2:
-            completed = len([t for t in user_tasks if t['status'] == 'completed'])
-            st.metric("✅ Completed", completed)
+            st.metric("✅ Completed", counts['completed'])
         with col3:
-            in_progress = len([t for t in user_tasks if t['status'] == 'in_progress'])
-            st.metric("🔄 In Progress", in_progress)
+            st.metric("🔄 In Progress", counts['in_progress'])
         with col4:
-            pending = len([t for t in user_tasks if t['status'] == 'pending'])
-            st.metric("⏳ Pending", pending)
+            st.metric("⏳ Pending", counts['pending'])
+        with col5:
+            st.metric("⚠️ Overdue", counts['overdue'], delta=f"{counts['due_today']} due today", delta_color="off")
     
-    tab1, tab2, tab3 = st.tabs(["📋 My Tasks", "💬 Comments", "📊 My Progress"])
+    tab1, tab2, tab3, tab4 = st.tabs(["📋 My Tasks", "💬 Comments", "📊 My Progress", "📅 Deadlines"])
     
     with tab1:
         st.subheader("📋 My Assigned Tasks")
@@ -583,14 +694,14 @@ def user_dashboard():
             if st.button("🔄 Refresh", use_container_width=True):
                 st.rerun()
         
-        params = {}
+        # /tasks also lists other members' tasks in the user's projects.
+        params = {"assignee_id": st.session_state.user_info['id']}
         if status_filter != "All":
             params["status"] = status_filter
         
         response = make_request("GET", "/tasks", params=params)
         if response and response.status_code == 200:
-            tasks = response.json()
-            my_tasks = [t for t in tasks if t.get('assignee_id') == st.session_state.user_info.get('id')]
+            my_tasks = response.json()
             
             if my_tasks:
                 for task in my_tasks:
@@ -657,10 +768,15 @@ def user_dashboard():
     with tab2:
         st.subheader("💬 Task Comments")
 
-        response = make_request("GET", "/tasks")
+        if dashboard and dashboard['recent_comments']:
+            with st.expander("🕒 Recent activity on my tasks"):
+                for comment in dashboard['recent_comments']:
+                    st.markdown(f"**{comment['task_title']}** - 📅 {comment['created_at']}")
+                    st.write(f"💬 {comment['content']}")
+
+        response = make_request("GET", "/tasks", params={"assignee_id": st.session_state.user_info['id']})
         if response and response.status_code == 200:
-            tasks = response.json()
-            my_tasks = [t for t in tasks if t.get('assignee_id') == st.session_state.user_info.get('id')]
+            my_tasks = response.json()
             
             if my_tasks:
                 task_options = {f"{t['title']} (ID: {t['id']})": t['id'] for t in my_tasks}
@@ -716,50 +832,43 @@ def user_dashboard():
     with tab3:
         st.subheader("📊 My Progress Analytics")
 
-        response = make_request("GET", "/tasks")
-        if response and response.status_code == 200:
-            tasks = response.json()
-            my_tasks = [t for t in tasks if t.get('assignee_id') == st.session_state.user_info.get('id')]
+        if dashboard:
+            charts = dashboard['charts']
             
-            if my_tasks:
-                df = pd.DataFrame(my_tasks)
-                
+            if dashboard['counts']['total']:
                 col1, col2 = st.columns(2)
                 
                 with col1:
-                    status_counts = df['status'].value_counts()
-                    fig = px.pie(values=status_counts.values, names=status_counts.index, 
+                    status_counts = {k: v for k, v in charts['status'].items() if v}
+                    fig = px.pie(values=list(status_counts.values()), names=list(status_counts.keys()), 
                                title="My Task Status Distribution")
                     st.plotly_chart(fig, use_container_width=True)
                 
                 with col2:
-                    priority_counts = df['priority'].value_counts()
-                    colors = ['green' if p == 'low' else 'orange' if p == 'medium' else 'red' 
-                             for p in priority_counts.index]
-                    fig = px.bar(x=priority_counts.index, y=priority_counts.values,
+                    priority_counts = {k: v for k, v in charts['priority'].items() if v}
+                    fig = px.bar(x=list(priority_counts.keys()), y=list(priority_counts.values()),
                                title="My Task Priority Distribution",
-                               color=priority_counts.index,
+                               color=list(priority_counts.keys()),
                                color_discrete_map={'low': 'green', 'medium': 'orange', 'high': 'red'})
                     st.plotly_chart(fig, use_container_width=True)
                 
-                if 'created_at' in df.columns:
-                    df['created_date'] = pd.to_datetime(df['created_at']).dt.date
-                    df_sorted = df.sort_values('created_date')
-                    
-                    fig = px.timeline(df_sorted, x_start='created_date', x_end='created_date', 
-                                    y='title', color='status',
-                                    title="My Task Timeline")
+                if charts['created_by_day']:
+                    df = pd.DataFrame(charts['created_by_day'])
+                    daily_tasks = df.pivot_table(index='date', columns='status', values='count', fill_value=0)
+                    fig = px.bar(daily_tasks, title="My Task Timeline")
                     st.plotly_chart(fig, use_container_width=True)
                 
-                completed_tasks = len(df[df['status'] == 'completed'])
-                total_tasks = len(df)
-                completion_rate = (completed_tasks / total_tasks) * 100 if total_tasks > 0 else 0
+                completion_rate = dashboard['completion_rate']
                 
                 st.metric("📈 Completion Rate", f"{completion_rate:.1f}%")
                 st.progress(completion_rate / 100)
                 
             else:
                 st.info("📊 No task data available for analytics")
+    
+    with tab4:
+        st.subheader("📅 My Deadlines")
+        show_deadlines()
 
 def main():
     st.set_page_config(
@@ -810,6 +919,19 @@ def main():
             
             st.divider()
             
+            response = make_request("GET", "/me/notifications", params={"limit": 5})
+            if response and response.status_code == 200:
+                page = response.json()
+                st.markdown(f"### 🔔 Notifications ({page['unread']} unread)")
+                for note in page['items']:
+                    with st.expander(f"{'🆕 ' if not note['read_at'] else ''}{note['title']}"):
+                        st.text(note['body'] or "")
+                if page['unread'] and st.button("✅ Mark All Read", use_container_width=True):
+                    make_request("POST", "/me/notifications/read", {"up_to": page['items'][0]['id']})
+                    st.rerun()
+                
+                st.divider()
+            
             st.markdown("### ⚡ Quick Actions")
             if st.button("🔄 Refresh Dashboard", use_container_width=True):
                 st.rerun()
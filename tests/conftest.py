@@ -0,0 +1,100 @@
+import itertools
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+
+# The app reads its settings at import, so the whole session shares one
+# throwaway SQLite database. Background loops are off; tests drive the jobs,
+# flushes and scans they need themselves.
+_DATA_DIR = tempfile.mkdtemp(prefix="task-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_DATA_DIR}/tests.db",
+    "ARCHIVE_INTERVAL_SECONDS": "0",
+    "JOB_CONCURRENCY": "0",
+    "ACTIVITY_FLUSH_SECONDS": "0",
+    "NOTIFY_INTERVAL_SECONDS": "0",
+    "SIMILARITY_REBUILD_SECONDS": "0",
+    "REVOCATION_REFRESH_SECONDS": "3600",
+    "RATE_LIMIT_IP_PER_SECOND": "0",
+    "RATE_LIMIT_USER_PER_SECOND": "0",
+    "INVALIDATION_BUS": "off",
+    "BCRYPT_ROUNDS": "4",
+})
+sys.path.insert(0, str(APP_DIR))
+
+_names = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def app_main():
+    import main
+    return main
+
+
+@pytest.fixture(scope="session")
+def client(app_main):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app_main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def unique():
+    """A username no other test uses."""
+    return lambda prefix="user": f"{prefix}_{next(_names)}"
+
+
+@pytest.fixture
+def register(client):
+    def register(username, role="user", password="secret"):
+        response = client.post("/auth/register", json={
+            "username": username, "email": f"{username}@example.com", "password": password, "role": role,
+        })
+        assert response.status_code == 200, response.text
+        return response.json()
+    return register
+
+
+@pytest.fixture
+def login(client):
+    def login(username, password="secret"):
+        response = client.post("/auth/login", json={"username": username, "password": password})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return login
+
+
+@pytest.fixture
+def admin(unique, register, login):
+    username = unique("admin")
+    register(username, "admin")
+    return login(username)
+
+
+@pytest.fixture
+def db(app_main):
+    from database import SessionLocal
+
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def foreign_admin(client, admin, unique, login):
+    response = client.post("/organizations", json={"name": unique("org")}, headers=admin)
+    assert response.status_code == 200, response.text
+    organization = response.json()
+    username = unique("admin")
+    response = client.post("/auth/register", json={
+        "username": username, "email": f"{username}@example.com", "password": "secret",
+        "role": "admin", "org_id": organization["id"],
+    })
+    assert response.status_code == 200, response.text
+    return login(username)
@@ -0,0 +1,88 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import update
+
+import activity
+import models
+from database import SessionLocal
+
+
+@pytest.fixture
+def task(client, admin, unique, register):
+    assignee = register(unique())
+    project = client.post("/projects", json={"title": "Audited"}, headers=admin).json()
+    return client.post("/tasks", json={
+        "title": "Audited", "project_id": project["id"], "assignee_id": assignee["id"],
+    }, headers=admin).json()
+
+
+def history(client, headers, task_id):
+    activity.flush(SessionLocal)
+    response = client.get(f"/tasks/{task_id}/activity", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["items"]
+
+
+def test_task_updates_and_deletes_are_logged(client, admin, task):
+    me = client.get("/auth/me", headers=admin).json()
+    client.put(f"/tasks/{task['id']}", json={"status": "completed", "title": "Audited!"}, headers=admin)
+    [updated] = history(client, admin, task["id"])
+    assert updated["action"] == "updated" and updated["actor_id"] == me["id"]
+    assert updated["changes"]["status"] == {"from": "pending", "to": "completed"}
+    assert updated["changes"]["title"]["to"] == "Audited!"
+
+    client.delete(f"/tasks/{task['id']}", headers=admin)
+    # Newest first, and still readable by admins after the task is gone.
+    assert [entry["action"] for entry in history(client, admin, task["id"])] == ["deleted", "updated"]
+
+
+def test_feed_pages_oldest_first(client, admin, task):
+    since = datetime.now(timezone.utc)
+    for priority in ("low", "high", "medium"):
+        client.put(f"/tasks/{task['id']}", json={"priority": priority}, headers=admin)
+    activity.flush(SessionLocal)
+
+    seen, cursor = [], None
+    while True:
+        params = {"since": since.isoformat(), "limit": 1, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/activity", params=params, headers=admin).json()
+        if not page["items"]:
+            break
+        seen += page["items"]
+        cursor = page["next_cursor"]
+    mine = [entry["changes"]["priority"]["to"] for entry in seen if entry["entity_id"] == task["id"]]
+    assert mine == ["low", "high", "medium"]
+    assert [entry["id"] for entry in seen] == sorted(entry["id"] for entry in seen)
+
+
+def test_orm_writes_are_captured_from_flushes(client, admin, task, db):
+    row = db.get(models.Task, task["id"])
+    row.title = "Renamed in the ORM"
+    db.commit()
+    comment = models.Comment(content="Seen", task_id=task["id"], author_id=task["assignee_id"])
+    db.add(comment)
+    db.commit()
+    row.title = "Rolled back"
+    db.flush()
+    db.rollback()
+
+    [renamed] = history(client, admin, task["id"])
+    assert renamed["changes"]["title"] == {"from": "Audited", "to": "Renamed in the ORM"}
+    comments = db.query(models.ActivityLog).filter(
+        models.ActivityLog.entity == "comment", models.ActivityLog.entity_id == comment.id
+    ).all()
+    assert [entry.action for entry in comments] == ["created"]
+
+
+def test_log_is_append_only(db):
+    with pytest.raises(PermissionError):
+        db.execute(update(models.ActivityLog).values(action="forged"))
+
+
+def test_full_buffer_drops_the_oldest_entries():
+    buffer = activity.ActivityBuffer(maxsize=3)
+    buffer.extend([1, 2])
+    buffer.extend([3, 4, 5])
+    assert buffer.dropped == 2
+    assert buffer.take(10) == [3, 4, 5]
@@ -0,0 +1,79 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+import admission
+
+
+def test_user_rate_limit_returns_429(client, monkeypatch, unique, register, login):
+    monkeypatch.setattr(admission, "RATE_LIMIT_USER_PER_SECOND", 0.5)
+    monkeypatch.setattr(admission, "RATE_LIMIT_USER_BURST", 2)
+    username = unique()
+    register(username)
+    headers = login(username)
+    statuses = [client.get("/projects", headers=headers).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    response = client.get("/projects", headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_ip_rate_limit_applies_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(admission, "RATE_LIMIT_IP_PER_SECOND", 0.5)
+    monkeypatch.setattr(admission, "RATE_LIMIT_IP_BURST", 1)
+    # The bucket may hold a token left from earlier tests; at most one gets through.
+    statuses = [client.get("/projects").status_code for _ in range(3)]
+    assert statuses.count(429) >= 2
+    assert client.get("/health").status_code == 200
+
+
+@pytest.fixture
+def slotted():
+    store = admission.InMemoryCounterStore()
+
+    async def ok(request):
+        return PlainTextResponse("ok")
+
+    inner = Starlette(routes=[Route("/items", ok), Route("/health", ok), Route("/auth/login", ok, methods=["POST"])])
+    return store, TestClient(admission.AdmissionControlMiddleware(inner, store))
+
+
+def test_full_route_class_returns_503(slotted, monkeypatch):
+    store, client = slotted
+    monkeypatch.setitem(admission.CONCURRENCY_LIMITS, "reads", 1)
+    assert store.acquire("slots:reads", 1)
+    response = client.get("/items")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    # Other classes and exempt paths are unaffected.
+    assert client.post("/auth/login").status_code == 200
+    assert client.get("/health").status_code == 200
+    store.release("slots:reads")
+    assert client.get("/items").status_code == 200
+
+
+def test_slots_are_returned_after_each_request(slotted, monkeypatch):
+    _, client = slotted
+    monkeypatch.setitem(admission.CONCURRENCY_LIMITS, "reads", 1)
+    assert [client.get("/items").status_code for _ in range(3)] == [200, 200, 200]
+
+
+def test_counter_store_is_abstract():
+    with pytest.raises(TypeError):
+        admission.CounterStore()
+
+
+def test_oversized_limit_is_clamped(client, admin, monkeypatch):
+    for title in ("Page A", "Page B", "Page C"):
+        client.post("/projects", json={"title": title}, headers=admin)
+    assert client.get("/projects", params={"limit": 100000}, headers=admin).status_code == 200
+    monkeypatch.setattr(admission, "MAX_PAGE_SIZE", 2)
+    response = client.get("/projects", params={"limit": 100000}, headers=admin)
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+
+
+def test_non_positive_limit_is_rejected(client, admin):
+    assert client.get("/projects", params={"limit": 0}, headers=admin).status_code == 422
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import update
+
+import archive
+import models
+
+
+@pytest.fixture
+def project(client, admin, unique, register, db):
+    """A project with an old completed task, a recent one and an old open one."""
+    assignee = register(unique())
+    project = client.post("/projects", json={"title": "Archive"}, headers=admin).json()
+    tasks = {}
+    for name, task_status in (("recent", "completed"), ("open", "pending"), ("old", "completed")):
+        tasks[name] = client.post("/tasks", json={
+            "title": name, "status": task_status, "project_id": project["id"], "assignee_id": assignee["id"],
+        }, headers=admin).json()
+    client.post("/comments", json={"task_id": tasks["old"]["id"], "content": "Done and dusted"}, headers=admin)
+    long_ago = datetime.now(timezone.utc) - timedelta(days=archive.ARCHIVE_AFTER_DAYS + 1)
+    db.execute(
+        update(models.Task)
+        .where(models.Task.id.in_([tasks["old"]["id"], tasks["open"]["id"]]))
+        .values(updated_at=long_ago)
+    )
+    db.commit()
+    return project["id"], assignee["id"], tasks
+
+
+def titles(client, headers, assignee_id, **params):
+    response = client.get("/tasks", params={"assignee_id": assignee_id, **params}, headers=headers)
+    assert response.status_code == 200, response.text
+    return sorted(task["title"] for task in response.json())
+
+
+def test_old_completed_tasks_move_to_the_archive(client, admin, db, project):
+    _, assignee_id, tasks = project
+    assert archive.archive_completed_tasks(db) >= 1
+
+    assert titles(client, admin, assignee_id) == ["open", "recent"]
+    assert titles(client, admin, assignee_id, include_archived=True) == ["old", "open", "recent"]
+    assert client.get(f"/tasks/{tasks['old']['id']}", headers=admin).status_code == 404
+    comments = db.query(models.ArchivedComment.content).filter(models.ArchivedComment.task_id == tasks["old"]["id"])
+    assert [content for (content,) in comments] == ["Done and dusted"]
+    assert db.query(models.Comment).filter(models.Comment.task_id == tasks["old"]["id"]).count() == 0
+
+    # Archived ids are never handed out again.
+    reused = client.post("/tasks", json={
+        "title": "new", "project_id": tasks["old"]["project_id"], "assignee_id": assignee_id,
+    }, headers=admin).json()
+    assert reused["id"] > max(task["id"] for task in tasks.values())
+
+
+def test_deleting_a_project_removes_live_and_archived_tasks(client, admin, db, project):
+    project_id, assignee_id, tasks = project
+    archive.archive_completed_tasks(db)
+    client.post("/comments", json={"task_id": tasks["open"]["id"], "content": "Still open"}, headers=admin)
+
+    assert client.delete(f"/projects/{project_id}", headers=admin).status_code == 200
+    db.expire_all()
+    assert titles(client, admin, assignee_id, include_archived=True) == []
+    for model, column in (
+        (models.Task, models.Task.project_id),
+        (models.ArchivedTask, models.ArchivedTask.project_id),
+        (models.TaskDailyRollup, models.TaskDailyRollup.project_id),
+    ):
+        assert db.query(model).filter(column == project_id).count() == 0
+    task_ids = [task["id"] for task in tasks.values()]
+    assert db.query(models.Comment).filter(models.Comment.task_id.in_(task_ids)).count() == 0
+    assert db.query(models.ArchivedComment).filter(models.ArchivedComment.task_id.in_(task_ids)).count() == 0
+    assert client.get(f"/projects/{project_id}", headers=admin).status_code == 404
@@ -0,0 +1,65 @@
+import pytest
+
+
+@pytest.fixture
+def task(client, admin, unique, register):
+    assignee = register(unique())
+    project = client.post("/projects", json={"title": "Versioned"}, headers=admin).json()
+    return client.post("/tasks", json={
+        "title": "Versioned", "project_id": project["id"], "assignee_id": assignee["id"],
+    }, headers=admin).json()
+
+
+def test_read_returns_version_etag(client, admin, task):
+    response = client.get(f"/tasks/{task['id']}", headers=admin)
+    assert response.headers["ETag"] == '"1"'
+
+
+def test_matching_if_match_updates_and_bumps_version(client, admin, task):
+    response = client.put(f"/tasks/{task['id']}", json={"title": "First"}, headers={**admin, "If-Match": '"1"'})
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    assert response.headers["ETag"] == '"2"'
+
+
+def test_stale_if_match_conflicts(client, admin, task):
+    client.put(f"/tasks/{task['id']}", json={"title": "First"}, headers={**admin, "If-Match": '"1"'})
+    response = client.put(f"/tasks/{task['id']}", json={"title": "Second"}, headers={**admin, "If-Match": '"1"'})
+    assert response.status_code == 409
+    assert response.headers["ETag"] == '"2"'
+    assert client.get(f"/tasks/{task['id']}", headers=admin).json()["title"] == "First"
+
+
+def test_stale_body_version_conflicts(client, admin, task):
+    client.put(f"/tasks/{task['id']}", json={"title": "First"}, headers=admin)
+    response = client.put(f"/tasks/{task['id']}", json={"title": "Second", "expected_version": 1}, headers=admin)
+    assert response.status_code == 409
+
+
+def test_weak_and_wildcard_if_match(client, admin, task):
+    response = client.put(f"/tasks/{task['id']}", json={"title": "Weak"}, headers={**admin, "If-Match": 'W/"1"'})
+    assert response.status_code == 200
+    response = client.put(f"/tasks/{task['id']}", json={"title": "Any"}, headers={**admin, "If-Match": "*"})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("headers, body", [
+    ({"If-Match": "abc"}, {}),
+    ({"If-Match": '"1"'}, {"expected_version": 2}),
+])
+def test_bad_preconditions_are_rejected(client, admin, task, headers, body):
+    response = client.put(f"/tasks/{task['id']}", json={"title": "Bad", **body}, headers={**admin, **headers})
+    assert response.status_code == 400
+
+
+def test_project_update_conflicts(client, admin):
+    project = client.post("/projects", json={"title": "Versioned"}, headers=admin).json()
+    assert client.put(f"/projects/{project['id']}", json={"title": "A"}, headers={**admin, "If-Match": '"1"'}).status_code == 200
+    response = client.put(f"/projects/{project['id']}", json={"title": "B"}, headers={**admin, "If-Match": '"1"'})
+    assert response.status_code == 409
+    assert response.headers["ETag"] == '"2"'
+
+
+def test_missing_task_is_not_a_conflict(client, admin):
+    response = client.put("/tasks/999999", json={"title": "Gone"}, headers={**admin, "If-Match": '"1"'})
+    assert response.status_code == 404
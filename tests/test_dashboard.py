@@ -0,0 +1,73 @@
+from datetime import datetime, time, timedelta, timezone
+
+import pytest
+
+TODAY = datetime.combine(datetime.now(timezone.utc).date(), time(12), tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def people(client, admin, unique, register, login):
+    """Two users with their headers, the first owning three tasks."""
+    users = [register(unique()) for _ in range(2)]
+    project = client.post("/projects", json={"title": "Dashboard"}, headers=admin).json()
+    tasks = {}
+    for name, task_status, priority, deadline in (
+        ("overdue", "pending", "high", TODAY - timedelta(days=2)),
+        ("today", "in_progress", "medium", TODAY),
+        ("done", "completed", "low", None),
+    ):
+        tasks[name] = client.post("/tasks", json={
+            "title": name, "status": task_status, "priority": priority,
+            "deadline": deadline.isoformat() if deadline else None,
+            "project_id": project["id"], "assignee_id": users[0]["id"],
+        }, headers=admin).json()
+    return [(user, login(user["username"])) for user in users], tasks
+
+
+def dashboard(client, headers):
+    response = client.get("/me/dashboard", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_counters(client, people):
+    [(_, headers), _], tasks = people
+    board = dashboard(client, headers)
+    assert board["counts"] == {
+        "total": 3, "pending": 1, "in_progress": 1, "completed": 1, "overdue": 1, "due_today": 1,
+    }
+    assert round(board["completion_rate"], 1) == 33.3
+    assert [task["id"] for task in board["open_tasks"]["pending"]] == [tasks["overdue"]["id"]]
+    assert board["charts"]["priority"] == {"low": 1, "medium": 1, "high": 1}
+    # Served from the cache until something changes.
+    assert dashboard(client, headers)["generated_at"] == board["generated_at"]
+
+
+def test_status_change_invalidates(client, people):
+    [(_, headers), _], tasks = people
+    dashboard(client, headers)
+    response = client.put(f"/tasks/{tasks['overdue']['id']}", json={"status": "completed"}, headers=headers)
+    assert response.status_code == 200, response.text
+    counts = dashboard(client, headers)["counts"]
+    assert (counts["pending"], counts["completed"], counts["overdue"]) == (0, 2, 0)
+
+
+def test_reassignment_invalidates_both_users(client, admin, people):
+    [(_, first), (second_user, second)], tasks = people
+    dashboard(client, first)
+    assert dashboard(client, second)["counts"]["total"] == 0
+
+    client.put(f"/tasks/{tasks['today']['id']}", json={"assignee_id": second_user["id"]}, headers=admin)
+    assert dashboard(client, first)["counts"]["total"] == 2
+    moved = dashboard(client, second)
+    assert (moved["counts"]["total"], moved["counts"]["due_today"]) == (1, 1)
+
+
+def test_comments_and_deletes_invalidate(client, admin, people):
+    [(_, headers), _], tasks = people
+    dashboard(client, headers)
+    client.post("/comments", json={"task_id": tasks["today"]["id"], "content": "On it"}, headers=headers)
+    assert [c["content"] for c in dashboard(client, headers)["recent_comments"]] == ["On it"]
+
+    client.delete(f"/tasks/{tasks['done']['id']}", headers=admin)
+    assert dashboard(client, headers)["counts"]["completed"] == 0
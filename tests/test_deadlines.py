@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture
+def schedule(client, admin, unique, register, login):
+    """A user's tasks by name, with deadlines around now; returns their headers too."""
+    assignee = register(unique())
+    project = client.post("/projects", json={"title": "Deadlines"}, headers=admin).json()
+    deadlines = {
+        "overdue": (NOW - timedelta(days=1), "pending"),
+        "soon": (NOW + timedelta(hours=2), "in_progress"),
+        "later": (NOW + timedelta(days=3), "pending"),
+        "next month": (NOW + timedelta(days=30), "pending"),
+        "done": (NOW + timedelta(hours=1), "completed"),
+    }
+    tasks = {}
+    for name, (deadline, task_status) in deadlines.items():
+        tasks[name] = client.post("/tasks", json={
+            "title": name, "deadline": deadline.isoformat(), "status": task_status,
+            "project_id": project["id"], "assignee_id": assignee["id"],
+        }, headers=admin).json()
+    return login(assignee["username"]), tasks
+
+
+def due(client, headers, **params):
+    response = client.get("/tasks/due", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_due_tasks_within_a_window(client, schedule):
+    headers, _ = schedule
+    assert [task["title"] for task in due(client, headers, within="1d")] == ["overdue", "soon"]
+    assert [task["title"] for task in due(client, headers, within="1d", include_overdue=False)] == ["soon"]
+    assert [task["title"] for task in due(client, headers, within="2w")] == ["overdue", "soon", "later"]
+    assert [task["title"] for task in due(client, headers, within="36h")] == ["overdue", "soon"]
+
+    overdue, _, later = due(client, headers, within="1w")
+    assert overdue["overdue"] and overdue["days_left"] == -1
+    assert not later["overdue"] and later["days_left"] == 3
+
+
+@pytest.mark.parametrize("within, status_code", [
+    ("52w", 200), ("53w", 400), ("9000h", 400), ("0d", 422), ("7m", 422), ("d", 422),
+])
+def test_window_limits(client, admin, within, status_code):
+    assert client.get("/tasks/due", params={"within": within}, headers=admin).status_code == status_code
+
+
+def test_calendar_groups_deadlines_by_day(client, schedule):
+    headers, tasks = schedule
+    start, end = (NOW - timedelta(days=1)).date(), (NOW + timedelta(days=3)).date()
+    response = client.get("/calendar", params={"from": start.isoformat(), "to": end.isoformat()}, headers=headers)
+    assert response.status_code == 200, response.text
+
+    expected = {}
+    for name in ("overdue", "soon", "later", "done"):
+        day = datetime.fromisoformat(tasks[name]["deadline"]).date().isoformat()
+        expected.setdefault(day, []).append(tasks[name]["id"])
+    days = response.json()
+    assert {day["day"]: sorted(day["task_ids"]) for day in days} == {k: sorted(v) for k, v in expected.items()}
+    assert sum(day["count"] for day in days) == 4
+    assert sum(day["open"] for day in days) == 3
+
+
+def test_calendar_range_limits(client, admin):
+    today = NOW.date()
+
+    def status(days):
+        return client.get("/calendar", params={
+            "from": today.isoformat(), "to": (today + timedelta(days=days)).isoformat(),
+        }, headers=admin).status_code
+    assert status(365) == 200
+    assert status(366) == 400
+    assert status(-1) == 400
@@ -0,0 +1,62 @@
+import pytest
+
+
+@pytest.fixture
+def chain(client, admin, unique, register):
+    """Three tasks where c waits for b and b waits for a."""
+    assignee = register(unique())
+    project = client.post("/projects", json={"title": "Chain"}, headers=admin).json()
+    a, b, c = (
+        client.post("/tasks", json={
+            "title": name, "project_id": project["id"], "assignee_id": assignee["id"],
+        }, headers=admin).json()["id"]
+        for name in "abc"
+    )
+    link(client, admin, b, a)
+    link(client, admin, c, b)
+    return a, b, c
+
+
+def link(client, headers, blocked, blocker):
+    return client.post(f"/tasks/{blocked}/dependencies", json={"blocker_id": blocker}, headers=headers)
+
+
+def linked(client, headers, task_id, direction="blockers"):
+    response = client.get(f"/tasks/{task_id}/{direction}", headers=headers)
+    assert response.status_code == 200, response.text
+    return [(task["id"], task["depth"]) for task in response.json()]
+
+
+def test_closure_holds_transitive_depths(client, admin, chain):
+    a, b, c = chain
+    assert linked(client, admin, c) == [(b, 1), (a, 2)]
+    assert linked(client, admin, a, "blocked") == [(b, 1), (c, 2)]
+    # A shortcut keeps the shortest chain.
+    assert link(client, admin, c, a).status_code == 200
+    assert linked(client, admin, c) == [(a, 1), (b, 1)]
+
+
+def test_cycles_are_rejected(client, admin, chain):
+    a, b, c = chain
+    response = link(client, admin, a, c)
+    assert response.status_code == 409
+    assert link(client, admin, a, a).status_code == 409
+    assert linked(client, admin, a) == []
+
+
+def test_unlinking_shrinks_the_closure(client, admin, chain):
+    a, b, c = chain
+    assert client.delete(f"/tasks/{b}/dependencies/{a}", headers=admin).status_code == 200
+    assert linked(client, admin, c) == [(b, 1)]
+    assert linked(client, admin, a, "blocked") == []
+    assert client.delete(f"/tasks/{b}/dependencies/{a}", headers=admin).status_code == 404
+    # The link that was removed no longer blocks a reverse one.
+    assert link(client, admin, a, c).status_code == 200
+
+
+def test_deleting_a_middle_task_splits_the_chain(client, admin, chain):
+    a, b, c = chain
+    assert client.delete(f"/tasks/{b}", headers=admin).status_code == 200
+    assert linked(client, admin, c) == []
+    assert linked(client, admin, a, "blocked") == []
+    assert link(client, admin, a, c).status_code == 200
@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import idempotency
+
+
+def create_project(client, headers, key, title="Idempotent"):
+    return client.post("/projects", json={"title": title}, headers={**headers, "Idempotency-Key": key})
+
+
+def count_projects(client, headers, title):
+    return sum(project["title"] == title for project in client.get("/projects", headers=headers).json())
+
+
+def test_retry_replays_the_first_response(client, admin, unique):
+    key, title = unique("key"), unique("project")
+    first = create_project(client, admin, key, title)
+    retry = create_project(client, admin, key, title)
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert count_projects(client, admin, title) == 1
+
+
+def test_replay_survives_a_cold_cache(client, admin, unique):
+    key, title = unique("key"), unique("project")
+    first = create_project(client, admin, key, title)
+    idempotency.results.clear()
+    retry = create_project(client, admin, key, title)
+    assert retry.json()["id"] == first.json()["id"]
+    assert retry.headers["Idempotent-Replayed"] == "true"
+
+
+def test_reusing_a_key_for_another_request_is_rejected(client, admin, unique):
+    key = unique("key")
+    create_project(client, admin, key, unique("project"))
+    assert create_project(client, admin, key, unique("project")).status_code == 422
+
+
+def test_keys_are_scoped_per_user(client, unique, register, login):
+    first, second = unique("admin"), unique("admin")
+    register(first, "admin")
+    register(second, "admin")
+    key, title = unique("key"), unique("project")
+    a = create_project(client, login(first), key, title)
+    b = create_project(client, login(second), key, title)
+    assert a.json()["id"] != b.json()["id"]
+
+
+def test_concurrent_duplicates_create_once(client, admin, unique):
+    key, title = unique("key"), unique("project")
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        responses = list(pool.map(lambda _: create_project(client, admin, key, title), range(4)))
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.json()["id"] for response in responses}) == 1
+    assert count_projects(client, admin, title) == 1
+
+
+def test_failed_requests_are_not_recorded(client, admin, unique):
+    key = unique("key")
+    body = {"title": "Orphan", "project_id": 999999, "assignee_id": 999999}
+    headers = {**admin, "Idempotency-Key": key}
+    assert client.post("/tasks", json=body, headers=headers).status_code == 404
+    retry = client.post("/tasks", json=body, headers=headers)
+    assert retry.status_code == 404
+    assert "Idempotent-Replayed" not in retry.headers
+
+
+def test_oversized_key_is_rejected(client, admin):
+    assert create_project(client, admin, "k" * 256).status_code == 400
@@ -0,0 +1,81 @@
+import io
+import json
+
+import pytest
+
+import importer
+import models
+
+
+@pytest.fixture
+def target(client, admin, unique, register):
+    """A project with a unique title and an assignee to import into."""
+    assignee = register(unique())
+    project = client.post("/projects", json={"title": unique("import")}, headers=admin).json()
+    return project, assignee
+
+
+def upload(client, headers, name, content, **params):
+    response = client.post(
+        "/import/tasks", params=params, files={"file": (name, content.encode())}, headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def imported(db, project_id):
+    db.expire_all()
+    return sorted(title for (title,) in db.query(models.Task.title).filter(models.Task.project_id == project_id))
+
+
+def test_bad_rows_are_reported_and_good_ones_loaded(client, admin, db, target):
+    project, assignee = target
+    content = "\n".join([
+        "title,project,assignee,status,priority",
+        f"By name,{project['title']},{assignee['username']},pending,high",
+        f"Unknown project,no such project,{assignee['username']},pending,high",
+        f"Bad status,{project['title']},{assignee['username']},someday,high",
+        f"Done,{project['title']},{assignee['username']},completed,low",
+    ])
+    job = upload(client, admin, "tasks.csv", content)
+    assert (job["status"], job["rows_read"], job["rows_loaded"], job["rows_failed"]) == ("done", 4, 2, 2)
+    assert [error["row"] for error in job["errors"]] == [2, 3]
+    assert "Unknown project" in job["errors"][0]["error"]
+    assert imported(db, project["id"]) == ["By name", "Done"]
+    assert client.get(f"/import/tasks/{job['id']}", headers=admin).json()["rows_loaded"] == 2
+
+
+def test_jsonl_rows_that_do_not_parse_are_rejected(client, admin, db, target):
+    project, assignee = target
+    good = {"title": "Parsed", "project_id": project["id"], "assignee_id": assignee["id"]}
+    job = upload(client, admin, "tasks.jsonl", "\n".join([json.dumps(good), "{not json", "[1, 2]"]))
+    assert (job["rows_loaded"], job["rows_failed"]) == (1, 2)
+    assert imported(db, project["id"]) == ["Parsed"]
+
+
+def test_failed_import_resumes_after_its_last_chunk(client, admin, db, target, monkeypatch):
+    project, assignee = target
+    lines = "\n".join(
+        json.dumps({"title": f"Row {row}", "project_id": project["id"], "assignee_id": assignee["id"]})
+        for row in range(1, 7)
+    )
+    job = importer.start_import(db, models.DEFAULT_ORG_ID, "jsonl", "tasks.jsonl")
+    load_chunk, calls = importer.load_chunk, []
+
+    def crash_on_second_chunk(*args):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("worker died")
+        return load_chunk(*args)
+
+    monkeypatch.setattr(importer, "load_chunk", crash_on_second_chunk)
+    importer.run_import(db, job, io.BytesIO(lines.encode()), chunk_size=2)
+    assert (job.status, job.rows_read, job.rows_loaded) == (models.JobStatus.failed, 2, 2)
+    assert imported(db, project["id"]) == ["Row 1", "Row 2"]
+
+    monkeypatch.setattr(importer, "load_chunk", load_chunk)
+    resumed = upload(client, admin, "tasks.jsonl", lines, resume=job.id)
+    assert (resumed["status"], resumed["rows_read"], resumed["rows_loaded"]) == ("done", 6, 6)
+    assert imported(db, project["id"]) == [f"Row {row}" for row in range(1, 7)]
+    response = client.post("/import/tasks", params={"resume": job.id}, files={"file": ("t.jsonl", b"")}, headers=admin)
+    assert response.status_code == 409
@@ -0,0 +1,145 @@
+import json
+import os
+import queue
+import tempfile
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import delete, update
+
+import access
+import dashboard
+import invalidation
+import models
+import revocation
+import similarity
+from database import SessionLocal
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    """What this worker would tell the others, without starting a bus."""
+    bus = SimpleNamespace(outbox=queue.SimpleQueue())
+    monkeypatch.setattr(invalidation, "_bus", bus)
+
+    def sent():
+        messages = []
+        while not bus.outbox.empty():
+            messages.append(bus.outbox.get())
+        return messages
+    return sent
+
+
+def test_deleting_a_project_invalidates_its_assignees_dashboards(client, admin, unique, register, outbox):
+    assignee = register(unique())
+    project = client.post("/projects", json={"title": "Doomed"}, headers=admin).json()
+    client.post("/tasks", json={
+        "title": "Doomed", "project_id": project["id"], "assignee_id": assignee["id"],
+    }, headers=admin)
+    outbox()
+
+    assert client.delete(f"/projects/{project['id']}", headers=admin).status_code == 200
+    assert ("dashboards", [assignee["id"]]) in outbox()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def socket_buses(monkeypatch):
+    # Unix socket paths are limited to about 100 bytes; keep the directory short.
+    directory = tempfile.mkdtemp(prefix="inv", dir="/tmp")
+    received = []
+    monkeypatch.setitem(invalidation.HANDLERS, "test", lambda worker, keys: received.append((worker, keys)))
+    buses = [invalidation.SocketBus(lambda: None, directory) for _ in range(2)]
+    for name, bus in zip("ab", buses):
+        bus.session_factory = name
+        bus.start()
+    yield buses, received
+    for bus in buses:
+        bus.stop()
+    os.rmdir(directory)
+
+
+def test_socket_bus_delivers_to_other_workers_only(socket_buses):
+    (a, b), received = socket_buses
+    a.outbox.put(("test", [1, 2]))
+    a.outbox.put(("test", [2, 3]))
+    assert wait_for(lambda: received)
+    time.sleep(0.1)
+    assert [(worker, sorted(keys)) for worker, keys in received] == [("b", [1, 2, 3])]
+
+    b.outbox.put(("test", [[4, 5]]))
+    assert wait_for(lambda: len(received) == 2)
+    assert received[1] == ("a", [[4, 5]])
+
+
+def test_bus_ignores_its_own_messages(socket_buses):
+    (a, _), received = socket_buses
+    for message in invalidation._encode(a.sender, "test", [1]):
+        a.dispatch(message)
+    assert received == []
+
+
+def test_large_messages_are_split():
+    keys = list(range(100000, 103000))
+    messages = invalidation._encode("sender", "test", keys)
+    assert len(messages) > 1
+    assert all(len(message) <= invalidation.MAX_MESSAGE_BYTES for message in messages)
+    assert [key for message in messages for key in json.loads(message)["k"]] == keys
+
+
+def message_from_elsewhere(topic, keys):
+    bus = invalidation.InvalidationBus(SessionLocal)
+    bus.sender = "elsewhere"
+    [message] = invalidation._encode("other worker", topic, keys)
+    bus.dispatch(message)
+
+
+@pytest.mark.parametrize("topic, cache", [
+    ("access", access.access_cache),
+    ("dashboards", dashboard.dashboard_cache),
+])
+def test_cache_entries_are_dropped(topic, cache):
+    cache.set(987654, "stale")
+    message_from_elsewhere(topic, [987654])
+    assert cache.get(987654) is None
+
+
+def test_revoked_tokens_are_noted():
+    revocation.revocation_index.set(987654, 3)
+    message_from_elsewhere("tokens", [[987654, 4]])
+    assert revocation.revocation_index.get(987654) == 4
+    # An older message arriving late does not bring back revoked tokens.
+    message_from_elsewhere("tokens", [[987654, 2]])
+    assert revocation.revocation_index.get(987654) == 4
+
+
+def test_similarity_index_follows_other_workers(client, admin, unique, register, db):
+    assignee = register(unique())
+    project = client.post("/projects", json={"title": "Similar"}, headers=admin).json()
+    task = client.post("/tasks", json={
+        "title": "Calibrate the flux capacitor", "project_id": project["id"], "assignee_id": assignee["id"],
+    }, headers=admin).json()
+    org_id = models.DEFAULT_ORG_ID
+    assert similarity.similar_to(org_id, "Calibrate the flux capacitor", None)[0][0] == task["id"]
+
+    # Another worker renames the task: this one re-reads it.
+    with db.get_bind().begin() as conn:
+        conn.execute(update(models.Task).where(models.Task.id == task["id"]).values(title="Polish the warp coils"))
+    message_from_elsewhere("similarity", [task["id"]])
+    assert similarity.similar_to(org_id, "Polish the warp coils", None)[0][0] == task["id"]
+    assert task["id"] not in similarity.possible_duplicates(org_id, "Calibrate the flux capacitor", None)
+
+    # ... and deletes it.
+    with db.get_bind().begin() as conn:
+        conn.execute(delete(models.Task).where(models.Task.id == task["id"]))
+    message_from_elsewhere("similarity", [task["id"]])
+    assert task["id"] not in dict(similarity.similar_to(org_id, "Polish the warp coils", None))
@@ -0,0 +1,128 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import jobs
+import models
+import notifications
+
+# Far enough ahead that no other test's deadlines fall in the scanned windows.
+START = datetime(2099, 6, 1, tzinfo=timezone.utc)
+LEAD = timedelta(seconds=notifications.REMINDER_LEAD_SECONDS)
+
+
+@pytest.fixture
+def sink(tmp_path, monkeypatch):
+    sink = notifications.FileSink(str(tmp_path / "notifications.log"))
+    monkeypatch.setattr(notifications, "sink", sink)
+    return sink
+
+
+@pytest.fixture
+def assignees(client, admin, unique, register, login, db):
+    users = [register(unique()) for _ in range(2)]
+    project = client.post("/projects", json={"title": "Deadlines"}, headers=admin).json()
+
+    def task(user, deadline, **fields):
+        response = client.post("/tasks", json={
+            "title": f"Due {deadline:%H:%M}", "project_id": project["id"], "assignee_id": user["id"],
+            "deadline": deadline.isoformat(), **fields,
+        }, headers=admin)
+        assert response.status_code == 200, response.text
+
+    first, second = users
+    task(first, START + timedelta(hours=1))
+    task(first, START + LEAD + timedelta(hours=2))
+    task(first, START + timedelta(hours=3), status="completed")
+    task(second, START + timedelta(hours=4))
+
+    db.merge(models.Watermark(name=notifications.WATERMARK, value=START))
+    db.commit()
+    return [(user, login(user["username"])) for user in users]
+
+
+def digests_for(db, user_ids):
+    return (
+        db.query(models.Notification)
+        .filter(models.Notification.user_id.in_(user_ids))
+        .order_by(models.Notification.id)
+        .all()
+    )
+
+
+def deliver_all(db, notification_ids):
+    runner = jobs.JobRunner(lambda: db)
+    queued = [
+        job for job in db.query(models.Job).filter(models.Job.kind == "notifications.deliver")
+        if json.loads(job.payload)["id"] in notification_ids
+    ]
+    for job in queued:
+        runner.execute(db, job)
+    return queued
+
+
+def sent(sink):
+    with open(sink.path, encoding="utf-8") as log:
+        return [json.loads(line) for line in log]
+
+
+def test_one_digest_per_user_per_window(db, assignees):
+    (first, _), (second, _) = assignees
+    now = START + timedelta(hours=5)
+    assert notifications.scan_deadlines(db, now=now) >= 2
+
+    digests = digests_for(db, [first["id"], second["id"]])
+    assert [d.user_id for d in digests] == [first["id"], second["id"]]
+    assert digests[0].title == "Deadlines: 1 overdue, 1 due soon"
+    assert digests[1].title == "Deadlines: 1 overdue"
+    assert len(json.loads(digests[0].task_ids)) == 2
+
+    # The watermark has moved: the same window is not reported twice.
+    assert notifications.scan_deadlines(db, now=now) == 0
+    assert notifications.scan_deadlines(db, now=now + timedelta(minutes=1)) == 0
+    assert len(digests_for(db, [first["id"], second["id"]])) == 2
+
+
+def test_digests_are_delivered_once(db, assignees, sink):
+    (first, _), (second, _) = assignees
+    notifications.scan_deadlines(db, now=START + timedelta(hours=5))
+    ids = [d.id for d in digests_for(db, [first["id"], second["id"]])]
+
+    queued = deliver_all(db, ids)
+    assert len(queued) == 2
+    # A retried or duplicated job finds the digest already delivered.
+    for job in queued:
+        jobs.HANDLERS[job.kind][0](db, json.loads(job.payload))
+    db.commit()
+
+    assert sorted(message["to"] for message in sent(sink)) == sorted(
+        f"{user['username']}@example.com" for user in (first, second)
+    )
+    assert all(d.delivered_at is not None for d in digests_for(db, [first["id"], second["id"]]))
+
+
+def test_inbox_pages_and_marks_read(client, db, assignees):
+    (first, headers), _ = assignees
+    now = START + timedelta(hours=5)
+    notifications.scan_deadlines(db, now=now)
+    # A second window gives the user a second digest.
+    notifications.scan_deadlines(db, now=now + LEAD)
+
+    page = client.get("/me/notifications", params={"limit": 1}, headers=headers).json()
+    assert page["unread"] == 2
+    assert len(page["items"]) == 1 and page["next_cursor"] == page["items"][0]["id"]
+    newest = page["items"][0]
+    rest = client.get("/me/notifications", params={"cursor": page["next_cursor"]}, headers=headers).json()
+    assert [item["id"] < newest["id"] for item in rest["items"]] == [True]
+    assert rest["next_cursor"] is None
+
+    response = client.post("/me/notifications/read", json={"ids": [newest["id"]]}, headers=headers)
+    assert response.json()["marked"] == 1
+    unread = client.get("/me/notifications", params={"unread_only": True}, headers=headers).json()
+    assert unread["unread"] == 1
+    assert [item["id"] for item in unread["items"]] == [rest["items"][0]["id"]]
+
+    response = client.post("/me/notifications/read", json={"up_to": newest["id"]}, headers=headers)
+    assert response.json()["marked"] == 1
+    assert client.get("/me/notifications", headers=headers).json()["unread"] == 0
@@ -0,0 +1,70 @@
+"""init_db.py commands against their own fresh SQLite databases."""
+import pytest
+from sqlalchemy import func, select
+
+import init_db
+import models
+import snapshot
+from database import Base, build_engine
+from datagen import generate_dataset
+from tenancy import ensure_default_organization
+
+
+def fresh_engine(path):
+    engine = build_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def foreign_key_violations(engine):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA foreign_key_check").all()
+
+
+def organizations(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(models.Organization)).scalar()
+
+
+@pytest.fixture
+def generated(tmp_path):
+    engine = fresh_engine(tmp_path / "generated.db")
+    generate_dataset(
+        engine, users=5, admins=1, projects=2, tasks_per_project=5, comments_per_task=1,
+        seed=1, progress=lambda *_: None,
+    )
+    yield engine
+    engine.dispose()
+
+
+def test_generate_creates_the_default_organization(generated):
+    assert organizations(generated) == 1
+    assert foreign_key_violations(generated) == []
+
+
+def test_restore_into_a_fresh_database_satisfies_foreign_keys(generated, tmp_path):
+    path = str(tmp_path / "snapshot.tar")
+    manifest = snapshot.create_snapshot(generated, path)
+    assert {entry["name"]: entry["rows"] for entry in manifest["tables"]}["organizations"] == 1
+
+    target = fresh_engine(tmp_path / "restored.db")
+    loaded = snapshot.restore_snapshot(target, path)
+    assert loaded["tasks"] == 10
+    assert organizations(target) == 1
+    assert foreign_key_violations(target) == []
+    target.dispose()
+
+
+def test_sample_data_feeds_reports_and_workloads(tmp_path):
+    engine = fresh_engine(tmp_path / "sample.db")
+    ensure_default_organization(engine)
+    init_db.create_sample_data(engine)
+    with engine.connect() as conn:
+        tasks = conn.execute(select(func.count()).select_from(models.Task)).scalar()
+        assert tasks > 0
+        for model in (models.TaskStatusEvent, models.TaskDailyRollup, models.UserWorkload, models.ActivityLog):
+            assert conn.execute(select(func.count()).select_from(model)).scalar() > 0, model.__tablename__
+        events = conn.execute(select(func.count(func.distinct(models.TaskStatusEvent.task_id)))).scalar()
+    assert events == tasks
+    assert foreign_key_violations(engine) == []
+    engine.dispose()
@@ -0,0 +1,101 @@
+"""The exact number of SQL statements each write endpoint issues.
+
+Guards against an endpoint quietly growing an extra lookup or refresh.
+Update ``EXPECTED`` deliberately when a write path changes.
+"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+# Statements per request on SQLite. Authentication comes from token claims
+# and costs nothing; rollups and status history are one queued job each. The
+# job runner is off here, so only the enqueue is counted. Deleting a task
+# also deletes its dependency links. PostgreSQL saves one more on status
+# changes by reading the previous values in the UPDATE itself.
+EXPECTED = {
+    "POST /auth/register": 2,
+    "POST /auth/register (taken)": 1,
+    "POST /projects": 1,
+    "PUT /projects/{id}": 1,
+    "POST /tasks": 2,
+    "PUT /tasks/{id} (status)": 3,
+    "PUT /tasks/{id} (title)": 1,
+    "PUT /tasks/{id} (not owner)": 2,
+    "POST /comments": 1,
+    "POST /comments (not owner)": 2,
+    "DELETE /tasks/{id}": 4,
+}
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    @contextmanager
+    def measure(self, label, results):
+        self.count = 0
+        yield
+        results[label] = self.count
+
+
+@pytest.fixture(scope="module")
+def counts(client):
+    from database import engine
+    from revocation import revocation_index
+
+    results = {}
+    counter = StatementCounter()
+
+    def register(username, role="user"):
+        return client.post("/auth/register", json={
+            "username": username, "email": f"{username}@example.com", "password": "secret", "role": role,
+        })
+
+    def login(username):
+        response = client.post("/auth/login", json={"username": username, "password": "secret"})
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    event.listen(engine, "before_cursor_execute", counter.on_execute)
+    try:
+        with counter.measure("POST /auth/register", results):
+            register("qc_admin", "admin")
+        with counter.measure("POST /auth/register (taken)", results):
+            register("qc_admin", "admin")
+        owner = register("qc_owner").json()
+        register("qc_other")
+        admin, user, other = login("qc_admin"), login("qc_owner"), login("qc_other")
+        # Load the token revocation index now rather than inside a measurement.
+        revocation_index.refresh(engine)
+
+        with counter.measure("POST /projects", results):
+            project = client.post("/projects", json={"title": "Counted"}, headers=admin).json()
+        with counter.measure("PUT /projects/{id}", results):
+            client.put(f"/projects/{project['id']}", json={"title": "Renamed"}, headers=admin)
+        with counter.measure("POST /tasks", results):
+            task = client.post("/tasks", json={
+                "title": "Counted", "project_id": project["id"], "assignee_id": owner["id"],
+            }, headers=admin).json()
+        with counter.measure("PUT /tasks/{id} (status)", results):
+            client.put(f"/tasks/{task['id']}", json={"status": "in_progress"}, headers=user)
+        with counter.measure("PUT /tasks/{id} (title)", results):
+            client.put(f"/tasks/{task['id']}", json={"title": "Retitled"}, headers=admin)
+        with counter.measure("PUT /tasks/{id} (not owner)", results):
+            client.put(f"/tasks/{task['id']}", json={"status": "completed"}, headers=other)
+        with counter.measure("POST /comments", results):
+            client.post("/comments", json={"task_id": task["id"], "content": "counted"}, headers=user)
+        with counter.measure("POST /comments (not owner)", results):
+            client.post("/comments", json={"task_id": task["id"], "content": "counted"}, headers=other)
+        with counter.measure("DELETE /tasks/{id}", results):
+            client.delete(f"/tasks/{task['id']}", headers=admin)
+    finally:
+        event.remove(engine, "before_cursor_execute", counter.on_execute)
+    return results
+
+
+@pytest.mark.parametrize("label", EXPECTED)
+def test_statement_count(counts, label):
+    assert counts[label] == EXPECTED[label]
@@ -0,0 +1,98 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+import jobs
+import models
+import reports
+
+DAY = date(2020, 3, 2)
+
+
+@pytest.fixture
+def project_tasks(client, admin, unique, register):
+    assignee = register(unique())
+    project = client.post("/projects", json={"title": "Rollups"}, headers=admin).json()
+    tasks = [
+        client.post("/tasks", json={
+            "title": f"Task {i}", "project_id": project["id"], "assignee_id": assignee["id"],
+        }, headers=admin).json()
+        for i in range(2)
+    ]
+    return project["id"], tasks
+
+
+def run_job(db, kind, task, day):
+    fields = {key: task[key] for key in ("id", "project_id", "assignee_id", "status", "priority")}
+    payload = {
+        "task": {**fields, "org_id": models.DEFAULT_ORG_ID},
+        "at": f"{day.isoformat()}T12:00:00+00:00",
+    }
+    handler, _ = jobs.HANDLERS[kind]
+    handler(db, payload)
+    db.commit()
+
+
+def open_pending(db, project_id, days):
+    points = reports.read_timeseries(db, DAY, DAY + timedelta(days=days - 1), project_id=project_id)
+    return [p["open"] for p in points if p["status"] == models.TaskStatus.pending]
+
+
+def test_late_creation_moves_later_days_along(db, project_tasks):
+    project_id, (first, second) = project_tasks
+    run_job(db, "reports.task_created", first, DAY + timedelta(days=2))
+    run_job(db, "reports.task_created", second, DAY)
+    assert open_pending(db, project_id, 3) == [1, 1, 2]
+
+
+def test_late_deletion_moves_later_days_along(db, project_tasks):
+    project_id, (first, second) = project_tasks
+    run_job(db, "reports.task_created", first, DAY)
+    run_job(db, "reports.task_created", second, DAY)
+    run_job(db, "reports.task_created", second, DAY + timedelta(days=2))
+    run_job(db, "reports.task_deleted", second, DAY + timedelta(days=1))
+    assert open_pending(db, project_id, 3) == [2, 1, 2]
+
+
+def test_backfill_leaves_other_tenants_rollups_alone(client, admin, foreign_admin):
+    def open_today(headers):
+        project = client.post("/projects", json={"title": "Backfill"}, headers=headers).json()
+        me = client.get("/auth/me", headers=headers).json()
+        client.post("/tasks", json={
+            "title": "Open", "project_id": project["id"], "assignee_id": me["id"],
+        }, headers=headers)
+        return project["id"]
+
+    def open_count(headers, project_id):
+        today = reports.utc_today().isoformat()
+        points = client.get("/reports/timeseries", params={
+            "from": today, "to": today, "project_id": project_id,
+        }, headers=headers).json()
+        return sum(point["open"] for point in points)
+
+    projects = {"home": (admin, open_today(admin)), "foreign": (foreign_admin, open_today(foreign_admin))}
+    for headers, _ in projects.values():
+        assert client.post("/reports/rollups/backfill", headers=headers).status_code == 200
+    for headers, project_id in projects.values():
+        assert open_count(headers, project_id) == 1
+
+
+def test_cycle_time_rows_carry_only_their_grouping_key(client, admin, db, project_tasks):
+    project_id, (task, _) = project_tasks
+    start = datetime(2020, 3, 2, 9, tzinfo=timezone.utc)
+    for hours, to_status in ((0, "pending"), (1, "in_progress"), (3, "completed")):
+        db.add(models.TaskStatusEvent(
+            task_id=task["id"], project_id=project_id, assignee_id=task["assignee_id"],
+            to_status=models.TaskStatus(to_status), created_at=start + timedelta(hours=hours),
+        ))
+    db.commit()
+
+    report = client.get("/reports/cycle-time", params={"project_id": project_id}, headers=admin).json()
+    by_project = {row["status"]: row for row in report["time_in_status_by_project"]}
+    assert set(by_project["in_progress"]) == {"project_id", "status", "count", "mean", "p50", "p90", "p99"}
+    assert by_project["in_progress"]["project_id"] == project_id
+    assert by_project["in_progress"]["mean"] == pytest.approx(2.0)
+    by_assignee = {row["status"]: row for row in report["time_in_status_by_assignee"]}
+    assert set(by_assignee["pending"]) == {"assignee_id", "status", "count", "mean", "p50", "p90", "p99"}
+    assert by_assignee["pending"]["assignee_id"] == task["assignee_id"]
+    assert report["cycle_time_by_project"][0]["p50"] == pytest.approx(2.0)
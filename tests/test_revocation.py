@@ -0,0 +1,44 @@
+from sqlalchemy import delete
+import models
+from database import engine
+from revocation import revocation_index
+
+
+def test_new_user_is_accepted_right_after_a_refresh(client, unique, register, login):
+    for _ in range(10):
+        revocation_index.refresh(engine)
+        username = unique()
+        register(username)
+        response = client.get("/auth/me", headers=login(username))
+        assert response.status_code == 200, response.text
+        assert response.json()["username"] == username
+
+
+def test_logout_revokes_issued_tokens(client, unique, register, login):
+    username = unique()
+    register(username)
+    headers = login(username)
+    assert client.post("/auth/logout", headers=headers).status_code == 200
+    assert client.get("/auth/me", headers=headers).status_code == 401
+    assert client.get("/auth/me", headers=login(username)).status_code == 200
+
+
+def test_tokens_of_a_deleted_user_are_rejected(client, unique, register, login):
+    username = unique()
+    user = register(username)
+    headers = login(username)
+    with engine.begin() as conn:
+        conn.execute(delete(models.User).where(models.User.id == user["id"]))
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+
+def test_reused_id_of_a_deleted_user_is_accepted(client, unique, register, login):
+    # SQLite hands the highest deleted rowid to the next insert.
+    username = unique()
+    user = register(username)
+    client.get("/auth/me", headers=login(username))
+    with engine.begin() as conn:
+        conn.execute(delete(models.User).where(models.User.id == user["id"]))
+    successor = unique()
+    assert register(successor)["id"] == user["id"]
+    assert client.get("/auth/me", headers=login(successor)).status_code == 200
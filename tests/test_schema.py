@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import inspect
+
+import models
+from database import build_engine, prepare_schema
+
+# The schema as the first release created it.
+FIRST_RELEASE = [
+    """CREATE TABLE users (
+        id INTEGER NOT NULL PRIMARY KEY, username VARCHAR, email VARCHAR, hashed_password VARCHAR,
+        role VARCHAR(5), is_active BOOLEAN, created_at DATETIME DEFAULT (CURRENT_TIMESTAMP))""",
+    """CREATE TABLE projects (
+        id INTEGER NOT NULL PRIMARY KEY, title VARCHAR, description TEXT, creator_id INTEGER REFERENCES users (id),
+        created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), updated_at DATETIME)""",
+    """CREATE TABLE tasks (
+        id INTEGER NOT NULL PRIMARY KEY, title VARCHAR, description TEXT, deadline DATETIME,
+        priority VARCHAR(6), status VARCHAR(11), project_id INTEGER REFERENCES projects (id),
+        assignee_id INTEGER REFERENCES users (id), created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+        updated_at DATETIME)""",
+    """CREATE TABLE comments (
+        id INTEGER NOT NULL PRIMARY KEY, content TEXT, task_id INTEGER REFERENCES tasks (id),
+        author_id INTEGER REFERENCES users (id), created_at DATETIME DEFAULT (CURRENT_TIMESTAMP))""",
+    "INSERT INTO users (username, role, is_active) VALUES ('old', 'user', 1)",
+    "INSERT INTO projects (title, creator_id) VALUES ('Old', 1)",
+    "INSERT INTO tasks (title, priority, status, project_id, assignee_id) VALUES ('Old', 'low', 'pending', 1, 1)",
+]
+
+
+@pytest.fixture
+def old_database(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        for statement in FIRST_RELEASE:
+            conn.exec_driver_sql(statement)
+    yield engine
+    engine.dispose()
+
+
+def test_check_refuses_a_schema_with_missing_columns(old_database):
+    with pytest.raises(RuntimeError, match="tasks.version"):
+        prepare_schema(old_database, "check")
+
+
+def test_create_adds_and_backfills_missing_columns(old_database):
+    added = prepare_schema(old_database, "create")
+    assert {"users.org_id", "users.token_version", "tasks.version", "comments.org_id"} <= set(added)
+    assert prepare_schema(old_database, "check") == []
+
+    inspector = inspect(old_database)
+    assert "ix_tasks_org_status_updated_at" in {index["name"] for index in inspector.get_indexes("tasks")}
+    with old_database.connect() as conn:
+        user = conn.exec_driver_sql("SELECT org_id, token_version, tokens_changed_at FROM users").one()
+        task = conn.exec_driver_sql("SELECT org_id, version FROM tasks").one()
+    assert user.org_id == models.DEFAULT_ORG_ID and user.token_version == 1
+    assert user.tokens_changed_at is not None
+    assert tuple(task) == (models.DEFAULT_ORG_ID, 1)
+
+
+def test_up_to_date_schema_is_left_alone(old_database):
+    prepare_schema(old_database, "create")
+    assert prepare_schema(old_database, "create") == []
@@ -0,0 +1,72 @@
+import pytest
+
+import admission
+import models
+import similarity
+
+
+@pytest.fixture
+def create(client, admin, unique, register):
+    assignee = register(unique())
+    project = client.post("/projects", json={"title": "Similarity"}, headers=admin).json()
+
+    def create(title, description=None):
+        response = client.post("/tasks", json={
+            "title": title, "description": description,
+            "project_id": project["id"], "assignee_id": assignee["id"],
+        }, headers=admin)
+        assert response.status_code == 200, response.text
+        return response
+    return create
+
+
+@pytest.fixture
+def tag(unique):
+    # A word no other test uses, so scores only come from this test's tasks.
+    return unique("zq").replace("_", "")
+
+
+def similar(client, headers, task_id, **params):
+    response = client.get(f"/tasks/{task_id}/similar", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return [row["id"] for row in response.json()]
+
+
+def test_new_tasks_are_indexed_and_flagged(client, admin, create, tag):
+    original = create(f"Replace the {tag} conveyor bearings").json()
+    unrelated = create(f"Write the {tag} quarterly newsletter").json()
+    duplicate = create(f"Replace {tag} conveyor bearings")
+    assert duplicate.headers["X-Possible-Duplicates"] == str(original["id"])
+    assert "X-Possible-Duplicates" not in create("Plan the summer offsite party").headers
+
+    found = similar(client, admin, duplicate.json()["id"])
+    assert found[0] == original["id"]
+    assert found.index(original["id"]) < found.index(unrelated["id"])
+
+
+def test_renamed_tasks_are_reindexed(client, admin, create, tag):
+    first = create(f"Replace the {tag} conveyor bearings").json()
+    second = create(f"Write the {tag} quarterly newsletter").json()
+    probe = create(f"Write {tag} quarterly newsletter draft").json()
+    assert similar(client, admin, probe["id"])[0] == second["id"]
+
+    client.put(f"/tasks/{second['id']}", json={"title": f"Order {tag} spare forklift tyres"}, headers=admin)
+    client.put(f"/tasks/{first['id']}", json={"title": f"Write the {tag} quarterly newsletter"}, headers=admin)
+    assert similar(client, admin, probe["id"])[0] == first["id"]
+
+
+def test_deleted_tasks_leave_the_index(client, admin, create, tag):
+    original = create(f"Replace the {tag} conveyor bearings").json()
+    probe = create(f"Replace {tag} conveyor bearings").json()
+    assert client.delete(f"/tasks/{original['id']}", headers=admin).status_code == 200
+    assert original["id"] not in similar(client, admin, probe["id"])
+    # Gone from the index itself, not just filtered out by the endpoint's query.
+    assert original["id"] not in dict(similarity.similar_to(models.DEFAULT_ORG_ID, probe["title"], None))
+
+
+def test_limit_is_clamped_like_other_lists(client, admin, create, tag, monkeypatch):
+    monkeypatch.setattr(admission, "MAX_PAGE_SIZE", 1)
+    create(f"Replace the {tag} conveyor bearings")
+    probe = create(f"Replace {tag} conveyor bearings").json()
+    create(f"Replace the {tag} conveyor belts")
+    assert len(similar(client, admin, probe["id"], limit=100)) == 1
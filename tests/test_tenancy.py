@@ -0,0 +1,31 @@
+import pytest
+
+
+@pytest.fixture
+def membership(client, admin, unique, register):
+    member = register(unique())
+    project = client.post("/projects", json={"title": "Members"}, headers=admin).json()
+    response = client.post(f"/projects/{project['id']}/members", json={"user_id": member["id"]}, headers=admin)
+    assert response.status_code == 200, response.text
+    return project["id"], member["id"]
+
+
+def test_members_of_a_foreign_project_are_hidden(client, admin, foreign_admin, membership):
+    project_id, member_id = membership
+    assert client.get(f"/projects/{project_id}/members", headers=foreign_admin).status_code == 404
+    members = client.get(f"/projects/{project_id}/members", headers=admin).json()
+    assert [m["user_id"] for m in members] == [member_id]
+
+
+def test_members_of_a_foreign_project_cannot_be_removed(client, admin, foreign_admin, membership):
+    project_id, member_id = membership
+    response = client.delete(f"/projects/{project_id}/members/{member_id}", headers=foreign_admin)
+    assert response.status_code == 404
+    assert len(client.get(f"/projects/{project_id}/members", headers=admin).json()) == 1
+    assert client.delete(f"/projects/{project_id}/members/{member_id}", headers=admin).status_code == 200
+
+
+def test_foreign_projects_and_tasks_are_invisible(client, admin, foreign_admin, membership):
+    project_id, _ = membership
+    assert client.get(f"/projects/{project_id}", headers=foreign_admin).status_code == 404
+    assert all(p["id"] != project_id for p in client.get("/projects", headers=foreign_admin).json())